@@ -1,14 +1,34 @@
+import atexit
+import hmac
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, has_app_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_socketio import SocketIO, join_room, leave_room, emit
-from werkzeug.security import generate_password_hash
 import secrets
 import re
 from datetime import datetime
-from models import db, User
+from sqlalchemy import bindparam, event, insert, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from models import db, User, CommandPair, Match
 from forms import RegistrationForm, LoginForm
 from config import load_config
+from room_store import create_room_store, run_sweeper, RedisRoomStore
+from pairs import PairRegistry, PairCache, room_scope, couple_scope, run_pair_watcher
+from coalescer import CommandCoalescer
+from connections import ConnectionRegistry
+from passwords import create_password_hasher
+from write_behind import WriteBehindBuffer, WriteBehindQueue, run_flusher
+from bloom import UserFilter, run_filter_builder
+from user_io import users_cli
+from db_pool import engine_options, patch_for_green_threads, pool_stats
+from db_routing import init_replicas, run_replica_checker
+from metrics import create_metrics, run_metrics_refresher
+from profiling import ServerTiming, StackSampler
+from user_cache import UserCache
+from message_queue import BatchingRedisManager, create_client_manager
+from serialization import create_serializer
+from hashring import NODE_PARAM, create_hash_ring
 
 # 加载配置
 app_env = os.getenv('APP_ENV', 'development')
@@ -17,11 +37,42 @@ config = load_config(app_env)
 app = Flask(__name__)
 app.config.from_object(config)
 
-# 初始化数据库
+# 初始化数据库（连接池参数按环境配置，eventlet模式下使驱动配合绿色线程）
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(config))
+patch_for_green_threads(config.SOCKETIO_ASYNC_MODE, app.logger)
+# 只读副本（配置了DATABASE_REPLICA_URLS时只读查询路由到副本）
+replica_router = init_replicas(app, config.DATABASE_REPLICA_URLS, cooldown=config.REPLICA_COOLDOWN)
 db.init_app(app)
+if replica_router is not None:
+    with app.app_context():
+        replica_router.attach(db.engines)
+
+# 应用指标（/metrics）：HTTP请求、SocketIO事件与数据库查询耗时，房间数、连接数与匹配次数
+metrics = create_metrics(config)
+metrics.init_app(app)
+
+# 性能剖析：Server-Timing响应头（SERVER_TIMING_ENABLED开启时）与按需调用栈采样（/admin/profile）
+server_timing = ServerTiming(enabled=config.SERVER_TIMING_ENABLED,
+                             slow_event=config.SLOW_EVENT_MS / 1000, logger=app.logger)
+server_timing.init_app(app)
+stack_sampler = StackSampler(config.PROFILING_OUTPUT_DIR, interval=config.PROFILING_INTERVAL_MS / 1000,
+                             max_seconds=config.PROFILING_MAX_SECONDS)
+
+with app.app_context():
+    metrics.instrument_engines(db.engines)
+    server_timing.instrument_engines(db.engines)
 
-# 初始化SocketIO
-socketio = SocketIO(app, cors_allowed_origins=config.CORS_ALLOWED_ORIGINS, async_mode=config.SOCKETIO_ASYNC_MODE)
+# 命令行：flask users import/export
+app.cli.add_command(users_cli)
+
+# 初始化SocketIO（配置了SOCKETIO_MESSAGE_QUEUE时经Redis把广播转发到其他worker/节点，
+# 开启SOCKETIO_MSGPACK时客户端可选择MessagePack编码）
+client_manager = create_client_manager(config, app.logger)
+socketio = SocketIO(app, cors_allowed_origins=config.CORS_ALLOWED_ORIGINS, async_mode=config.SOCKETIO_ASYNC_MODE,
+                    client_manager=client_manager, serializer=create_serializer(config))
+
+# 房间码一致性哈希环（配置了CLUSTER_NODES时每个房间由一个节点负责，nginx按URL中的节点参数转发）
+hash_ring = create_hash_ring(config)
 
 # 初始化Flask-Login
 login_manager = LoginManager()
@@ -29,15 +80,102 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = '请先登录'
 
+# 密码哈希器（在线程池中计算，不阻塞eventlet事件循环）
+password_hasher = create_password_hasher(config)
+server_timing.instrument(password_hasher, 'hash', ('hash', 'verify'))
+
+# 按主键批量更新最后登录时间：Core的executemany忽略已删除的用户，
+# ORM的批量UPDATE遇到不存在的行会抛StaleDataError，整批数据永远写不进去
+LAST_LOGIN_UPDATE = (update(User.__table__)
+                     .where(User.__table__.c.id == bindparam('b_id'))
+                     .values(last_login=bindparam('b_last_login')))
+
+def write_last_logins(entries):
+    """将缓冲的最后登录时间以一条批量UPDATE写入数据库"""
+    with app.app_context():
+        db.session.execute(LAST_LOGIN_UPDATE, [
+            {'b_id': user_id, 'b_last_login': last_login} for user_id, last_login in entries.items()
+        ])
+        db.session.commit()
+
+# 最后登录时间写回缓冲：登录时只记录到内存，由后台任务批量写入，进程退出前写入剩余数据
+last_login_buffer = WriteBehindBuffer(write_last_logins, max_size=config.LAST_LOGIN_BATCH_SIZE,
+                                      spawn=socketio.start_background_task)
+atexit.register(last_login_buffer.flush)
+
+def write_matches(records):
+    """将缓冲的配对成功记录以批量INSERT写入数据库"""
+    with app.app_context():
+        db.session.execute(insert(Match), records)
+        db.session.commit()
+
+# 配对记录写回队列：匹配成功时只加入内存队列，由后台任务批量写入，进程退出前写入剩余记录；
+# 违反约束或数据无效的批次逐条重写，只丢弃出错的记录
+match_queue = WriteBehindQueue(write_matches, max_size=config.MATCH_BATCH_SIZE,
+                               max_pending=config.MATCH_QUEUE_MAX, spawn=socketio.start_background_task,
+                               max_attempts=config.MATCH_MAX_ATTEMPTS,
+                               rejected_errors=(IntegrityError, DataError), logger=app.logger)
+atexit.register(match_queue.flush)
+
+# 房间状态存储（由ROOM_STORE_BACKEND选择内存或Redis后端）
+room_store = create_room_store(config)
+
+# 用户缓存（USER_CACHE_SHARED开启且使用Redis后端时，以Redis作为共享二级缓存）
+user_cache = UserCache(lambda user_id: db.session.get(User, user_id),
+                       ttl=config.USER_CACHE_TTL, maxsize=config.USER_CACHE_SIZE,
+                       shared=room_store if config.USER_CACHE_SHARED
+                       and isinstance(room_store, RedisRoomStore) else None)
+
+def load_user_names(since_id=None):
+    """逐批读取ID大于since_id的用户的(id, 用户名, 邮箱)（也在后台任务中调用，自行进入应用上下文）"""
+    with app.app_context():
+        query = db.session.query(User.id, User.username, User.email)
+        if since_id is not None:
+            query = query.filter(User.id > since_id)
+        yield from query.yield_per(10000)
+
+# 用户名/邮箱布隆过滤器：判断“一定未被使用”时检查接口无需查询数据库；
+# 由后台任务构建，其他worker注册的用户通过房间存储中的共享版本号通知
+user_filter = UserFilter(load_user_names,
+                         capacity=config.USER_FILTER_CAPACITY, error_rate=config.USER_FILTER_ERROR_RATE,
+                         version_source=lambda: room_store.get_version('users'),
+                         check_interval=config.USER_FILTER_CHECK_INTERVAL)
+
 @login_manager.user_loader
 def load_user(user_id):
-    """加载用户"""
-    return User.query.get(int(user_id))
+    """加载用户（优先从缓存读取）"""
+    return user_cache.get(int(user_id))
 
-# 内存存储房间状态（可替换为Redis）
-rooms_state = {}
+_background_tasks_started = False
 
-# 预设配对指令组（可扩展为数据库存储）
+def start_background_tasks():
+    """启动后台任务（每个worker进程只启动一次）"""
+    global _background_tasks_started
+    if _background_tasks_started:
+        return
+    _background_tasks_started = True
+    socketio.start_background_task(run_filter_builder, user_filter,
+                                   config.USER_FILTER_REBUILD_INTERVAL, socketio.sleep, app.logger)
+    if config.ROOM_SWEEP_INTERVAL > 0:
+        socketio.start_background_task(run_sweeper, room_store,
+                                       config.ROOM_SWEEP_INTERVAL, socketio.sleep, app.logger)
+    if config.PRESET_PAIRS_FILE and config.PAIRS_RELOAD_INTERVAL > 0:
+        socketio.start_background_task(run_pair_watcher, pair_registry,
+                                       config.PAIRS_RELOAD_INTERVAL, socketio.sleep, app.logger)
+    if replica_router is not None and config.REPLICA_CHECK_INTERVAL > 0:
+        socketio.start_background_task(run_replica_checker, app, db, replica_router,
+                                       config.REPLICA_CHECK_INTERVAL, socketio.sleep, app.logger)
+    if config.LAST_LOGIN_FLUSH_INTERVAL > 0:
+        socketio.start_background_task(run_flusher, last_login_buffer,
+                                       config.LAST_LOGIN_FLUSH_INTERVAL, socketio.sleep, app.logger)
+    if config.MATCH_FLUSH_INTERVAL > 0:
+        socketio.start_background_task(run_flusher, match_queue,
+                                       config.MATCH_FLUSH_INTERVAL, socketio.sleep, app.logger)
+    if metrics.enabled and config.METRICS_REFRESH_INTERVAL > 0:
+        socketio.start_background_task(run_metrics_refresher, refresh_metrics,
+                                       config.METRICS_REFRESH_INTERVAL, socketio.sleep, app.logger)
+
+# 内置预设配对指令组（数据库中的全局配对与之并存）
 PRESET_PAIRS = [
     {'pair': ['心动', '信号'], 'description': '心动信号'},
     {'pair': ['我', '你'], 'description': '我和你'},
@@ -47,24 +185,88 @@ PRESET_PAIRS = [
     {'pair': ['宝贝', '宝贝'], 'description': '宝贝'},
 ]
 
+# 配对索引（配置了PRESET_PAIRS_FILE时从文件加载，文件修改后自动重新加载）
+pair_registry = PairRegistry(PRESET_PAIRS)
+if config.PRESET_PAIRS_FILE:
+    pair_registry.load_file(config.PRESET_PAIRS_FILE)
+
+def load_custom_pairs(scope):
+    """从数据库加载作用域内的配对"""
+    rows = CommandPair.query.filter_by(scope=scope, is_active=True).order_by(CommandPair.id)
+    return [row.to_pair() for row in rows]
+
+def load_custom_pair_scopes():
+    """从数据库加载所有存在配对的作用域"""
+    rows = db.session.query(CommandPair.scope).filter_by(is_active=True).distinct()
+    return [scope for (scope,) in rows]
+
+# 数据库配对缓存（配对变更时通过房间存储中的共享版本号通知所有worker）
+pair_cache = PairCache(load_custom_pairs, load_custom_pair_scopes,
+                       version_source=lambda: room_store.get_version('pairs'),
+                       max_scopes=config.PAIR_CACHE_SIZE,
+                       check_interval=config.PAIR_CACHE_CHECK_INTERVAL)
+
+@event.listens_for(Session, 'after_flush')
+def track_changes(session, flush_context):
+    """记录本次事务修改了哪些需要缓存失效的数据（配对、用户）"""
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, CommandPair) for obj in changed):
+        session.info['pairs_changed'] = True
+    user_ids = {obj.id for obj in changed if isinstance(obj, User) and obj.id is not None}
+    if user_ids:
+        session.info.setdefault('users_changed', set()).update(user_ids)
+    added = [(obj.username, obj.email) for obj in session.new if isinstance(obj, User)]
+    if added:
+        session.info.setdefault('users_added', []).extend(added)
+
+@event.listens_for(Session, 'after_commit')
+def publish_changes(session):
+    """变更提交后使缓存失效"""
+    if session.info.pop('pairs_changed', False):
+        room_store.bump_version('pairs')
+        pair_cache.invalidate()
+    for user_id in session.info.pop('users_changed', ()):
+        user_cache.invalidate(user_id)
+    added = session.info.pop('users_added', ())
+    if added:
+        room_store.bump_version('users')
+    for username, email in added:
+        user_filter.add(username, email)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changes(session):
+    """事务回滚时丢弃变更标记"""
+    session.info.pop('pairs_changed', None)
+    session.info.pop('users_changed', None)
+    session.info.pop('users_added', None)
+
+def room_owner(room_code):
+    """返回负责房间的节点名，未启用一致性哈希时返回None"""
+    return hash_ring.node_for(room_code) if hash_ring is not None else None
+
+def serves_room(room_code, owner):
+    """本节点是否处理该房间的请求
+    
+    房间由本节点负责（或未启用一致性哈希）时处理；由其他节点负责时，若请求URL已带有该节点名，
+    说明nginx没有按节点参数转发，由本节点处理并记录警告，不再重定向以免循环。
+    """
+    if owner is None or owner == config.NODE_NAME:
+        return True
+    if request.args.get(NODE_PARAM) == owner:
+        app.logger.warning(f'Room {room_code} belongs to node {owner}, served by {config.NODE_NAME}')
+        return True
+    return False
+
 def generate_room_code():
-    """生成6位随机房间码"""
-    return ''.join(secrets.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for _ in range(6))
+    """生成6位随机房间码（启用一致性哈希时只生成由本节点负责的房间码）"""
+    while True:
+        room_code = ''.join(secrets.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for _ in range(6))
+        if room_owner(room_code) in (None, config.NODE_NAME):
+            return room_code
 
 def get_or_create_room(room_code):
     """获取或创建房间"""
-    if room_code not in rooms_state:
-        rooms_state[room_code] = {
-            'user1': None,
-            'user2': None,
-            'user1_command': '',
-            'user2_command': '',
-            'user1_username': None,
-            'user2_username': None,
-            'status': 'waiting',  # waiting, matched
-            'created_at': datetime.utcnow()
-        }
-    return rooms_state[room_code]
+    return room_store.get_or_create(room_code)
 
 def validate_password_strength(password):
     """验证密码强度"""
@@ -76,15 +278,36 @@ def validate_password_strength(password):
         return False, '密码必须包含数字'
     return True, '密码强度符合要求'
 
-def check_match(command1, command2):
-    """检查两个指令是否匹配"""
-    for pair in PRESET_PAIRS:
-        if set([command1, command2]) == set(pair['pair']):
-            return True, pair['description']
-    return False, None
+def check_match(command1, command2, room_code=None, user_ids=None):
+    """检查两个指令是否匹配
+
+    依次查找房间自定义配对、两位用户的自定义配对、数据库全局配对和内置配对，
+    全部为内存中的哈希查找。
+    """
+    scopes = []
+    if room_code:
+        scopes.append(room_scope(room_code))
+    if user_ids and None not in user_ids:
+        scopes.append(couple_scope(*user_ids))
+    scopes.append(None)
+    for scope in scopes:
+        is_match, description = pair_cache.index(scope).match(command1, command2)
+        if is_match:
+            return True, description
+    return pair_registry.match(command1, command2)
+
+def available_pairs(room_code):
+    """房间可用的配对（房间自定义配对在前）"""
+    return (pair_cache.index(room_scope(room_code)).pairs
+            + pair_cache.index(None).pairs + pair_registry.pairs)
 
 # ============ HTTP路由 ============
 
+@app.before_request
+def ensure_background_tasks():
+    """首个请求到达时启动后台任务"""
+    start_background_tasks()
+
 @app.route('/')
 def index():
     """主页 - 重定向到登录或协作页面"""
@@ -93,6 +316,63 @@ def index():
         return redirect(url_for('collaborate', room=room_code))
     return redirect(url_for('login'))
 
+# 唯一索引冲突对应的错误信息
+DUPLICATE_USER_ERRORS = {
+    'username': '用户名已被使用',
+    'email': '邮箱已被注册',
+}
+
+# 唯一约束冲突的错误信息中约束/列名的位置（只取名称，不匹配DETAIL中冲突的值）
+_UNIQUE_VIOLATION_PATTERNS = [
+    re.compile(r'unique constraint failed: users\.(\w+)'),   # SQLite
+    re.compile(r'unique constraint "(\w+)"'),                 # PostgreSQL（DETAIL在其后）
+    re.compile(r"for key '(?:users\.)?(\w+)'\W*$"),          # MySQL（冲突值在其前）
+]
+
+def _unique_field(name):
+    """由列名或索引名（username、ix_users_username、users_username_key）得到字段"""
+    for field in DUPLICATE_USER_ERRORS:
+        if name in (field, f'ix_users_{field}', f'users_{field}_key'):
+            return field
+    return None
+
+def duplicate_user_field(error):
+    """从唯一约束冲突中识别重复的字段（username或email），无法识别时返回None
+
+    PostgreSQL（psycopg2）优先使用驱动给出的约束名；其他情况从错误信息中取出列名或索引名：
+    SQLite为“UNIQUE constraint failed: users.username”，MySQL为“for key 'ix_users_username'”。
+    错误信息中还包含冲突的值（如邮箱username@x.com），因此只按约束名识别，不在整条信息中查找字段名。
+    """
+    orig = getattr(error, 'orig', error)
+    constraint = getattr(getattr(orig, 'diag', None), 'constraint_name', None)
+    if constraint:
+        return _unique_field(constraint.lower())
+    message = str(orig).lower()
+    for pattern in _UNIQUE_VIOLATION_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return _unique_field(match.group(1))
+    return None
+
+def create_user(username, email, password):
+    """创建用户，返回(用户, 错误信息)
+
+    不预先查询用户名和邮箱是否存在，直接INSERT并依赖users表上的唯一索引：
+    注册只需一次数据库往返，并发注册同一用户名时也只有一个能成功。
+    """
+    user = User(username=username, email=email, nickname=username)
+    user.password_hash = password_hasher.hash(password)
+    db.session.add(user)
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        field = duplicate_user_field(e)
+        if field is None:
+            raise
+        return None, DUPLICATE_USER_ERRORS[field]
+    return user, None
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """用户注册"""
@@ -116,13 +396,9 @@ def register():
             errors.append('用户名长度必须在3-20位之间')
         elif not re.match(r'^[a-zA-Z0-9_\u4e00-\u9fa5]+$', username):
             errors.append('用户名只能包含字母、数字、下划线和中文')
-        elif User.query.filter_by(username=username).first():
-            errors.append('用户名已被使用')
         
         if not email:
             errors.append('邮箱不能为空')
-        elif User.query.filter_by(email=email).first():
-            errors.append('邮箱已被注册')
         
         if not password:
             errors.append('密码不能为空')
@@ -139,22 +415,18 @@ def register():
                 flash(error, 'error')
             return render_template('register.html', form=form)
         
-        # 创建用户
-        user = User(
-            username=username,
-            email=email,
-            nickname=username
-        )
-        user.set_password(password)
-        
+        # 创建用户（用户名或邮箱重复由唯一索引检测）
         try:
-            db.session.add(user)
-            db.session.commit()
-            flash('注册成功！请登录', 'success')
-            return redirect(url_for('login'))
+            user, error = create_user(username, email, password)
         except Exception as e:
             db.session.rollback()
-            flash('注册失败，请稍后重试', 'error')
+            app.logger.error(f'Register failed: {str(e)}')
+            user, error = None, '注册失败，请稍后重试'
+        
+        if user is not None:
+            flash('注册成功！请登录', 'success')
+            return redirect(url_for('login'))
+        flash(error, 'error')
     
     return render_template('register.html', form=form)
 
@@ -180,11 +452,14 @@ def login():
             flash('用户不存在', 'error')
         elif not user.is_active:
             flash('账户已被禁用', 'error')
-        elif not user.check_password(password):
+        elif not password_hasher.verify(user.password_hash, password):
             flash('密码错误', 'error')
         else:
-            # 登录成功
-            user.update_last_login()
+            # 登录成功；哈希参数已变化时用本次输入的密码重新哈希
+            if password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+            last_login_buffer.add(user.id, datetime.utcnow())
             login_user(user, remember=remember)
             flash(f'欢迎回来，{user.nickname}！', 'success')
             
@@ -209,169 +484,321 @@ def logout():
 def collaborate():
     """协作页面"""
     room_code = request.args.get('room', generate_room_code())
+    owner = room_owner(room_code)
+    if not serves_room(room_code, owner):
+        # 在URL中带上负责的节点名后重新请求，nginx把页面转发到该节点
+        return redirect(url_for('collaborate', room=room_code, **{NODE_PARAM: owner}))
     room = get_or_create_room(room_code)
     
+    # 页面把节点名带到SocketIO连接的URL中，之后的连接同样到达负责该房间的节点
     return render_template('index.html', 
                           room_code=room_code,
                           current_user=current_user,
-                          preset_pairs=PRESET_PAIRS)
+                          preset_pairs=available_pairs(room_code),
+                          socketio_msgpack=config.SOCKETIO_MSGPACK,
+                          node=owner)
+
+# 可用性检查的提示信息：(为空, 已被使用, 可用)
+AVAILABILITY_MESSAGES = {
+    'username': ('用户名不能为空', '用户名已被使用', '用户名可用'),
+    'email': ('邮箱不能为空', '邮箱已被注册', '邮箱可用'),
+}
+
+# 批量检查一次最多接受的候选数
+AVAILABILITY_BATCH_LIMIT = 50
+
+def check_availability(field, values):
+    """检查一组用户名或邮箱是否可用，返回{值: (是否可用, 提示信息)}
+
+    布隆过滤器判断一定未被使用的值直接返回；其余的值合并为一次IN查询。
+    """
+    empty, taken, free = AVAILABILITY_MESSAGES[field]
+    results = {}
+    candidates = []
+    for value in values:
+        if not value:
+            results[value] = (False, empty)
+        elif user_filter.might_exist(field, value):
+            candidates.append(value)
+        else:
+            results[value] = (True, free)
+    if candidates:
+        column = getattr(User, field)
+        existing = {row[0] for row in db.session.query(column).filter(column.in_(candidates))}
+        for value in candidates:
+            results[value] = (False, taken) if value in existing else (True, free)
+    return results
+
+def availability_response(field):
+    """处理单个（{field: 值}）或批量（{fields: [值, ...]}）的可用性检查请求"""
+    data = request.get_json(silent=True) or {}
+    batch = data.get(f'{field}s')
+    if batch is None:
+        value = str(data.get(field, '')).strip()
+        available, message = check_availability(field, [value])[value]
+        return jsonify({'available': available, 'message': message})
+    
+    if not isinstance(batch, list) or len(batch) > AVAILABILITY_BATCH_LIMIT:
+        return jsonify({'success': False,
+                        'message': f'一次最多检查{AVAILABILITY_BATCH_LIMIT}个'}), 400
+    values = [str(value).strip() for value in batch]
+    results = check_availability(field, values)
+    return jsonify({'results': {
+        value: {'available': results[value][0], 'message': results[value][1]} for value in values
+    }})
 
 @app.route('/api/check-username', methods=['POST'])
 def check_username():
-    """检查用户名是否可用"""
-    username = request.json.get('username', '').strip()
-    if not username:
-        return jsonify({'available': False, 'message': '用户名不能为空'})
-    
-    if User.query.filter_by(username=username).first():
-        return jsonify({'available': False, 'message': '用户名已被使用'})
-    
-    return jsonify({'available': True, 'message': '用户名可用'})
+    """检查用户名是否可用（支持usernames批量检查）"""
+    return availability_response('username')
 
 @app.route('/api/check-email', methods=['POST'])
 def check_email():
-    """检查邮箱是否可用"""
-    email = request.json.get('email', '').strip()
-    if not email:
-        return jsonify({'available': False, 'message': '邮箱不能为空'})
+    """检查邮箱是否可用（支持emails批量检查）"""
+    return availability_response('email')
+
+@app.route('/api/pairs', methods=['GET'])
+@login_required
+def list_pairs():
+    """获取房间的自定义配对"""
+    room_code = request.args.get('room_code', '').strip()
+    if not room_code:
+        return jsonify({'success': False, 'message': '房间码不能为空'}), 400
+    
+    rows = CommandPair.query.filter_by(scope=room_scope(room_code), is_active=True)
+    return jsonify({'success': True, 'pairs': [row.to_dict() for row in rows.order_by(CommandPair.id)]})
+
+@app.route('/api/pairs', methods=['POST'])
+@login_required
+def create_pair():
+    """添加房间或两人之间的自定义配对"""
+    data = request.json or {}
+    first = (data.get('first') or '').strip()
+    second = (data.get('second') or '').strip()
+    description = (data.get('description') or '').strip() or first + second
+    room_code = (data.get('room_code') or '').strip()
+    partner_username = (data.get('partner_username') or '').strip()
     
-    if User.query.filter_by(email=email).first():
-        return jsonify({'available': False, 'message': '邮箱已被注册'})
+    if not first or not second:
+        return jsonify({'success': False, 'message': '配对指令不能为空'}), 400
+    if len(first) > 50 or len(second) > 50 or len(description) > 100:
+        return jsonify({'success': False, 'message': '配对指令过长'}), 400
     
-    return jsonify({'available': True, 'message': '邮箱可用'})
+    if room_code:
+        # 只有占据房间座位的用户可以为该房间添加配对
+        room = room_store.get(room_code)
+        if room is None or room.role_of(current_user.id) is None:
+            return jsonify({'success': False, 'message': '只能为自己所在的房间添加配对'}), 403
+        scope = room_scope(room_code)
+    elif partner_username:
+        partner = User.query.filter_by(username=partner_username).first()
+        if not partner:
+            return jsonify({'success': False, 'message': '用户不存在'}), 404
+        scope = couple_scope(current_user.id, partner.id)
+    else:
+        return jsonify({'success': False, 'message': '请指定房间或对方用户名'}), 400
+    
+    pair = CommandPair(first=first, second=second, description=description,
+                       scope=scope, created_by=current_user.id)
+    db.session.add(pair)
+    db.session.commit()
+    return jsonify({'success': True, 'pair': pair.to_dict()}), 201
+
+@app.route('/api/pairs/<int:pair_id>', methods=['DELETE'])
+@login_required
+def delete_pair(pair_id):
+    """删除自己添加的自定义配对"""
+    pair = db.session.get(CommandPair, pair_id)
+    if not pair or pair.scope is None or pair.created_by != current_user.id:
+        return jsonify({'success': False, 'message': '配对不存在'}), 404
+    
+    db.session.delete(pair)
+    db.session.commit()
+    return jsonify({'success': True})
 
 # ============ SocketIO事件 ============
 
+def apply_command(room_code, user_role, command, user_id):
+    """更新指令、广播并检查匹配（由指令合并器调用）"""
+    if not has_app_context():
+        with app.app_context():
+            return apply_command(room_code, user_role, command, user_id)
+    
+    # 座位已不属于提交者（窗口内离开、座位换人或房间已删除）时丢弃指令
+    room = room_store.set_command(room_code, user_role, command, user_id)
+    if room is None:
+        if room_store.get(room_code) is None:
+            # 房间已过期（如Redis空闲TTL到期）：通知房间内的客户端重新加入
+            socketio.emit('room_expired', {'room_code': room_code}, to=room_code)
+        return
+    
+    # 广播指令增量（完整状态只在加入房间和重新同步时发送）
+    socketio.emit('command_updated', {
+        'seq': room.seq,
+        'user_role': user_role,
+        'command': command
+    }, to=room_code)
+    
+    # 检查匹配
+    user1_command = room.user1_command
+    user2_command = room.user2_command
+    if user1_command and user2_command:
+        is_match, description = check_match(user1_command, user2_command,
+                                            room_code, (room.user1, room.user2))
+        
+        if is_match:
+            # 标记匹配并清空指令以便下次使用；若期间指令已变化则以新指令为准
+            matched = room_store.mark_matched(room_code, user1_command, user2_command)
+            if matched is None:
+                return
+            
+            metrics.record_match(True)
+            matched_at = datetime.utcnow()
+            socketio.emit('match_success', {
+                'seq': matched.seq,
+                'description': description,
+                'command_pair': [user1_command, user2_command],
+                'user1_username': room.user1_username,
+                'user2_username': room.user2_username,
+                'timestamp': matched_at.isoformat()
+            }, to=room_code)
+            
+            # 记录配对历史（只加入写回队列，不等待数据库）
+            if not match_queue.add({
+                'room_code': room_code[:64],
+                'user1_id': room.user1,
+                'user2_id': room.user2,
+                'user1_command': user1_command[:50],
+                'user2_command': user2_command[:50],
+                'description': description[:100],
+                'matched_at': matched_at
+            }):
+                app.logger.warning(f'Match history queue full, dropped match in room {room_code}')
+        else:
+            metrics.record_match(False)
+            socketio.emit('match_failed', {
+                'message': '指令不匹配，请重新输入',
+                'user1_command': user1_command,
+                'user2_command': user2_command
+            }, to=room_code)
+
+# 指令合并器：同一房间同一角色在窗口内的多次提交只处理最后一次
+command_coalescer = CommandCoalescer(config.SUBMIT_COALESCE_WINDOW, apply_command,
+                                     socketio.start_background_task, socketio.sleep, app.logger)
+
+# SocketIO连接上下文：连接时解析用户身份，之后的事件不再访问会话或数据库
+connections = ConnectionRegistry()
+
+def refresh_metrics():
+    """合并本worker累计的事件指标，更新房间数与连接数"""
+    metrics.flush()
+    metrics.set_gauges(room_store.stats()['rooms'], len(connections))
+
 @socketio.on('connect')
 def handle_connect():
-    """客户端连接"""
-    if current_user.is_authenticated:
-        emit('connected', {'username': current_user.nickname})
+    """客户端连接：解析一次用户身份并保存到连接上下文，未登录的连接被拒绝"""
+    start_background_tasks()
+    if not current_user.is_authenticated:
+        return False
+    connections.open(request.sid, current_user.id, current_user.nickname)
+    emit('connected', {'username': current_user.nickname})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """客户端断开连接"""
-    pass
+    connections.close(request.sid)
+
+def release_seat(connection):
+    """释放连接在当前房间中的位置并通知对方"""
+    room_code = connection.leave()
+    if not room_code:
+        return
+    leave_room(room_code)
+    command_coalescer.discard(room_code, connection.user_id)
+    user_role = room_store.release(room_code, connection.user_id)
+    if user_role:
+        room = room_store.get(room_code)
+        if room is not None:
+            emit('user_left', {'seq': room.seq, 'user_role': user_role}, room=room_code)
 
 @socketio.on('join_room')
+@metrics.timed_event('join_room')
+@server_timing.timed_event('join_room')
 def handle_join_room(data):
     """加入房间"""
+    connection = connections.get(request.sid)
     room_code = data.get('room_code')
-    if not room_code:
+    if connection is None or not room_code:
         return
+    owner = room_owner(room_code)
+    if not serves_room(room_code, owner):
+        # 房间由其他节点负责（如节点增减后归属变化）：让客户端重新打开协作页面，连接到负责的节点
+        emit('room_redirect', {'room_code': room_code, 'node': owner,
+                               'url': url_for('collaborate', room=room_code, **{NODE_PARAM: owner})})
+        return
+    if connection.room_code and connection.room_code != room_code:
+        release_seat(connection)
+    
+    # 分配用户角色（原子操作，避免两个用户同时占用同一角色）
+    user_role, room = room_store.assign_role(room_code, connection.user_id, connection.nickname)
+    if user_role is None:
+        # 房间已满，创建新房间
+        room_code = generate_room_code()
+        user_role, room = room_store.assign_role(room_code, connection.user_id,
+                                                 connection.nickname)
+    connection.enter(room_code, user_role)
     
     # 将客户端加入SocketIO房间
     join_room(room_code)
     
-    # 更新房间状态
-    room = get_or_create_room(room_code)
-    
-    # 分配用户角色
-    if room['user1'] is None or room['user1'] == current_user.id:
-        room['user1'] = current_user.id
-        room['user1_username'] = current_user.nickname
-        user_role = 'user1'
-    elif room['user2'] is None or room['user2'] == current_user.id:
-        room['user2'] = current_user.id
-        room['user2_username'] = current_user.nickname
-        user_role = 'user2'
-    else:
-        # 房间已满，创建新房间
-        new_room_code = generate_room_code()
-        room = get_or_create_room(new_room_code)
-        room['user1'] = current_user.id
-        room['user1_username'] = current_user.nickname
-        room_code = new_room_code
-        user_role = 'user1'
-        join_room(room_code)
-    
     # 通知房间内其他用户
     emit('user_joined', {
-        'username': current_user.nickname,
+        'seq': room.seq,
+        'username': connection.nickname,
         'room_code': room_code,
         'user_role': user_role
     }, room=room_code, include_self=False)
     
     # 向当前用户返回房间信息
-    emit('room_info', {
-        'room_code': room_code,
-        'user_role': user_role,
-        'user1_username': room['user1_username'],
-        'user2_username': room['user2_username'],
-        'user1_command': room['user1_command'],
-        'user2_command': room['user2_command'],
-        'status': room['status']
-    })
+    emit('room_info', dict(room.snapshot(), room_code=room_code, user_role=user_role))
 
 @socketio.on('submit_command')
+@metrics.timed_event('submit_command')
+@server_timing.timed_event('submit_command')
 def handle_submit_command(data):
-    """提交指令"""
-    room_code = data.get('room_code')
+    """提交指令（房间和角色以服务器分配的为准，忽略客户端发送的值）"""
+    connection = connections.get(request.sid)
+    if connection is None or connection.room_code is None:
+        return
     command = data.get('command', '').strip()
-    user_role = data.get('user_role')
-    
-    if not room_code or not command or not user_role:
+    if not command:
         return
     
-    room = get_or_create_room(room_code)
-    
-    # 更新指令
-    if user_role == 'user1':
-        room['user1_command'] = command
-    else:
-        room['user2_command'] = command
-    
-    # 广播指令更新
-    emit('command_updated', {
-        'user_role': user_role,
-        'command': command,
-        'user1_username': room['user1_username'],
-        'user2_username': room['user2_username'],
-        'user1_command': room['user1_command'],
-        'user2_command': room['user2_command']
-    }, room=room_code)
-    
-    # 检查匹配
-    if room['user1_command'] and room['user2_command']:
-        is_match, description = check_match(room['user1_command'], room['user2_command'])
-        
-        if is_match:
-            room['status'] = 'matched'
-            # 清空指令以便下次使用
-            room['user1_command'] = ''
-            room['user2_command'] = ''
-            
-            emit('match_success', {
-                'description': description,
-                'command_pair': [room['user1_command'], room['user2_command']],
-                'user1_username': room['user1_username'],
-                'user2_username': room['user2_username'],
-                'timestamp': datetime.utcnow().isoformat()
-            }, room=room_code)
-        else:
-            emit('match_failed', {
-                'message': '指令不匹配，请重新输入',
-                'user1_command': room['user1_command'],
-                'user2_command': room['user2_command']
-            }, room=room_code)
+    command_coalescer.submit(connection.room_code, connection.user_id, connection.user_role, command)
 
 @socketio.on('leave_room')
+@metrics.timed_event('leave_room')
+@server_timing.timed_event('leave_room')
 def handle_leave_room(data):
     """离开房间"""
-    room_code = data.get('room_code')
-    if room_code:
-        leave_room(room_code)
-        # 可选：从房间状态中移除用户
-        room = rooms_state.get(room_code)
-        if room:
-            if room['user1'] == current_user.id:
-                room['user1'] = None
-                room['user1_command'] = ''
-                room['user1_username'] = None
-            elif room['user2'] == current_user.id:
-                room['user2'] = None
-                room['user2_command'] = ''
-                room['user2_username'] = None
+    connection = connections.get(request.sid)
+    if connection is not None:
+        release_seat(connection)
+
+@socketio.on('resync')
+@metrics.timed_event('resync')
+@server_timing.timed_event('resync')
+def handle_resync(data):
+    """客户端发现增量事件缺失时重新获取完整房间状态"""
+    connection = connections.get(request.sid)
+    if connection is None or connection.room_code is None:
+        return
+    room = room_store.get(connection.room_code)
+    if room is None:
+        return
+    
+    emit('room_info', dict(room.snapshot(), room_code=connection.room_code,
+                           user_role=connection.user_role))
 
 # ============ 错误处理 ============
 
@@ -387,13 +814,68 @@ def health_check():
         db_status = 'unhealthy'
         app.logger.error(f'Health check failed: {str(e)}')
     
+    commands = command_coalescer.stats()
+    try:
+        rooms = room_store.stats()
+    except Exception as e:
+        rooms = None
+        app.logger.error(f'Room store stats failed: {str(e)}')
+    
     return jsonify({
         'status': db_status,
+        'rooms': rooms,
+        'db_pool': pool_stats(db.engine),
+        'replicas': replica_router.stats() if replica_router is not None else None,
+        'commands': commands,
+        'connections': connections.stats(),
+        'message_queue': client_manager.stats() if isinstance(client_manager, BatchingRedisManager) else None,
+        'cluster': {'node': config.NODE_NAME, 'nodes': hash_ring.nodes} if hash_ring is not None else None,
+        'user_cache': user_cache.stats(),
+        'last_login': last_login_buffer.stats(),
+        'matches': match_queue.stats(),
+        'user_filter': user_filter.stats(),
         'timestamp': datetime.utcnow().isoformat(),
         'environment': config.APP_ENV,
         'version': getattr(config, 'VERSION', 'unknown')
     }), 200 if db_status == 'healthy' else 503
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus指标（多worker时合并所有worker的指标）"""
+    if not metrics.enabled:
+        return jsonify({'success': False, 'message': '指标未启用'}), 404
+    refresh_metrics()
+    body, content_type = metrics.render()
+    return body, 200, {'Content-Type': content_type}
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    """在处理本请求的worker上采样调用栈（需在X-Profile-Token头中提供PROFILING_TOKEN）
+
+    采样在后台进行，立即返回结果文件路径；seconds参数为采样秒数（默认10）。
+    """
+    if not config.PROFILING_TOKEN:
+        return jsonify({'success': False, 'message': '未启用'}), 404
+    # compare_digest只接受ASCII字符串，头中带非ASCII字符时会抛TypeError，先统一编码为字节
+    token = request.headers.get('X-Profile-Token', '').encode('utf-8')
+    if not hmac.compare_digest(token, config.PROFILING_TOKEN.encode('utf-8')):
+        return jsonify({'success': False, 'message': '无权限'}), 403
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'seconds无效'}), 400
+    if seconds <= 0:
+        return jsonify({'success': False, 'message': 'seconds无效'}), 400
+    path = stack_sampler.start(seconds)
+    if path is None:
+        return jsonify({'success': False, 'message': '已有采样在进行'}), 409
+    return jsonify({
+        'success': True,
+        'file': path,
+        'pid': os.getpid(),
+        'seconds': min(seconds, stack_sampler.max_seconds)
+    }), 202
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
@@ -0,0 +1,123 @@
+"""
+跨进程广播延迟基准
+一个进程经消息队列向房间广播，另一个进程（连接在房间中的节点）收到后计算从emit到送达的延迟；
+比较socketio.RedisManager（每条消息一次PUBLISH往返）与BatchingRedisManager（按批pipeline发布）
+在不同发送速率下的发送端耗时、Redis往返次数与送达延迟p50/p95/p99
+
+未给出--redis时使用redislite启动一个临时Redis服务器（pip install redislite）。
+端到端（经真实应用节点与浏览器协议）的延迟用loadgen.py给出多个--url测量。
+
+用法: python benchmarks/broadcast_latency.py [--redis redis://localhost:6379/0] [--messages 5000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import socketio  # noqa: E402
+
+from message_queue import BatchingRedisManager  # noqa: E402
+
+CHANNEL = 'bench-socketio'
+ROOM = 'BENCH1'
+
+
+def percentile(values, p):
+    """最近秩法求百分位数（values已排序）"""
+    index = max(int(round(p / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def receive(url, count, timeout=60):
+    """接收端：房间中有一个连接，收到count条消息后输出送达延迟（毫秒）"""
+    latencies = []
+    done = threading.Event()
+
+    def record(eio_sid, eio_pkt):
+        sent = socketio.packet.Packet(encoded_packet=eio_pkt.data).data[1]
+        latencies.append((time.time() - sent) * 1000)
+        if len(latencies) >= count:
+            done.set()
+
+    manager = BatchingRedisManager(url, channel=CHANNEL)
+    server = socketio.Server(async_mode='threading', client_manager=manager)
+    server._send_eio_packet = record
+    manager.initialize()
+    manager.enter_room(manager.connect(uuid.uuid4().hex, '/'), '/', ROOM)
+    # 等待订阅生效
+    time.sleep(0.5)
+    print('ready', flush=True)
+    done.wait(timeout)
+    print(json.dumps(sorted(latencies)), flush=True)
+
+
+def send(manager, count, rate):
+    """发送端：以rate条/秒（0表示不限速）向房间广播count条消息，返回平均每次emit耗时（秒）"""
+    server = socketio.Server(async_mode='threading', client_manager=manager)
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    busy = 0.0
+    for i in range(count):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        begin = time.perf_counter()
+        server.emit('bench', time.time(), to=ROOM)
+        busy += time.perf_counter() - begin
+    return busy / count
+
+
+def run(url, label, manager, count, rate):
+    receiver = subprocess.Popen([sys.executable, __file__, '--receive', url, '--messages', str(count)],
+                                stdout=subprocess.PIPE, text=True)
+    try:
+        assert receiver.stdout.readline().strip() == 'ready'
+        per_emit = send(manager, count, rate)
+        latencies = json.loads(receiver.stdout.readline())
+    finally:
+        receiver.wait()
+    round_trips = manager.stats()['batches'] if isinstance(manager, BatchingRedisManager) else count
+    lost = count - len(latencies)
+    print(f'{label:<28} {"不限" if not rate else rate:>6} {per_emit * 1e6:>8.1f}µs {round_trips:>8} '
+          f'{percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} '
+          f'{percentile(latencies, 99):>8.2f}' + (f'  丢失{lost}条' if lost else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跨进程广播延迟基准')
+    parser.add_argument('--redis', help='Redis地址（默认用redislite启动临时服务器）')
+    parser.add_argument('--messages', type=int, default=5000, help='每组发送的消息数')
+    parser.add_argument('--rates', default='500,2000,0', help='发送速率（条/秒，逗号分隔，0表示不限速）')
+    parser.add_argument('--receive', metavar='URL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.receive:
+        return receive(args.receive, args.messages)
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.redis
+        if url is None:
+            import redislite
+            server = redislite.Redis(os.path.join(directory, 'redis.db'))
+            url = f'unix://{server.socket_file}'
+        print(f'{"发布方式":<24} {"速率(条/秒)":>6} {"每次emit":>10} {"Redis往返":>6} '
+              f'{"p50(ms)":>8} {"p95(ms)":>8} {"p99(ms)":>8}')
+        for rate in (int(value) for value in args.rates.split(',')):
+            run(url, 'RedisManager', socketio.RedisManager(url, channel=CHANNEL, write_only=True),
+                args.messages, rate)
+            for window in (0, 0.001):
+                run(url, f'BatchingRedisManager({window * 1000:g}ms)',
+                    BatchingRedisManager(url, channel=CHANNEL, write_only=True, window=window),
+                    args.messages, rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+基准测试公共配置
+在导入应用之前设置环境变量，并准备已有大量房间的房间存储与已登录的SocketIO客户端
+
+用法: make bench / make bench-compare（见Makefile）
+"""
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+os.environ.setdefault('SUBMIT_COALESCE_WINDOW', '0')
+
+import pytest  # noqa: E402
+
+# 基准开始前房间存储中已有的房间数（每个房间两个座位都已占用）
+BENCH_ROOMS = int(os.getenv('BENCH_ROOMS', 10_000))
+
+PASSWORD = 'Bench123'
+
+
+@pytest.fixture(scope='session')
+def bench_app():
+    """已建表、已有两个用户和BENCH_ROOMS个房间的应用"""
+    from app import app, db, last_login_buffer, match_queue, room_store, user_cache
+    from models import User
+    
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        for name in ('alice', 'bob'):
+            user = User(username=name, email=f'{name}@example.com', nickname=name)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+    for i in range(BENCH_ROOMS):
+        room_code = f'R{i:05d}'
+        room_store.assign_role(room_code, 1_000_000 + 2 * i, f'a{i}')
+        room_store.assign_role(room_code, 1_000_001 + 2 * i, f'b{i}')
+    
+    yield app
+    
+    last_login_buffer.flush()
+    match_queue.flush()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    user_cache.clear()
+
+
+@pytest.fixture(scope='session')
+def socket_clients(bench_app):
+    """alice与bob的SocketIO测试客户端"""
+    from app import socketio
+    
+    clients = []
+    for name in ('alice', 'bob'):
+        http_client = bench_app.test_client()
+        http_client.post('/login', data={'username': name, 'password': PASSWORD})
+        clients.append(socketio.test_client(bench_app, flask_test_client=http_client))
+    yield clients
+    for client in clients:
+        client.disconnect()
+
+
+@pytest.fixture(scope='session')
+def room_codes():
+    """不与已有房间重复的房间码序列"""
+    return (f'N{i:05d}' for i in itertools.count())
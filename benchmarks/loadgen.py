@@ -0,0 +1,252 @@
+"""
+SocketIO负载生成器
+模拟N对用户：通过/login登录，以join_room进入同一房间，按打字节奏逐字提交指令直到匹配成功，
+然后换一组指令继续；输出连接速率、指令从提交到对方收到广播的p50/p95/p99延迟与匹配吞吐量。
+给出多个--url时一对中的两人连接到不同节点，测量经消息队列跨进程广播的延迟
+
+所有客户端运行在一个asyncio事件循环中（python-socketio的AsyncClient），一个进程即可模拟数千个连接。
+被测服务器需与本脚本使用同一数据库（默认按APP_ENV读取配置，即本地SQLite），
+--prepare-users会先向数据库批量写入测试用户。
+
+用法:
+    python app.py                                    # 另一个终端中启动服务器
+    python benchmarks/loadgen.py --prepare-users --pairs 500 --duration 60
+    python benchmarks/loadgen.py --url http://127.0.0.1:5001 --url http://127.0.0.1:5002 --pairs 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp  # noqa: E402
+import socketio  # noqa: E402
+
+from app import PRESET_PAIRS  # noqa: E402
+from config import load_config  # noqa: E402
+
+
+def percentile(values, p):
+    """最近秩法求百分位数（values已排序）"""
+    if not values:
+        return float('nan')
+    index = max(int(round(p / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def prepare_users(config, prefix, count, password):
+    """向数据库写入count个测试用户（已存在的跳过），所有用户共用一个密码哈希"""
+    from flask import Flask
+    from werkzeug.security import generate_password_hash
+    
+    from models import db
+    from user_io import UserImporter
+    
+    app = Flask(__name__, instance_path=os.path.join(ROOT, 'instance'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
+    db.init_app(app)
+    password_hash = generate_password_hash(password, config.PASSWORD_HASH_METHOD)
+    records = ({'username': f'{prefix}{i}', 'email': f'{prefix}{i}@loadtest.local',
+                'password_hash': password_hash} for i in range(count))
+    with app.app_context():
+        db.create_all()
+        _, inserted, _ = UserImporter(db.session, config.PASSWORD_HASH_METHOD,
+                                      batch_size=1000, workers=0).run(records)
+    return inserted
+
+
+class Stats:
+    """负载测试统计"""
+    
+    def __init__(self):
+        self.logins = 0
+        self.login_failures = 0
+        self.connected = 0
+        self.connect_failures = 0
+        self.connect_started = None
+        self.connect_finished = None
+        self.latencies = []
+        self.submitted = 0
+        self.matches = 0
+        self.match_failures = 0
+    
+    def report(self, duration):
+        latencies = sorted(self.latencies)
+        connect_time = (self.connect_finished or 0) - (self.connect_started or 0)
+        lines = [
+            f'登录: {self.logins} 成功, {self.login_failures} 失败',
+            f'连接: {self.connected} 成功, {self.connect_failures} 失败, '
+            f'{self.connected / connect_time if connect_time > 0 else 0:.1f} 连接/秒',
+            f'提交指令: {self.submitted} 次, 收到广播 {len(latencies)} 次'
+            f'（其余被服务器合并）',
+            f'提交到广播延迟: p50 {percentile(latencies, 50) * 1000:.1f}ms, '
+            f'p95 {percentile(latencies, 95) * 1000:.1f}ms, '
+            f'p99 {percentile(latencies, 99) * 1000:.1f}ms, '
+            f'最大 {(latencies[-1] if latencies else float("nan")) * 1000:.1f}ms',
+            f'匹配: {self.matches} 次成功 ({self.matches / duration:.1f} 次/秒), '
+            f'{self.match_failures} 次失败',
+        ]
+        return '\n'.join(lines)
+
+
+class Pair:
+    """一对用户：登录、进入同一房间，轮流逐字输入一组配对指令"""
+    
+    def __init__(self, index, args, stats):
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.room_code = f'L{index:05d}'
+        # 第seat个人连接的节点（多个节点时两人分在不同节点上）
+        self.urls = [args.urls[(2 * index + seat) % len(args.urls)] for seat in range(2)]
+        self.clients = [socketio.AsyncClient(reconnection=False) for _ in range(2)]
+        self.roles = [None, None]
+        self.joined = [asyncio.Event(), asyncio.Event()]
+        self.matched = asyncio.Event()
+        # (角色, 指令) -> 提交时间，对方收到command_updated时计算延迟
+        self.pending = {}
+    
+    async def login(self, http, seat):
+        username = f'{self.args.user_prefix}{2 * self.index + seat}'
+        async with http.post(f'{self.urls[seat]}/login', allow_redirects=False,
+                             data={'username': username, 'password': self.args.password}) as response:
+            # 登录成功重定向到主页，失败时返回登录页
+            if response.status != 302 or response.headers.get('Location', '').endswith('/login'):
+                raise RuntimeError(f'{username} 登录失败（{response.status}）')
+        for cookie in http.cookie_jar:
+            if cookie.key == 'session':
+                return f'session={cookie.value}'
+        raise RuntimeError(f'{username} 登录后没有会话Cookie')
+    
+    def bind(self, seat):
+        client = self.clients[seat]
+        
+        @client.on('room_info')
+        async def on_room_info(data):
+            self.roles[seat] = data['user_role']
+            self.joined[seat].set()
+        
+        @client.on('command_updated')
+        async def on_command_updated(data):
+            if data['user_role'] == self.roles[seat]:
+                return
+            sent = self.pending.pop((data['user_role'], data['command']), None)
+            if sent is not None:
+                self.stats.latencies.append(time.perf_counter() - sent)
+        
+        @client.on('match_success')
+        async def on_match_success(data):
+            if seat == 0:
+                self.stats.matches += 1
+                self.matched.set()
+        
+        @client.on('match_failed')
+        async def on_match_failed(data):
+            if seat == 0:
+                self.stats.match_failures += 1
+    
+    async def connect(self, limiter):
+        async with limiter:
+            for seat in range(2):
+                jar = aiohttp.CookieJar(unsafe=True)
+                async with aiohttp.ClientSession(cookie_jar=jar) as http:
+                    try:
+                        cookie = await self.login(http, seat)
+                    except (RuntimeError, aiohttp.ClientError):
+                        self.stats.login_failures += 1
+                        return False
+                self.stats.logins += 1
+                self.bind(seat)
+                try:
+                    await self.clients[seat].connect(self.urls[seat], headers={'Cookie': cookie},
+                                                     transports=self.args.transports)
+                except socketio.exceptions.ConnectionError:
+                    self.stats.connect_failures += 1
+                    return False
+                self.stats.connected += 1
+            for seat in range(2):
+                await self.clients[seat].emit('join_room', {'room_code': self.room_code})
+                await asyncio.wait_for(self.joined[seat].wait(), self.args.timeout)
+        return True
+    
+    async def type_command(self, seat, command):
+        """逐字输入：每输入一个字提交一次当前内容（与页面的input事件一致）"""
+        for length in range(1, len(command) + 1):
+            await asyncio.sleep(random.expovariate(1 / self.args.typing_delay))
+            text = command[:length]
+            self.pending[(self.roles[seat], text)] = time.perf_counter()
+            await self.clients[seat].emit('submit_command', {'command': text})
+            self.stats.submitted += 1
+    
+    async def play(self, deadline):
+        while time.perf_counter() < deadline:
+            pair = random.choice(PRESET_PAIRS)['pair']
+            self.matched.clear()
+            self.pending.clear()
+            await asyncio.gather(self.type_command(0, pair[0]), self.type_command(1, pair[1]))
+            try:
+                await asyncio.wait_for(self.matched.wait(), self.args.timeout)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+    
+    async def close(self):
+        for client in self.clients:
+            if client.connected:
+                await client.disconnect()
+
+
+async def run(args):
+    stats = Stats()
+    pairs = [Pair(i, args, stats) for i in range(args.pairs)]
+    limiter = asyncio.Semaphore(args.concurrency)
+    
+    print(f'建立 {args.pairs} 对（{2 * args.pairs} 个）连接...')
+    stats.connect_started = time.perf_counter()
+    results = await asyncio.gather(*(pair.connect(limiter) for pair in pairs),
+                                   return_exceptions=True)
+    stats.connect_finished = time.perf_counter()
+    ready = [pair for pair, ok in zip(pairs, results) if ok is True]
+    print(f'{len(ready)} 对已进入房间，运行 {args.duration}s...')
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(pair.play(start + args.duration) for pair in ready))
+    duration = time.perf_counter() - start
+    await asyncio.gather(*(pair.close() for pair in pairs), return_exceptions=True)
+    print(stats.report(duration))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SocketIO负载生成器')
+    parser.add_argument('--url', dest='urls', action='append',
+                        help='服务器地址（默认http://127.0.0.1:5000），可多次给出以把每对用户分到不同节点')
+    parser.add_argument('--pairs', type=int, default=100, help='用户对数')
+    parser.add_argument('--duration', type=float, default=60, help='建立连接后的运行时间（秒）')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='同时进行登录/连接的用户对数（登录时服务器要计算密码哈希）')
+    parser.add_argument('--typing-delay', type=float, default=0.15, help='平均每个字的输入间隔（秒）')
+    parser.add_argument('--think-time', type=float, default=1.0, help='匹配后到下一轮输入的平均间隔（秒）')
+    parser.add_argument('--timeout', type=float, default=10, help='等待房间信息或匹配结果的超时（秒）')
+    parser.add_argument('--transport', dest='transports', action='append',
+                        choices=['websocket', 'polling'], help='SocketIO传输方式（默认先轮询后升级）')
+    parser.add_argument('--user-prefix', default='loadtest', help='测试用户名前缀')
+    parser.add_argument('--password', default='Load1234', help='测试用户密码')
+    parser.add_argument('--prepare-users', action='store_true',
+                        help='运行前向数据库写入2×pairs个测试用户（使用与服务器相同的APP_ENV配置）')
+    args = parser.parse_args(argv)
+    args.urls = args.urls or ['http://127.0.0.1:5000']
+    
+    if args.prepare_users:
+        config = load_config(os.getenv('APP_ENV', 'development'))
+        inserted = prepare_users(config, args.user_prefix, 2 * args.pairs, args.password)
+        print(f'写入测试用户 {inserted} 个')
+    return asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+登录哈希对事件循环延迟的影响基准
+在eventlet下模拟并发登录（每个登录一次密码校验），同时用一个协程每5ms处理一次“socket事件”，
+统计事件的调度延迟：在hub中直接哈希时延迟随登录数增长，交给tpool后基本不受影响
+
+用法: python benchmarks/login_hashing.py [并发登录数]
+"""
+import eventlet
+
+eventlet.monkey_patch()
+
+import os  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher  # noqa: E402
+
+METHOD = 'scrypt:32768:8:1'
+TICK = 0.005
+
+
+def run(workers, logins):
+    """返回(登录总耗时, 事件延迟p50, 事件延迟max)，单位毫秒"""
+    hasher = PasswordHasher(METHOD, workers=workers, async_mode='eventlet')
+    password_hash = hasher.hash('Bench123')
+    delays = []
+    done = []
+
+    def ticker():
+        while not done:
+            start = time.perf_counter()
+            eventlet.sleep(TICK)
+            delays.append(time.perf_counter() - start - TICK)
+
+    tick = eventlet.spawn(ticker)
+    eventlet.sleep(TICK * 4)
+    start = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    for _ in range(logins):
+        pool.spawn(hasher.verify, password_hash, 'Bench123')
+    pool.waitall()
+    elapsed = time.perf_counter() - start
+    done.append(True)
+    tick.wait()
+
+    delays.sort()
+    return elapsed * 1e3, delays[len(delays) // 2] * 1e3, delays[-1] * 1e3
+
+
+def main(logins):
+    print(f'{METHOD}，{logins}个并发登录')
+    print(f'{"方式":<14} {"登录总耗时":>12} {"事件延迟p50":>14} {"事件延迟max":>14}')
+    for label, workers in (('hub中直接计算', 0), ('eventlet.tpool', 1)):
+        elapsed, p50, worst = run(workers, logins)
+        print(f'{label:<14} {elapsed:>10.0f}ms {p50:>12.1f}ms {worst:>12.1f}ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,91 @@
+"""
+指标开销基准
+比较submit_command处理函数加与不加耗时统计的单次调用时间（单进程与多进程模式），
+并与经SocketIO测试客户端提交一次指令的总耗时对比
+
+用法: python benchmarks/metrics_overhead.py [调用次数]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def per_call(func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) / count
+
+
+def wrapper_overhead(count):
+    """返回(未装饰耗时, 装饰后耗时)，单位秒"""
+    from metrics import Metrics
+
+    metrics = Metrics()
+
+    def handler():
+        return None
+    timed = metrics.timed_event('submit_command')(handler)
+    per_call(timed, count)
+    return per_call(handler, count), per_call(timed, count)
+
+
+def submit_round_trip(count):
+    """经SocketIO测试客户端提交一次指令的平均耗时（秒）"""
+    from app import app, db, last_login_buffer, socketio
+    from models import User
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        if User.query.filter_by(username='bench').first() is None:
+            user = User(username='bench', email='bench@example.com', nickname='bench')
+            user.set_password('Bench123')
+            db.session.add(user)
+            db.session.commit()
+    http_client = app.test_client()
+    http_client.post('/login', data={'username': 'bench', 'password': 'Bench123'})
+    client = socketio.test_client(app, flask_test_client=http_client)
+    client.emit('join_room', {'room_code': 'BENCH1'})
+
+    def submit():
+        client.emit('submit_command', {'command': '我'})
+        client.get_received()
+    per_call(submit, count // 100)
+    elapsed = per_call(submit, count // 10)
+    client.disconnect()
+    last_login_buffer.flush()
+    return elapsed
+
+
+def main(count):
+    if len(sys.argv) > 2 and sys.argv[2] == '--child':
+        bare, timed = wrapper_overhead(count)
+        print(f'{bare} {timed}')
+        return
+
+    bare, timed = wrapper_overhead(count)
+    print(f'处理函数（单进程模式）: 未装饰 {bare * 1e9:.0f}ns，装饰后 {timed * 1e9:.0f}ns，'
+          f'开销 {(timed - bare) * 1e9:.0f}ns')
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+        output = subprocess.run([sys.executable, __file__, str(count), '--child'], env=env,
+                                check=True, capture_output=True, text=True).stdout
+        bare, timed = (float(value) for value in output.split())
+    print(f'处理函数（多进程模式）: 未装饰 {bare * 1e9:.0f}ns，装饰后 {timed * 1e9:.0f}ns，'
+          f'开销 {(timed - bare) * 1e9:.0f}ns')
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(directory, "bench.db")}'
+        round_trip = submit_round_trip(count)
+    print(f'经测试客户端提交一次指令: {round_trip * 1e6:.1f}µs')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,44 @@
+"""
+配对匹配基准
+比较旧版线性扫描与frozenset哈希索引在不同配对数量下的单次匹配耗时
+
+用法: python benchmarks/pair_lookup.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pairs import PairIndex  # noqa: E402
+
+
+def make_pairs(count):
+    return [{'pair': [f'指令{i}', f'回应{i}'], 'description': f'配对{i}'} for i in range(count)]
+
+
+def linear_check(pairs, command1, command2):
+    """旧版check_match：每次遍历全部配对并构造集合"""
+    for pair in pairs:
+        if set([command1, command2]) == set(pair['pair']):
+            return True, pair['description']
+    return False, None
+
+
+def main():
+    print(f'{"配对数":>8} {"线性扫描(未命中)":>18} {"哈希索引(未命中)":>18} {"哈希索引(命中)":>16}')
+    for count in (6, 100, 1_000, 10_000, 100_000):
+        pairs = make_pairs(count)
+        index = PairIndex(pairs)
+        last = pairs[-1]['pair']
+        # 线性扫描在大规模下很慢，减少迭代次数
+        linear_runs = max(1, 200_000 // count)
+        linear = timeit.timeit(lambda: linear_check(pairs, '不存在', '指令'),
+                               number=linear_runs) / linear_runs
+        miss = timeit.timeit(lambda: index.match('不存在', '指令'), number=200_000) / 200_000
+        hit = timeit.timeit(lambda: index.match(last[1], last[0]), number=200_000) / 200_000
+        print(f'{count:>8} {linear * 1e6:>15.2f} us {miss * 1e6:>15.3f} us {hit * 1e6:>13.3f} us')
+
+
+if __name__ == '__main__':
+    main()
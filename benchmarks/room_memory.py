@@ -0,0 +1,77 @@
+"""
+房间内存占用基准
+比较旧版dict房间布局与__slots__ Room在不同房间数下每个房间的字节数
+
+用法: python benchmarks/room_memory.py [房间数 ...]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_store import MemoryRoomStore, Room  # noqa: E402
+
+
+def room_code(i):
+    return f'{i:06X}'
+
+
+def legacy_rooms(count):
+    """旧版布局：模块级dict，每个房间一个9键dict和一个datetime"""
+    rooms = {}
+    for i in range(count):
+        rooms[room_code(i)] = {
+            'user1': None,
+            'user2': None,
+            'user1_command': '',
+            'user2_command': '',
+            'user1_username': None,
+            'user2_username': None,
+            'status': 'waiting',
+            'created_at': datetime.utcnow()
+        }
+    return rooms
+
+
+def slotted_rooms(count):
+    """仅Room对象（普通dict索引）"""
+    rooms = {}
+    for i in range(count):
+        rooms[room_code(i)] = Room()
+    return rooms
+
+
+def store_rooms(count):
+    """完整的MemoryRoomStore（含LRU顺序维护）"""
+    store = MemoryRoomStore()
+    for i in range(count):
+        store.get_or_create(room_code(i))
+    return store
+
+
+def measure(factory, count):
+    """返回每个房间的平均字节数"""
+    gc.collect()
+    tracemalloc.start()
+    result = factory(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return current / count
+
+
+def main(counts):
+    layouts = [('dict (旧版)', legacy_rooms), ('Room', slotted_rooms),
+               ('MemoryRoomStore', store_rooms)]
+    print(f'{"房间数":>10} ' + ' '.join(f'{name:>18}' for name, _ in layouts))
+    for count in counts:
+        sizes = [measure(factory, count) for _, factory in layouts]
+        print(f'{count:>10} ' + ' '.join(f'{size:>16.0f} B' for size in sizes))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
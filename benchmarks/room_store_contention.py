@@ -0,0 +1,58 @@
+"""
+房间存储锁竞争基准
+在多线程下对不同分片数的ShardedRoomStore执行加入/提交/离开操作，输出吞吐量
+
+用法: python benchmarks/room_store_contention.py [每线程操作轮数]
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_store import ShardedRoomStore  # noqa: E402
+
+ROOMS = [f'{i:06X}' for i in range(10_000)]
+
+
+def worker(store, rounds, seed, barrier):
+    rng = random.Random(seed)
+    barrier.wait()
+    for _ in range(rounds):
+        code = rng.choice(ROOMS)
+        user_id = rng.randrange(1_000_000)
+        role, _ = store.assign_role(code, user_id, 'user')
+        if role:
+            for command in ('x', 'xi', '喜', '喜欢'):
+                store.set_command(code, role, command, user_id)
+            store.release(code, user_id)
+
+
+def run(shards, threads, rounds):
+    """返回每秒操作数（每轮6次存储操作）"""
+    store = ShardedRoomStore(shards=shards)
+    barrier = threading.Barrier(threads + 1)
+    pool = [threading.Thread(target=worker, args=(store, rounds, i, barrier))
+            for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return threads * rounds * 6 / elapsed
+
+
+def main(rounds):
+    thread_counts = (1, 8, 32)
+    print(f'{"分片数":>6} ' + ' '.join(f'{f"{n}线程 ops/s":>16}' for n in thread_counts))
+    for shards in (1, 4, 16, 64):
+        results = [run(shards, n, rounds) for n in thread_counts]
+        print(f'{shards:>6} ' + ' '.join(f'{r:>16,.0f}' for r in results))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
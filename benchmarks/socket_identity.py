@@ -0,0 +1,63 @@
+"""
+SocketIO事件身份解析基准
+比较每个事件解析一次当前用户的几种方式的单次耗时：
+旧版（Flask-Login从会话读取用户ID并查询数据库）、加用户缓存后、以及连接上下文查找
+
+用法: python benchmarks/socket_identity.py [次数]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+
+from flask import g, session  # noqa: E402
+from flask_login import current_user  # noqa: E402
+
+from app import app, connections, db, login_manager, user_cache  # noqa: E402
+from models import User  # noqa: E402
+
+
+def resolve_current_user():
+    """模拟每个事件的新上下文：丢弃g中缓存的用户后读取current_user"""
+    g.pop('_login_user', None)
+    return current_user.id, current_user.nickname
+
+
+def main(number):
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', nickname='bench')
+        user.set_password('Bench123')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    with app.test_request_context('/socket.io/'):
+        session['_user_id'] = str(user_id)
+        cached_loader = login_manager._user_callback
+
+        login_manager._user_callback = lambda uid: db.session.get(User, int(uid))
+        db_time = timeit.timeit(resolve_current_user, number=number) / number
+
+        login_manager._user_callback = cached_loader
+        cache_time = timeit.timeit(resolve_current_user, number=number) / number
+
+    connection = connections.open('bench-sid', user_id, 'bench')
+    context_time = timeit.timeit(
+        lambda: (connections.get('bench-sid').user_id, connection.nickname), number=number
+    ) / number
+    connections.close('bench-sid')
+
+    print(f'{"方式":<28} {"单次耗时":>10}')
+    print(f'{"会话 + 数据库查询（旧版）":<24} {db_time * 1e6:>10.2f} µs')
+    print(f'{"会话 + 用户缓存":<26} {cache_time * 1e6:>10.2f} µs')
+    print(f'{"连接上下文":<28} {context_time * 1e6:>10.2f} µs')
+    print(f'缓存命中率: {user_cache.stats()["hit_rate"]}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,122 @@
+"""
+热路径基准测试（pytest-benchmark）
+房间存储中预先有BENCH_ROOMS个房间，覆盖配对匹配、房间创建与查找、房间码生成、
+用户加载、密码哈希，以及经Flask-SocketIO测试客户端的加入房间与提交指令
+
+结果以pytest-benchmark的JSON格式保存在.benchmarks/，文件名带有提交号，
+make bench-compare与上一次保存的结果比较，中位数变慢超过BENCH_THRESHOLD时失败
+"""
+import pytest
+
+from conftest import BENCH_ROOMS, PASSWORD
+from passwords import PasswordHasher
+
+
+class TestMatching:
+    """配对匹配"""
+    
+    def test_check_match_preset(self, benchmark, bench_app):
+        """内置配对命中（依次查找房间、双方与全局配对）"""
+        from app import check_match
+        with bench_app.app_context():
+            assert benchmark(check_match, '我', '你', 'R00001', (1, 2)) == (True, '我和你')
+    
+    def test_check_match_miss(self, benchmark, bench_app):
+        """所有作用域都未命中"""
+        from app import check_match
+        with bench_app.app_context():
+            assert benchmark(check_match, '我', '他', 'R00001', (1, 2))[0] is False
+
+
+class TestRooms:
+    """房间存储"""
+    
+    def test_get_existing_room(self, benchmark, bench_app):
+        """在BENCH_ROOMS个房间中查找已有房间"""
+        from app import get_or_create_room
+        room = benchmark(get_or_create_room, f'R{BENCH_ROOMS // 2:05d}')
+        assert room.user1 is not None
+    
+    def test_create_room(self, benchmark, bench_app, room_codes):
+        """创建新房间"""
+        from app import get_or_create_room
+        benchmark(lambda: get_or_create_room(next(room_codes)))
+    
+    def test_generate_room_code(self, benchmark):
+        """生成6位房间码"""
+        from app import generate_room_code
+        assert len(benchmark(generate_room_code)) == 6
+
+
+class TestUsers:
+    """用户加载与密码哈希"""
+    
+    def test_load_user_cached(self, benchmark, bench_app):
+        """缓存命中"""
+        from app import load_user
+        with bench_app.app_context():
+            load_user('1')
+            assert benchmark(load_user, '1').username == 'alice'
+    
+    def test_load_user_uncached(self, benchmark, bench_app):
+        """缓存未命中，从数据库加载"""
+        from app import load_user, user_cache
+        with bench_app.app_context():
+            benchmark.pedantic(load_user, args=('1',), setup=lambda: user_cache.invalidate(1),
+                               rounds=500)
+    
+    @pytest.mark.parametrize('method', ['pbkdf2:sha256:60000', 'scrypt:32768:8:1'])
+    def test_hash_password(self, benchmark, method):
+        """生成密码哈希（开发/测试环境与生产环境的默认参数）"""
+        hasher = PasswordHasher(method=method, workers=0)
+        benchmark.pedantic(hasher.hash, args=(PASSWORD,), rounds=10)
+    
+    @pytest.mark.parametrize('method', ['pbkdf2:sha256:60000', 'scrypt:32768:8:1'])
+    def test_verify_password(self, benchmark, method):
+        """校验密码"""
+        hasher = PasswordHasher(method=method, workers=0)
+        password_hash = hasher.hash(PASSWORD)
+        assert benchmark.pedantic(hasher.verify, args=(password_hash, PASSWORD), rounds=10)
+
+
+class TestSocketIO:
+    """经Flask-SocketIO测试客户端处理事件（包括事件分发与向房间广播）"""
+    
+    def test_join_room(self, benchmark, socket_clients, room_codes):
+        """加入新房间（同时离开上一个房间）"""
+        alice, bob = socket_clients
+        
+        def join():
+            alice.emit('join_room', {'room_code': next(room_codes)})
+            return alice.get_received()
+        received = benchmark(join)
+        assert received[-1]['name'] == 'room_info'
+    
+    def test_submit_command(self, benchmark, socket_clients, room_codes):
+        """提交指令（对方尚未提交）"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': next(room_codes)})
+        alice.get_received()
+        
+        def submit():
+            alice.emit('submit_command', {'command': '我'})
+            return alice.get_received()
+        received = benchmark(submit)
+        assert received[-1]['name'] == 'command_updated'
+    
+    def test_submit_command_match(self, benchmark, socket_clients, room_codes):
+        """两人先后提交并匹配成功"""
+        alice, bob = socket_clients
+        room_code = next(room_codes)
+        alice.emit('join_room', {'room_code': room_code})
+        bob.emit('join_room', {'room_code': room_code})
+        alice.get_received()
+        bob.get_received()
+        
+        def submit_pair():
+            alice.emit('submit_command', {'command': '我'})
+            bob.emit('submit_command', {'command': '你'})
+            bob.get_received()
+            return alice.get_received()
+        received = benchmark(submit_pair)
+        assert received[-1]['name'] == 'match_success'
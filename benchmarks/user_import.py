@@ -0,0 +1,79 @@
+"""
+用户批量导入基准
+生成N条用户记录的CSV，流式导入到临时SQLite数据库，输出吞吐量与峰值内存；
+另外对少量明文密码记录比较单进程与多进程哈希的吞吐量
+
+用法: python benchmarks/user_import.py [记录数] [明文密码记录数]
+"""
+import csv
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from models import db  # noqa: E402
+from user_io import UserImporter, export_users, read_rows  # noqa: E402
+
+METHOD = 'pbkdf2:sha256:60000'
+
+
+def write_csv(path, count, plaintext):
+    password_hash = generate_password_hash('Bench123', METHOD)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['username', 'email', 'password' if plaintext else 'password_hash'])
+        for i in range(count):
+            writer.writerow([f'user{i}', f'user{i}@example.com',
+                             f'Pass{i}' if plaintext else password_hash])
+
+
+def make_app(database):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database}'
+    db.init_app(app)
+    return app
+
+
+def run_import(directory, count, plaintext, workers, batch_size=5000):
+    """返回(每秒导入条数, 导入条数)"""
+    source = os.path.join(directory, f'users-{count}-{plaintext}.csv')
+    database = os.path.join(directory, f'import-{count}-{plaintext}-{workers}.db')
+    write_csv(source, count, plaintext)
+    app = make_app(database)
+    with app.app_context():
+        db.create_all()
+        importer = UserImporter(db.session, METHOD, batch_size=batch_size, workers=workers)
+        start = time.perf_counter()
+        with open(source, encoding='utf-8', newline='') as f:
+            _, inserted, _ = importer.run(read_rows(f, 'csv'))
+        elapsed = time.perf_counter() - start
+        if not plaintext:
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as out:
+                exported = export_users(out, 'csv', batch_size)
+            print(f'导出 {exported:,} 条: {exported / (time.perf_counter() - start):,.0f} 条/秒')
+    return inserted / elapsed, inserted
+
+
+def main(count, plaintext_count):
+    with tempfile.TemporaryDirectory() as directory:
+        rate, inserted = run_import(directory, count, False, workers=0)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f'导入 {inserted:,} 条（已哈希）: {rate:,.0f} 条/秒，进程峰值内存 {peak:.0f}MB')
+
+        cores = os.cpu_count() or 1
+        for workers in (0, cores):
+            rate, inserted = run_import(directory, plaintext_count, True, workers=workers)
+            label = '单进程' if workers == 0 else f'{workers}进程'
+            print(f'导入 {inserted:,} 条（明文密码，{METHOD}，{label}哈希）: {rate:,.0f} 条/秒')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2_000)
@@ -0,0 +1,88 @@
+"""
+SocketIO消息编码基准
+比较JSON与MessagePack编码下房间事件（room_info、command_updated、match_success）的
+单条编码/解码耗时与线上字节数，以及开启编码协商后向两人房间广播一条事件的耗时
+
+字节数为WebSocket帧的载荷；长轮询传输会把二进制消息再做base64编码（约增大1/3），
+因此前端只在WebSocket传输上使用MessagePack。
+
+用法: python benchmarks/wire_encoding.py [次数]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio  # noqa: E402
+from socketio import packet  # noqa: E402
+from socketio.msgpack_packet import MsgPackPacket  # noqa: E402
+
+from serialization import NegotiatedPacket, NegotiatingManager  # noqa: E402
+
+EVENTS = {
+    'room_info': {
+        'user1_username': '小明', 'user2_username': '小红',
+        'user1_command': '拥抱', 'user2_command': None,
+        'status': 'active', 'seq': 42, 'room_code': 'AB12CD', 'user_role': 'user1'
+    },
+    'command_updated': {'seq': 43, 'user_role': 'user2', 'command': '拥抱'},
+    'match_success': {
+        'seq': 44, 'description': '温暖的拥抱', 'command_pair': ['拥抱', '拥抱'],
+        'user1_username': '小明', 'user2_username': '小红',
+        'timestamp': datetime(2024, 2, 14, 20, 0).isoformat()
+    },
+}
+
+
+def wire_size(encoded):
+    return len(encoded.encode('utf-8')) if isinstance(encoded, str) else len(encoded)
+
+
+def per_op_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def bench_codec(number):
+    print(f'{"事件":<16}{"编码":<9}{"字节":>6}{"编码(µs)":>11}{"解码(µs)":>11}')
+    for name, data in EVENTS.items():
+        for label, packet_class in (('json', packet.Packet), ('msgpack', MsgPackPacket)):
+            pkt = packet_class(packet.EVENT, data=[name, data], namespace='/')
+            encoded = pkt.encode()
+            encode_us = per_op_us(pkt.encode, number)
+            decode_us = per_op_us(lambda: packet_class(encoded_packet=encoded), number)
+            print(f'{name:<16}{label:<9}{wire_size(encoded):>6}{encode_us:>11.2f}{decode_us:>11.2f}')
+
+
+def broadcast_server(**kwargs):
+    """两人房间：一个JSON客户端与一个MessagePack客户端"""
+    server = socketio.Server(async_mode='threading', **kwargs)
+    server._send_eio_packet = lambda eio_sid, eio_pkt: None
+    server.manager_initialized = True
+    server.manager.initialize()
+    for eio_sid, query in (('json', ''), ('binary', 'serializer=msgpack')):
+        server.environ[eio_sid] = {'QUERY_STRING': query}
+        server.manager.enter_room(server.manager.connect(eio_sid, '/'), '/', 'AB12CD')
+    return server
+
+
+def bench_broadcast(number):
+    data = EVENTS['command_updated']
+    for label, kwargs in (
+        ('默认（全部JSON）', {}),
+        ('编码协商', {'client_manager': NegotiatingManager(), 'serializer': NegotiatedPacket}),
+    ):
+        server = broadcast_server(**kwargs)
+        us = per_op_us(lambda: server.emit('command_updated', data, to='AB12CD'), number)
+        print(f'广播 command_updated {label}: {us:.2f} µs/次')
+
+
+def main(number):
+    bench_codec(number)
+    print()
+    bench_broadcast(number)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
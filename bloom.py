@@ -0,0 +1,213 @@
+"""
+布隆过滤器模块
+用于在不查询数据库的情况下判断用户名/邮箱“一定未被使用”
+"""
+import hashlib
+import math
+import threading
+import time
+
+# 只构建一次（不定时重建）时，构建失败后的重试间隔（秒）
+FILTER_RETRY_INTERVAL = 10
+
+
+class BloomFilter:
+    """布隆过滤器
+
+    判断结果为False时元素一定不存在；为True时可能存在（误判率约为error_rate）。
+    位数组保存在bytearray中，100万个元素、1%误判率约占1.2MB。
+    每个元素用blake2b计算一次128位摘要，拆成两个64位哈希，
+    以h1 + i*h2的方式生成k个位置，避免计算k次独立哈希。
+    """
+
+    __slots__ = ('capacity', 'error_rate', 'size', 'hashes', 'count', '_bits')
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        """添加元素"""
+        bits = self._bits
+        for position in self._positions(value):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+    def __len__(self):
+        return self.count
+
+
+class UserFilter:
+    """用户名与邮箱的布隆过滤器
+
+    由后台任务通过loader从users表构建（见run_filter_builder），查询期间不持有锁，
+    检查请求不会等待全表扫描；构建完成前might_exist一律返回True，调用方照常查询数据库。
+    本进程注册的用户随即加入。其他worker注册用户后共享的版本号加一，
+    每个进程至多每check_interval秒读取一次版本号，发现变化时只读取ID大于已读最大ID的新用户。
+    后台任务每隔一段时间完整重建一次（用户数超过容量时按两倍容量重建，使误判率保持在设定值附近），
+    补上导入工具写入的用户和提交顺序与ID顺序不一致时漏读的用户；这些用户在重建前可能被误报可用，
+    但注册时的唯一索引仍会拒绝重复。
+
+    loader(since_id)返回ID大于since_id（为None时为全部）的用户的(id, username, email)。
+    """
+
+    FIELDS = ('username', 'email')
+
+    def __init__(self, loader, capacity=100000, error_rate=0.01, version_source=None,
+                 check_interval=1.0, clock=time.monotonic):
+        self._loader = loader
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._version_source = version_source
+        self.check_interval = check_interval
+        self._clock = clock
+        self._filters = None
+        self._last_id = None
+        self._version = None
+        self._checked_at = None
+        self._generation = 0
+        self._added_during_build = None
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.lookups = 0
+        self.rebuilds = 0
+
+    def _load(self, filters, since_id):
+        """把ID大于since_id的用户加入过滤器，返回读到的最大ID"""
+        last_id = since_id
+        for user_id, username, email in self._loader(since_id):
+            filters['username'].add(username)
+            filters['email'].add(email)
+            if last_id is None or user_id > last_id:
+                last_id = user_id
+        return last_id
+
+    def _read_version(self):
+        return self._version_source() if self._version_source is not None else None
+
+    def rebuild(self):
+        """从users表完整重建过滤器（由后台任务调用），返回是否替换了当前过滤器"""
+        checked_at, version = self._clock(), self._read_version()
+        with self._lock:
+            generation = self._generation
+            # 构建期间本进程注册的用户记录下来，替换时补入新过滤器
+            self._added_during_build = []
+        capacity = self.capacity
+        while True:
+            filters = {field: BloomFilter(capacity, self.error_rate) for field in self.FIELDS}
+            last_id = self._load(filters, None)
+            if len(filters['username']) <= capacity:
+                break
+            capacity *= 2
+        with self._lock:
+            added, self._added_during_build = self._added_during_build, None
+            if generation != self._generation:
+                # 构建期间被invalidate（如数据库被重建），结果作废
+                return False
+            for username, email in added:
+                filters['username'].add(username)
+                filters['email'].add(email)
+            self._filters = filters
+            self.capacity = capacity
+            self._last_id = last_id
+            # 构建开始前读取的版本号：构建期间其他worker的注册会使版本号变化，下次检查时补读
+            self._version = version
+            self._checked_at = checked_at
+            self.rebuilds += 1
+        return True
+
+    def _refresh_version(self):
+        if self._version_source is None or self._filters is None:
+            return
+        now = self._clock()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self._version_source()
+        if version == self._version:
+            return
+        # 只读取新注册的用户（主键范围查询），查询期间不持有锁
+        with self._lock:
+            generation, since_id = self._generation, self._last_id
+        rows = list(self._loader(since_id))
+        with self._lock:
+            filters = self._filters
+            if generation != self._generation or filters is None:
+                return
+            for user_id, username, email in rows:
+                filters['username'].add(username)
+                filters['email'].add(email)
+                if self._last_id is None or user_id > self._last_id:
+                    self._last_id = user_id
+            self._version = version
+
+    def add(self, username, email):
+        """加入本进程新注册的用户（过滤器尚未构建时忽略，构建时会从数据库读到）"""
+        with self._lock:
+            if self._added_during_build is not None:
+                self._added_during_build.append((username, email))
+            filters = self._filters
+            if filters is None:
+                return
+            filters['username'].add(username)
+            filters['email'].add(email)
+
+    def invalidate(self):
+        """丢弃过滤器（进行中的构建结果也作废），由后台任务重新构建"""
+        with self._lock:
+            self._filters = None
+            self._last_id = None
+            self._version = None
+            self._checked_at = None
+            self._generation += 1
+
+    def might_exist(self, field, value):
+        """值可能已被使用时返回True；返回False时一定未被使用"""
+        self._refresh_version()
+        filters = self._filters
+        result = filters is None or value in filters[field]
+        with self._lock:
+            self.lookups += 1
+            if not result:
+                self.fast_path += 1
+        return result
+
+    def stats(self):
+        """过滤器大小、重建次数与无需查询数据库的比例"""
+        filters = self._filters
+        return {
+            'users': len(filters['username']) if filters else 0,
+            'capacity': self.capacity,
+            'rebuilds': self.rebuilds,
+            'lookups': self.lookups,
+            'fast_path': self.fast_path
+        }
+
+
+def run_filter_builder(user_filter, interval, sleep, logger=None):
+    """后台循环：立即构建过滤器，之后每隔interval秒完整重建一次（interval为0时只构建一次）"""
+    while True:
+        try:
+            user_filter.rebuild()
+            if not interval:
+                return
+        except Exception as e:
+            # 构建失败（如数据库暂时不可用）时检查接口照常查询数据库，稍后重试
+            if logger is not None:
+                logger.error(f'Build user filter failed: {str(e)}')
+        sleep(interval or FILTER_RETRY_INTERVAL)
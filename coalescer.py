@@ -0,0 +1,80 @@
+"""
+指令合并模块
+将同一房间同一角色在短时间窗口内的多次指令提交合并为一次处理
+"""
+import threading
+
+
+class CommandCoalescer:
+    """按(房间码, 用户ID)合并指令提交
+
+    窗口内第一次提交时安排一个延迟任务，之后的提交只覆盖待处理的指令；
+    窗口结束时只处理最后一次的指令。因此无论客户端输入多快，
+    每个用户每个窗口最多触发一次广播和一次匹配检查。
+    window为0时不合并，每次提交立即处理。
+
+    待处理的指令记录提交者，用户离开房间时调用discard丢弃，
+    flush也会再次确认座位仍属于该用户，窗口内换了人的座位不会收到旧指令。
+    """
+
+    def __init__(self, window, flush, spawn, sleep, logger=None):
+        self.window = window
+        self._flush = flush
+        self._spawn = spawn
+        self._sleep = sleep
+        self._logger = logger
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.inbound = 0
+        self.collapsed = 0
+        self.flushed = 0
+
+    def submit(self, room_code, user_id, role, command):
+        """提交指令"""
+        if self.window <= 0:
+            with self._lock:
+                self.inbound += 1
+                self.flushed += 1
+            self._flush(room_code, role, command, user_id)
+            return
+
+        key = (room_code, user_id)
+        with self._lock:
+            self.inbound += 1
+            if key in self._pending:
+                self._pending[key] = (role, command)
+                self.collapsed += 1
+                return
+            self._pending[key] = (role, command)
+        self._spawn(self._flush_later, key)
+
+    def discard(self, room_code, user_id):
+        """丢弃用户在房间中待处理的指令（用户离开房间时调用）"""
+        with self._lock:
+            return self._pending.pop((room_code, user_id), None) is not None
+
+    def _flush_later(self, key):
+        self._sleep(self.window)
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                # 窗口内用户已离开房间
+                return
+            self.flushed += 1
+        room_code, user_id = key
+        role, command = entry
+        try:
+            self._flush(room_code, role, command, user_id)
+        except Exception as e:
+            if self._logger is not None:
+                self._logger.exception(f'Apply command failed in room {room_code}: {str(e)}')
+
+    def stats(self):
+        """返回合并统计：收到的提交数、被合并掉的提交数和实际处理数"""
+        with self._lock:
+            return {
+                'inbound': self.inbound,
+                'collapsed': self.collapsed,
+                'flushed': self.flushed,
+                'pending': len(self._pending)
+            }
@@ -21,6 +21,36 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///users.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # 数据库连接池（SQLite不使用）：常驻连接数、额外连接数、获取连接超时（秒）、
+    # 连接回收时间（秒）及使用前检测连接是否可用
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    
+    # 只读副本（逗号分隔的数据库URL，为空表示不启用读写分离）；
+    # 用户写入后REPLICA_STICKY_SECONDS秒内的读取使用主库，副本出错后REPLICA_COOLDOWN秒内不使用，
+    # 后台每REPLICA_CHECK_INTERVAL秒探测一次副本
+    DATABASE_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    REPLICA_COOLDOWN = int(os.getenv('REPLICA_COOLDOWN', 30))
+    REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 10))
+    
+    # Prometheus指标（/metrics，需安装prometheus_client）及后台合并事件指标、更新房间数/连接数的间隔（秒）；
+    # 多个gunicorn worker时需设置环境变量PROMETHEUS_MULTIPROC_DIR
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_REFRESH_INTERVAL = int(os.getenv('METRICS_REFRESH_INTERVAL', 15))
+    
+    # 性能剖析：响应中返回Server-Timing头（db、hash、render耗时），SocketIO事件超过SLOW_EVENT_MS毫秒时记录日志；
+    # 设置PROFILING_TOKEN后可通过POST /admin/profile采样调用栈，结果写入PROFILING_OUTPUT_DIR
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'False').lower() == 'true'
+    SLOW_EVENT_MS = int(os.getenv('SLOW_EVENT_MS', 100))
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+    PROFILING_OUTPUT_DIR = os.getenv('PROFILING_OUTPUT_DIR', str(BASE_DIR / 'logs' / 'profiles'))
+    PROFILING_INTERVAL_MS = int(os.getenv('PROFILING_INTERVAL_MS', 5))
+    PROFILING_MAX_SECONDS = int(os.getenv('PROFILING_MAX_SECONDS', 60))
+    
     # 服务器配置
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
@@ -41,6 +71,68 @@ class Config:
     # SocketIO配置
     SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'eventlet')
     SOCKETIO_CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '*')
+    # 消息队列（Redis地址，多worker/多节点时必须配置，为空时广播只到达本进程的客户端）、频道名，
+    # 及批量发布的等待时间（秒，0表示不额外等待，只合并上一批写入期间到达的消息）
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    SOCKETIO_PUBLISH_WINDOW = float(os.getenv('SOCKETIO_PUBLISH_WINDOW', 0))
+    # 允许客户端选择MessagePack编码（需安装msgpack；JSON客户端不受影响）
+    SOCKETIO_MSGPACK = os.getenv('SOCKETIO_MSGPACK', 'False').lower() == 'true'
+    
+    # 按房间码一致性哈希路由：所有节点名（逗号分隔，为空时不启用）、本节点名（必须在列表中）及每个节点的虚拟节点数
+    CLUSTER_NODES = os.getenv('CLUSTER_NODES', '')
+    NODE_NAME = os.getenv('NODE_NAME', '')
+    HASH_RING_REPLICAS = int(os.getenv('HASH_RING_REPLICAS', 160))
+    
+    # 房间状态存储配置（memory: 单进程内存; redis: 多worker/多节点共享）
+    ROOM_STORE_BACKEND = os.getenv('ROOM_STORE_BACKEND', 'memory')
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_KEY_PREFIX = os.getenv('REDIS_KEY_PREFIX', 'heartsync:')
+    # 内存后端的分片数（每个分片一把锁），1表示不分片
+    ROOM_STORE_SHARDS = int(os.getenv('ROOM_STORE_SHARDS', 16))
+    
+    # 房间生命周期：空闲超时（秒）、房间数上限与后台清理间隔（秒），0表示不启用
+    ROOM_IDLE_TTL = int(os.getenv('ROOM_IDLE_TTL', 3600))
+    ROOM_MAX_ROOMS = int(os.getenv('ROOM_MAX_ROOMS', 100000))
+    ROOM_SWEEP_INTERVAL = int(os.getenv('ROOM_SWEEP_INTERVAL', 60))
+    
+    # 配对指令文件（JSON，为空时使用内置PRESET_PAIRS）及检查修改的间隔（秒，0表示不自动重新加载）
+    PRESET_PAIRS_FILE = os.getenv('PRESET_PAIRS_FILE', '')
+    PAIRS_RELOAD_INTERVAL = int(os.getenv('PAIRS_RELOAD_INTERVAL', 30))
+    
+    # 自定义配对缓存：缓存的作用域数量上限，及检查共享版本号的间隔（秒）
+    PAIR_CACHE_SIZE = int(os.getenv('PAIR_CACHE_SIZE', 10000))
+    PAIR_CACHE_CHECK_INTERVAL = float(os.getenv('PAIR_CACHE_CHECK_INTERVAL', 1.0))
+    
+    # 指令合并窗口（秒）：同一角色在窗口内的多次提交只处理最后一次，0表示不合并
+    SUBMIT_COALESCE_WINDOW = float(os.getenv('SUBMIT_COALESCE_WINDOW', 0.1))
+    
+    # 用户缓存：TTL（秒）、缓存用户数上限，及是否使用Redis共享二级缓存（需ROOM_STORE_BACKEND=redis）
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_SHARED = os.getenv('USER_CACHE_SHARED', 'False').lower() == 'true'
+    
+    # 密码哈希：算法与参数（Werkzeug格式，参数变化后用户下次登录时自动升级），及哈希线程数（0表示在请求线程中计算）
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+    
+    # 最后登录时间批量写入：写入间隔（秒，0表示不定时写入）与触发写入的缓冲条数
+    LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', 5))
+    LAST_LOGIN_BATCH_SIZE = int(os.getenv('LAST_LOGIN_BATCH_SIZE', 500))
+    
+    # 配对记录批量写入：写入间隔（秒，0表示不定时写入）、每批条数，及积压上限（超出时丢弃新记录）
+    MATCH_FLUSH_INTERVAL = float(os.getenv('MATCH_FLUSH_INTERVAL', 2))
+    MATCH_BATCH_SIZE = int(os.getenv('MATCH_BATCH_SIZE', 500))
+    MATCH_QUEUE_MAX = int(os.getenv('MATCH_QUEUE_MAX', 50000))
+    # 同一批配对记录连续写入失败多少次后丢弃
+    MATCH_MAX_ATTEMPTS = int(os.getenv('MATCH_MAX_ATTEMPTS', 30))
+    
+    # 用户名/邮箱布隆过滤器：预计用户数（超出时自动扩容）、误判率、
+    # 后台完整重建间隔（秒，0表示只在启动时构建）与读取共享版本号的间隔（秒，用于同步其他worker新注册的用户）
+    USER_FILTER_CAPACITY = int(os.getenv('USER_FILTER_CAPACITY', 100000))
+    USER_FILTER_ERROR_RATE = float(os.getenv('USER_FILTER_ERROR_RATE', 0.01))
+    USER_FILTER_REBUILD_INTERVAL = int(os.getenv('USER_FILTER_REBUILD_INTERVAL', 3600))
+    USER_FILTER_CHECK_INTERVAL = float(os.getenv('USER_FILTER_CHECK_INTERVAL', 1.0))
     
     # 部署相关
     APP_ENV = os.getenv('APP_ENV', 'development')
@@ -66,6 +158,9 @@ class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
     SESSION_COOKIE_SECURE = False
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:60000')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
 
 
 class StagingConfig(Config):
@@ -73,6 +168,9 @@ class StagingConfig(Config):
     DEBUG = False
     TESTING = True
     SESSION_COOKIE_SECURE = False
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:60000')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
 
 
 class ProductionConfig(Config):
@@ -84,6 +182,11 @@ class ProductionConfig(Config):
     # 生产环境强制HTTPS
     PREFERRED_URL_SCHEME = 'https'
     
+    # 生产环境连接池（每个worker进程一个连接池，总连接数不应超过数据库的max_connections）
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 900))
+    
     @staticmethod
     def init_app(app):
         Config.init_app(app)
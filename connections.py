@@ -0,0 +1,78 @@
+"""
+连接上下文模块
+在SocketIO连接建立时解析一次用户身份，按sid保存，事件处理时直接读取
+"""
+import threading
+import time
+
+
+class Connection:
+    """一个SocketIO连接的上下文
+
+    用户身份在连接时从会话中解析；房间和角色在加入房间时由服务器分配，
+    之后的事件以此为准，不再信任客户端发送的角色。
+    """
+
+    __slots__ = ('sid', 'user_id', 'nickname', 'room_code', 'user_role', 'connected_at')
+
+    def __init__(self, sid, user_id, nickname):
+        self.sid = sid
+        self.user_id = user_id
+        self.nickname = nickname
+        self.room_code = None
+        self.user_role = None
+        self.connected_at = time.time()
+
+    def enter(self, room_code, user_role):
+        """记录加入的房间和分配的角色"""
+        self.room_code = room_code
+        self.user_role = user_role
+
+    def leave(self):
+        """清除房间和角色，返回离开前的房间码"""
+        room_code = self.room_code
+        self.room_code = None
+        self.user_role = None
+        return room_code
+
+    def __repr__(self):
+        return f'<Connection {self.sid} user={self.user_id} room={self.room_code}>'
+
+
+class ConnectionRegistry:
+    """按sid保存本worker上的连接上下文
+
+    SocketIO的连接总是由同一个worker处理，因此上下文只需保存在进程内。
+    """
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def open(self, sid, user_id, nickname):
+        """连接建立时创建上下文"""
+        connection = Connection(sid, user_id, nickname)
+        with self._lock:
+            self._connections[sid] = connection
+        return connection
+
+    def get(self, sid):
+        """获取连接上下文，未建立时返回None"""
+        return self._connections.get(sid)
+
+    def close(self, sid):
+        """连接断开时移除上下文，返回被移除的上下文"""
+        with self._lock:
+            return self._connections.pop(sid, None)
+
+    def __len__(self):
+        return len(self._connections)
+
+    def stats(self):
+        """当前连接数与已加入房间的连接数"""
+        with self._lock:
+            connections = list(self._connections.values())
+        return {
+            'connections': len(connections),
+            'in_room': sum(1 for c in connections if c.room_code is not None)
+        }
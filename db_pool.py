@@ -0,0 +1,124 @@
+"""
+数据库连接池模块
+按环境配置SQLAlchemy连接池，并统计连接获取的等待时间与连接池饱和度
+"""
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# 等待时间直方图的桶上限（秒）
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录获取连接等待时间的QueuePool
+
+    连接池的空闲连接用完时，获取连接要等待其他请求归还，这段等待直接计入请求延迟。
+    这里统计每次获取连接的耗时分布、超时次数与同时借出连接数的峰值，
+    据此判断pool_size/max_overflow是否够用：等待时间长、峰值接近上限说明连接池偏小。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._wait_counts = [0] * len(WAIT_BUCKETS)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._peak_in_use = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        in_use = self.checkedout()
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self._wait_counts[i] += 1
+                    break
+            self._peak_in_use = max(self._peak_in_use, in_use)
+        return connection
+
+    def stats(self):
+        """连接池统计：容量、当前借出数、饱和度与获取连接的等待时间"""
+        capacity = self.size() + max(self._max_overflow, 0)
+        in_use = self.checkedout()
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'in_use': in_use,
+                'peak_in_use': self._peak_in_use,
+                'saturation': round(in_use / capacity, 4) if capacity else 0.0,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'wait_avg_ms': round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+                'wait_buckets': dict(zip(('%g' % b for b in WAIT_BUCKETS), self._wait_counts)),
+            }
+
+
+def engine_options(config):
+    """根据配置生成SQLALCHEMY_ENGINE_OPTIONS
+
+    SQLite不使用连接池参数（Flask-SQLAlchemy会为其选择合适的连接池），返回空配置。
+    """
+    uri = getattr(config, 'SQLALCHEMY_DATABASE_URI', '')
+    if uri.startswith('sqlite'):
+        return {}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT,
+        'pool_recycle': config.DB_POOL_RECYCLE,
+        'pool_pre_ping': config.DB_POOL_PRE_PING,
+    }
+
+
+def pool_stats(engine):
+    """返回引擎连接池的统计（非InstrumentedQueuePool时返回None）"""
+    pool = engine.pool
+    return pool.stats() if isinstance(pool, InstrumentedQueuePool) else None
+
+
+def patch_for_green_threads(async_mode, logger=None):
+    """eventlet模式下让数据库驱动与连接池配合绿色线程
+
+    连接池的等待基于threading.Condition，只有在threading被eventlet打过补丁时
+    等待才会让出hub；psycopg2是C扩展，需要psycogreen才能以非阻塞方式执行查询。
+    """
+    if async_mode != 'eventlet':
+        return
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return
+    if not patcher.is_monkey_patched('thread') and logger is not None:
+        logger.warning('eventlet mode without monkey patching: '
+                       'database pool waits will block the hub')
+    try:
+        import psycopg2  # noqa: F401
+    except ImportError:
+        return
+    try:
+        from psycogreen.eventlet import patch_psycopg
+    except ImportError:
+        if logger is not None:
+            logger.warning('eventlet mode with psycopg2 but psycogreen is not installed: '
+                           'database queries will block the hub (pip install psycogreen)')
+        return
+    patch_psycopg()
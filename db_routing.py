@@ -0,0 +1,201 @@
+"""
+读写分离模块
+只读查询路由到只读副本，写入及写入之后的读取使用主库，副本不可用时回退到主库
+（连接副本失败的那次读取也在主库上重试一次）
+"""
+import itertools
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+
+# 副本在SQLALCHEMY_BINDS中的键名前缀
+REPLICA_BIND_PREFIX = 'replica'
+
+# Flask会话中记录“在此时间之前读主库”的键
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+
+def replica_binds(urls):
+    """将副本URL列表转换为SQLALCHEMY_BINDS项"""
+    return {f'{REPLICA_BIND_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+
+class ReplicaRouter:
+    """在健康的副本之间轮询选择
+
+    副本连接出错时标记为不可用，cooldown秒内的读取回退到主库，出错的那次读取由RoutingSession在主库上重试；
+    后台检查（run_replica_checker）定期探测所有副本，恢复后重新启用。
+    """
+
+    def __init__(self, bind_keys, cooldown=30, clock=time.monotonic):
+        self.bind_keys = list(bind_keys)
+        self.cooldown = cooldown
+        self._clock = clock
+        self._down_until = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failures = 0
+        self.retries = 0
+
+    def choose(self):
+        """返回一个健康副本的键，没有时返回None"""
+        now = self._clock()
+        healthy = [key for key in self.bind_keys if self._down_until.get(key, 0) <= now]
+        with self._lock:
+            if not healthy:
+                self.primary_reads += 1
+                return None
+            self.replica_reads += 1
+            return healthy[next(self._counter) % len(healthy)]
+
+    def mark_down(self, key):
+        """标记副本不可用"""
+        with self._lock:
+            self._down_until[key] = self._clock() + self.cooldown
+            self.failures += 1
+
+    def mark_up(self, key):
+        """标记副本恢复"""
+        with self._lock:
+            self._down_until.pop(key, None)
+
+    def record_retry(self):
+        """记录一次副本失败后在主库上的重试"""
+        with self._lock:
+            self.retries += 1
+
+    def is_healthy(self, key):
+        return self._down_until.get(key, 0) <= self._clock()
+
+    def attach(self, engines):
+        """监听副本引擎的连接错误"""
+        for key in self.bind_keys:
+            sa.event.listen(engines[key], 'handle_error', self._error_handler(key))
+
+    def _error_handler(self, key):
+        def handle_error(context):
+            # 连接失败（connection为None）或连接断开时认为副本不可用，语句本身的错误不影响
+            if context.connection is None or context.is_disconnect:
+                self.mark_down(key)
+        return handle_error
+
+    def check(self, engines):
+        """探测每个副本，更新可用状态"""
+        for key in self.bind_keys:
+            try:
+                with engines[key].connect() as connection:
+                    connection.execute(sa.text('SELECT 1'))
+            except sa.exc.DBAPIError:
+                self.mark_down(key)
+            else:
+                self.mark_up(key)
+
+    def stats(self):
+        """副本状态与读取分布"""
+        with self._lock:
+            return {
+                'replicas': {key: self.is_healthy(key) for key in self.bind_keys},
+                'replica_reads': self.replica_reads,
+                'primary_reads': self.primary_reads,
+                'failures': self.failures,
+                'retries': self.retries
+            }
+
+
+class RoutingSession(Session):
+    """按语句类型选择主库或副本的会话
+
+    以下情况使用主库，其余只读查询交给ReplicaRouter选择的副本：
+    flush中的写入、INSERT/UPDATE/DELETE、SELECT ... FOR UPDATE、文本SQL与未指明语句的连接，
+    本会话已经写入过（之后的读取要能看到自己的写入），
+    以及当前用户在最近REPLICA_STICKY_SECONDS秒内写入过（跨请求读到自己的写入，避开复制延迟）。
+    读取因副本连接失败（副本随即被标记为不可用）而出错时，回滚只读事务并在主库上重试一次。
+    未配置副本时与普通会话相同。
+    """
+
+    _replica_key = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        router = current_app.extensions.get('replica_router')
+        if bind is not None or router is None or self._use_primary(clause):
+            return primary
+        key = router.choose()
+        if key is None:
+            return primary
+        self._replica_key = key
+        return self._db.engines[key]
+
+    def execute(self, statement, *args, **kwargs):
+        self._replica_key = None
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except sa.exc.DBAPIError:
+            key = self._replica_key
+            router = current_app.extensions.get('replica_router')
+            # 只重试副本连接失败的读取；语句本身的错误（副本仍健康）照常抛出
+            if key is None or router is None or router.is_healthy(key):
+                raise
+        router.record_retry()
+        self.rollback()
+        self.info['primary_only'] = True
+        try:
+            return super().execute(statement, *args, **kwargs)
+        finally:
+            self.info.pop('primary_only', None)
+
+    def _use_primary(self, clause):
+        if self._flushing or self.info.get('wrote') or self.info.get('primary_only') or clause is None:
+            return True
+        if isinstance(clause, (sa.sql.expression.UpdateBase, sa.sql.expression.TextClause)):
+            return True
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return True
+        if has_request_context():
+            return flask_session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+        return False
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def remember_write(session, flush_context):
+    """记录本会话已写入"""
+    session.info['wrote'] = True
+    session.info['wrote_in_transaction'] = True
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def stick_to_primary(session):
+    """写入提交后，当前用户在一段时间内的读取使用主库"""
+    if session.info.pop('wrote_in_transaction', False) and has_request_context():
+        sticky = current_app.config.get('REPLICA_STICKY_SECONDS', 0)
+        if sticky and 'replica_router' in current_app.extensions:
+            flask_session[PRIMARY_UNTIL_KEY] = time.time() + sticky
+
+
+def init_replicas(app, urls, cooldown=30):
+    """注册副本：副本作为SQLALCHEMY_BINDS的额外引擎，需在db.init_app之前调用"""
+    if not urls:
+        return None
+    binds = replica_binds(urls)
+    app.config.setdefault('SQLALCHEMY_BINDS', {}).update(binds)
+    router = ReplicaRouter(binds, cooldown=cooldown)
+    app.extensions['replica_router'] = router
+    return router
+
+
+def run_replica_checker(app, db, router, interval, sleep, logger=None):
+    """后台循环：定期探测副本可用性"""
+    while True:
+        sleep(interval)
+        try:
+            with app.app_context():
+                router.check(db.engines)
+        except Exception as e:
+            # 探测本身出错（非数据库错误）不应终止循环，否则已标记不可用的副本永远不会恢复
+            if logger is not None:
+                logger.exception(f'Replica check failed: {str(e)}')
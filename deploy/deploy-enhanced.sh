@@ -336,7 +336,9 @@ User=www-data
 Group=www-data
 WorkingDirectory=${PROJECT_DIR}/current
 Environment="PATH=${PROJECT_DIR}/venv/bin"
-ExecStart=${PROJECT_DIR}/venv/bin/gunicorn -w 4 -b 127.0.0.1:${PORT} --timeout 120 --access-logfile - --error-logfile - app:app
+Environment="PROMETHEUS_MULTIPROC_DIR=/run/${SERVICE_NAME}/metrics"
+RuntimeDirectory=${SERVICE_NAME}
+ExecStart=${PROJECT_DIR}/venv/bin/gunicorn -c deploy/gunicorn.conf.py -w 4 -b 127.0.0.1:${PORT} --timeout 120 --access-logfile - --error-logfile - app:app
 Restart=always
 RestartSec=10
 
@@ -0,0 +1,21 @@
+"""
+Gunicorn配置
+多worker时Prometheus指标写入PROMETHEUS_MULTIPROC_DIR，由任意worker的/metrics合并输出
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    """主进程启动时清空上次运行留下的指标文件"""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """worker退出后不再计入连接数、房间数等按存活worker汇总的指标"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -179,6 +179,13 @@ show_performance_report() {
     local health_status=$(curl -f -s http://localhost:5000/health > /dev/null 2>&1 && echo "健康" || echo "不健康")
     echo "健康状态: $health_status"
     
+    # 应用指标（房间数、连接数、匹配次数）
+    local app_metrics=$(curl -f -s http://localhost:5000/metrics 2>/dev/null | grep -E '^heartsync_(rooms|connections|matches_total|match_failures_total) ')
+    if [ -n "$app_metrics" ]; then
+        echo "应用指标:"
+        echo "$app_metrics"
+    fi
+    
     # 运行时间
     local uptime=$(systemctl show ${PROJECT_NAME} --property=ActiveEnterTimestamp | cut -d'=' -f2)
     if [ -n "$uptime" ]; then
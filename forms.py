@@ -21,19 +21,7 @@ class RegistrationForm(FlaskForm):
                                               EqualTo('password', message='两次密码输入不一致')])
     submit = SubmitField('注册')
     
-    def validate_username(self, username):
-        """验证用户名是否已被使用"""
-        from models import User
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('用户名已被使用')
-    
-    def validate_email(self, email):
-        """验证邮箱是否已被注册"""
-        from models import User
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('邮箱已被注册')
+    # 用户名和邮箱是否重复不在表单中查询，由注册时INSERT触发的唯一索引冲突判断
     
     def validate_password(self, password):
         """验证密码强度"""
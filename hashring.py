@@ -0,0 +1,80 @@
+"""
+一致性哈希模块
+把房间码映射到应用节点：每个节点在内存中保存自己负责的房间，
+nginx按URL中的节点参数把同一房间的两人转发到同一个节点，房间事件不再经过共享存储
+"""
+import bisect
+import hashlib
+
+# 协作页面与SocketIO连接URL中携带房间所属节点名的查询参数，nginx据此选择上游（见deploy/nginx.conf）
+# 路由信息随URL走而不是放在整个域名共享的Cookie里，同一浏览器的多个标签页可以分别在不同节点的房间中
+NODE_PARAM = 'node'
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """一致性哈希环
+
+    每个节点在环上放置replicas个虚拟节点，键顺时针找到的第一个虚拟节点所属的节点即为负责节点。
+    增加或移除一个节点时，只有落在该节点虚拟节点上的键改变归属（约为1/节点数），
+    其他房间仍由原节点负责。所有节点（以及生成路由的nginx配置）必须使用相同的节点列表。
+    """
+
+    def __init__(self, nodes=(), replicas=160):
+        self.replicas = replicas
+        self._points = []
+        self._owners = []
+        self._nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return sorted(self._nodes)
+
+    def add(self, node):
+        """加入节点（已存在时忽略）"""
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f'{node}#{i}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        """移除节点（不存在时忽略）"""
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key):
+        """返回负责key的节点，环为空时返回None"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key))
+        return self._owners[index % len(self._points)]
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+
+def create_hash_ring(config):
+    """根据配置创建哈希环，未配置CLUSTER_NODES时返回None（单节点或共享存储部署）"""
+    nodes = [node.strip() for node in getattr(config, 'CLUSTER_NODES', '').split(',') if node.strip()]
+    if not nodes:
+        return None
+    node_name = getattr(config, 'NODE_NAME', '')
+    if node_name not in nodes:
+        raise ValueError(f'NODE_NAME必须是CLUSTER_NODES中的一个: {node_name!r}')
+    return HashRing(nodes, replicas=getattr(config, 'HASH_RING_REPLICAS', 160))
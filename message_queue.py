@@ -0,0 +1,143 @@
+"""
+消息队列模块
+多个worker/节点通过Redis发布订阅转发SocketIO广播，使分在不同进程上的两个用户也能收到对方的事件；
+发布的消息按批以pipeline写入Redis，每次广播不再单独一次往返
+"""
+import pickle
+import threading
+
+import redis
+import socketio
+
+from serialization import NegotiatingManager
+
+
+class BatchingRedisManager(socketio.RedisManager, NegotiatingManager):
+    """批量发布的Redis客户端管理器
+
+    与socketio.RedisManager的消息格式和频道相同，可以与未开启批量的节点、
+    以及只写模式的外部发送端（如脚本中的SocketIO(message_queue=...)）混用。
+
+    emit时本进程的客户端立即收到，发往其他节点的消息放入缓冲：
+    缓冲由空变为非空时唤醒常驻的后台发布任务，等待window秒后把缓冲中的全部消息
+    以一个pipeline发布（window为0时不额外等待，上一批写入期间到达的消息自然并入下一批）。
+    只有一个发布任务，同一进程发布的消息到达其他节点的顺序不变。
+
+    发往单个连接（房间名是本进程的sid，如emit回复当前客户端）的消息只在本进程处理，不发布。
+    client_factory返回Redis客户端，默认按url连接，测试中可换成共享同一FakeServer的fakeredis。
+    送达本进程的客户端时按连接选择JSON或MessagePack编码（见serialization.NegotiatingManager）。
+    """
+
+    name = 'redis-batching'
+
+    def __init__(self, url='redis://localhost:6379/0', channel='socketio', write_only=False,
+                 logger=None, redis_options=None, window=0.0, client_factory=None):
+        self.window = window
+        self._client_factory = client_factory
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._wakeup = None
+        self.published = 0
+        self.local = 0
+        self.batches = 0
+        self.failures = 0
+        super().__init__(url, channel=channel, write_only=write_only, logger=logger,
+                         redis_options=redis_options)
+
+    def _redis_connect(self):
+        if self._client_factory is None:
+            return super()._redis_connect()
+        self.redis = self._client_factory()
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+
+    def emit(self, event, data, namespace=None, room=None, skip_sid=None, callback=None, **kwargs):
+        if room is not None and not kwargs.get('ignore_queue') and self.server is not None \
+                and self.is_connected(room, namespace or '/'):
+            with self._lock:
+                self.local += 1
+            kwargs['ignore_queue'] = True
+        return super().emit(event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+                            callback=callback, **kwargs)
+
+    def _publish(self, data):
+        if self.server is None:
+            # 没有所属服务器（只写模式的外部发送端）时没有后台任务可用，直接发布
+            return super()._publish(data)
+        with self._lock:
+            self._pending.append(pickle.dumps(data))
+            self.published += 1
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+            if self._wakeup is None:
+                self._wakeup = self.server.eio.create_event()
+                self.server.start_background_task(self._run_flusher)
+        self._wakeup.set()
+
+    def _run_flusher(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self.window > 0:
+                self.server.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                self._get_logger().exception('Unexpected error in message queue flusher')
+
+    def flush(self):
+        """以一个pipeline发布缓冲中的全部消息，返回发布条数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._flush_scheduled = False
+            if not batch:
+                return 0
+            for attempt in range(2):
+                try:
+                    if attempt:
+                        self._redis_connect()
+                    pipe = self.redis.pipeline(transaction=False)
+                    for message in batch:
+                        pipe.publish(self.channel, message)
+                    pipe.execute()
+                    break
+                except redis.exceptions.RedisError:
+                    self._get_logger().error(
+                        f'Cannot publish {len(batch)} messages to redis... '
+                        + ('retrying' if not attempt else 'giving up'))
+            else:
+                with self._lock:
+                    self.failures += 1
+                return 0
+            with self._lock:
+                self.batches += 1
+            return len(batch)
+
+    def stats(self):
+        """发布统计：发布的消息数、只在本进程处理的消息数、批次数、失败批次数和待发布条数"""
+        with self._lock:
+            return {
+                'published': self.published,
+                'local': self.local,
+                'batches': self.batches,
+                'failures': self.failures,
+                'pending': len(self._pending)
+            }
+
+
+def create_client_manager(config, logger=None):
+    """根据配置创建SocketIO客户端管理器
+
+    未配置消息队列时只在本进程内广播：开启了SOCKETIO_MSGPACK时返回按连接选择编码的管理器，否则返回None（使用默认管理器）。
+    """
+    url = getattr(config, 'SOCKETIO_MESSAGE_QUEUE', '')
+    if not url:
+        return NegotiatingManager() if getattr(config, 'SOCKETIO_MSGPACK', False) else None
+    if not url.startswith(('redis://', 'rediss://', 'unix://')):
+        raise ValueError(f'不支持的消息队列地址: {url}')
+    return BatchingRedisManager(url, channel=getattr(config, 'SOCKETIO_CHANNEL', 'flask-socketio'),
+                                logger=logger,
+                                window=getattr(config, 'SOCKETIO_PUBLISH_WINDOW', 0.0))
@@ -0,0 +1,226 @@
+"""
+Prometheus指标模块
+统计SocketIO事件与HTTP请求的延迟、房间与连接数、匹配次数及数据库查询耗时，由/metrics导出
+"""
+import functools
+import os
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+# 延迟直方图的桶上限（秒）：指令提交在毫秒以下，数据库查询与HTTP请求在毫秒到秒之间
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0)
+
+# 按SQL语句的第一个关键字区分查询类型，其余归为OTHER
+QUERY_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def multiprocess_dir():
+    """多进程模式下各worker写入指标文件的目录（未设置时为单进程模式）"""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+class EventTimer:
+    """本worker内累计的事件耗时，由Metrics.flush合并到Prometheus直方图
+
+    事件处理路径上只把耗时追加到列表，不获取锁也不写mmap；
+    eventlet下绿色线程只在I/O时切换，追加不会丢失。
+    合并时逐个调用Histogram.observe（公开接口），分桶与总和与直接观测完全一致。
+    累计达到max_pending条时在事件处理中直接合并一次，未开启后台刷新且无人抓取时内存占用也有上限。
+    """
+
+    __slots__ = ('histogram', 'values', 'max_pending')
+
+    def __init__(self, histogram, max_pending=1000):
+        self.histogram = histogram
+        self.values = []
+        self.max_pending = max_pending
+
+    def observe(self, elapsed):
+        self.values.append(elapsed)
+        if len(self.values) >= self.max_pending:
+            self.flush()
+
+    def flush(self):
+        values, self.values = self.values, []
+        observe = self.histogram.observe
+        for elapsed in values:
+            observe(elapsed)
+
+
+class Metrics:
+    """应用指标
+
+    多个gunicorn worker时需设置PROMETHEUS_MULTIPROC_DIR：每个worker把指标写入该目录下
+    按进程号命名的mmap文件，/metrics被任意worker处理时都会合并所有worker的文件，
+    计数器与直方图求和，连接数按存活worker求和，房间数在共享存储（Redis）时取最大值。
+
+    SocketIO事件耗时与匹配次数在每次事件中只累加到本进程的普通变量（见EventTimer），
+    由flush（/metrics请求与后台刷新时调用）批量合并到Prometheus指标；
+    HTTP请求与数据库查询的耗时比一次指标更新大几个数量级，直接写入。
+    未安装prometheus_client或enabled为False时所有方法为空操作，装饰器直接返回原函数。
+    """
+
+    def __init__(self, enabled=True, shared_rooms=False, prefix='heartsync_'):
+        self.enabled = False
+        if not enabled:
+            return
+        try:
+            # 延迟导入：prometheus_client在导入时根据PROMETHEUS_MULTIPROC_DIR选择存储方式
+            import prometheus_client
+        except ImportError:
+            return
+        from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+        self.enabled = True
+        self._client = prometheus_client
+        self.registry = CollectorRegistry()
+        self.events = Histogram(f'{prefix}socketio_event_seconds', 'SocketIO事件处理耗时',
+                                ['event'], buckets=LATENCY_BUCKETS, registry=self.registry)
+        self.requests = Histogram(f'{prefix}http_request_seconds', 'HTTP请求处理耗时',
+                                  ['method', 'endpoint'], buckets=LATENCY_BUCKETS,
+                                  registry=self.registry)
+        self.responses = Counter(f'{prefix}http_responses', 'HTTP响应数',
+                                 ['method', 'endpoint', 'status'], registry=self.registry)
+        self.queries = Histogram(f'{prefix}db_query_seconds', '数据库查询耗时',
+                                 ['bind', 'operation'], buckets=LATENCY_BUCKETS,
+                                 registry=self.registry)
+        self.matches = Counter(f'{prefix}matches', '指令匹配成功次数', registry=self.registry)
+        self.match_failures = Counter(f'{prefix}match_failures', '指令匹配失败次数',
+                                      registry=self.registry)
+        self.rooms = Gauge(f'{prefix}rooms', '当前房间数', registry=self.registry,
+                           multiprocess_mode='livemax' if shared_rooms else 'livesum')
+        self.connections = Gauge(f'{prefix}connections', '当前SocketIO连接数',
+                                 registry=self.registry, multiprocess_mode='livesum')
+        self._query_timers = {}
+        self._event_timers = []
+        self._matched = 0
+        self._failed = 0
+
+    def timed_event(self, name):
+        """装饰SocketIO事件处理函数，记录处理耗时"""
+        def decorator(func):
+            if not self.enabled:
+                return func
+            timer = EventTimer(self.events.labels(name))
+            self._event_timers.append(timer)
+            observe = timer.observe
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def init_app(self, app):
+        """记录每个HTTP请求的耗时与状态码（按路由的endpoint区分，未匹配的路由记为unmatched）"""
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    @staticmethod
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+
+    def _finish_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = request.endpoint or 'unmatched'
+            self.requests.labels(request.method, endpoint).observe(time.perf_counter() - start)
+            self.responses.labels(request.method, endpoint, str(response.status_code)).inc()
+        return response
+
+    def instrument_engines(self, engines):
+        """记录每个引擎的查询耗时（engines为Flask-SQLAlchemy的db.engines，主库的键为None）"""
+        if not self.enabled:
+            return
+        for key, engine in engines.items():
+            bind = key or 'primary'
+            event.listen(engine, 'before_cursor_execute', self._before_query)
+            event.listen(engine, 'after_cursor_execute', self._after_query(bind))
+
+    @staticmethod
+    def _before_query(conn, cursor, statement, parameters, context, executemany):
+        # 开始时间记在本次执行的上下文上：执行失败时不会触发after_cursor_execute，随上下文一起丢弃
+        if context is not None:
+            context.metrics_query_start = time.perf_counter()
+
+    def _after_query(self, bind):
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, 'metrics_query_start', None)
+            if start is None:
+                return
+            elapsed = time.perf_counter() - start
+            operation = statement.lstrip()[:6].upper()
+            if operation not in QUERY_OPERATIONS:
+                operation = 'OTHER'
+            timer = self._query_timers.get((bind, operation))
+            if timer is None:
+                timer = self._query_timers[(bind, operation)] = \
+                    self.queries.labels(bind, operation).observe
+            timer(elapsed)
+        return after_cursor_execute
+
+    def record_match(self, matched):
+        """记录一次指令匹配的结果"""
+        if not self.enabled:
+            return
+        if matched:
+            self._matched += 1
+        else:
+            self._failed += 1
+
+    def set_gauges(self, rooms, connections):
+        """更新本worker的房间数与连接数"""
+        if self.enabled:
+            self.rooms.set(rooms)
+            self.connections.set(connections)
+
+    def flush(self):
+        """将本worker累计的事件耗时与匹配次数合并到Prometheus指标"""
+        if not self.enabled:
+            return
+        for timer in self._event_timers:
+            timer.flush()
+        matched, self._matched = self._matched, 0
+        failed, self._failed = self._failed, 0
+        if matched:
+            self.matches.inc(matched)
+        if failed:
+            self.match_failures.inc(failed)
+
+    def render(self):
+        """生成Prometheus文本格式的指标，返回(内容, Content-Type)"""
+        registry = self.registry
+        if multiprocess_dir():
+            from prometheus_client import CollectorRegistry, multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return self._client.generate_latest(registry), self._client.CONTENT_TYPE_LATEST
+
+
+def create_metrics(config):
+    """根据配置创建指标"""
+    return Metrics(enabled=getattr(config, 'METRICS_ENABLED', True),
+                   shared_rooms=getattr(config, 'ROOM_STORE_BACKEND', 'memory') == 'redis')
+
+
+def run_metrics_refresher(refresh, interval, sleep, logger=None):
+    """后台循环：定期合并本worker累计的指标并更新房间数与连接数
+
+    多进程模式下/metrics只由一个worker处理，其他worker的事件指标最多滞后interval秒。
+    """
+    while True:
+        sleep(interval)
+        try:
+            refresh()
+        except Exception as e:
+            # 读取房间数失败（如Redis暂时不可用）时保留上次的值，下个周期重试
+            if logger is not None:
+                logger.error(f'Metrics refresh failed: {str(e)}')
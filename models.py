@@ -2,8 +2,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+# 使用读写分离会话（未配置只读副本时与默认会话相同）
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     """用户模型"""
@@ -44,3 +46,67 @@ class User(UserMixin, db.Model):
     
     def __repr__(self):
         return f'<User {self.username}>'
+
+
+class CommandPair(db.Model):
+    """配对指令模型
+
+    scope为空表示全局预设配对；'room:<房间码>'为房间自定义配对；
+    'couple:<用户ID>-<用户ID>'为两位用户之间的自定义配对（ID按升序）。
+    """
+    __tablename__ = 'command_pairs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    first = db.Column(db.String(50), nullable=False)
+    second = db.Column(db.String(50), nullable=False)
+    description = db.Column(db.String(100), nullable=False)
+    scope = db.Column(db.String(64), nullable=True, index=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=True)
+    
+    def to_pair(self):
+        """转换为配对索引使用的格式"""
+        return {'pair': [self.first, self.second], 'description': self.description}
+    
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'id': self.id,
+            'pair': [self.first, self.second],
+            'description': self.description,
+            'scope': self.scope,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<CommandPair {self.first}/{self.second} {self.scope or "global"}>'
+
+
+class Match(db.Model):
+    """配对成功记录（由后台任务批量写入）"""
+    __tablename__ = 'matches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    room_code = db.Column(db.String(64), nullable=False)
+    user1_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    user2_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    user1_command = db.Column(db.String(50), nullable=False)
+    user2_command = db.Column(db.String(50), nullable=False)
+    description = db.Column(db.String(100), nullable=False)
+    matched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'id': self.id,
+            'room_code': self.room_code,
+            'user1_id': self.user1_id,
+            'user2_id': self.user2_id,
+            'command_pair': [self.user1_command, self.user2_command],
+            'description': self.description,
+            'matched_at': self.matched_at.isoformat() if self.matched_at else None
+        }
+    
+    def __repr__(self):
+        return f'<Match {self.room_code} {self.description}>'
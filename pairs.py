@@ -0,0 +1,190 @@
+"""
+配对指令模块
+以frozenset为键建立配对索引，匹配检查为O(1)哈希查找；索引可在运行时原子替换
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class PairIndex:
+    """不可变的配对索引
+
+    frozenset与顺序无关，因此['我', '你']和['你', '我']命中同一个键；
+    相同指令的配对（如['宝贝', '宝贝']）对应单元素集合，
+    与两个相同输入构成的集合相等，无需特殊处理。
+    """
+
+    __slots__ = ('pairs', '_index')
+
+    def __init__(self, pairs):
+        self.pairs = []
+        self._index = {}
+        for item in pairs:
+            words = item['pair']
+            if len(words) != 2 or not all(isinstance(w, str) and w for w in words):
+                raise ValueError(f'无效的配对指令: {item!r}')
+            entry = {'pair': list(words), 'description': item['description']}
+            self.pairs.append(entry)
+            # 重复的配对以先出现的为准
+            self._index.setdefault(frozenset(words), entry['description'])
+
+    def match(self, command1, command2):
+        """检查两个指令是否匹配，返回(是否匹配, 描述)"""
+        description = self._index.get(frozenset((command1, command2)))
+        return description is not None, description
+
+    def __len__(self):
+        return len(self._index)
+
+
+class PairRegistry:
+    """配对注册表
+
+    持有当前生效的PairIndex。重新加载时先在旁边构建完整的新索引，
+    再通过一次引用赋值替换，读取方不会看到构建到一半的索引。
+    """
+
+    def __init__(self, pairs=()):
+        self._index = PairIndex(pairs)
+        self._lock = threading.Lock()
+        self.source_path = None
+        self._source_mtime = None
+
+    @property
+    def pairs(self):
+        """当前生效的配对列表（用于页面展示）"""
+        return self._index.pairs
+
+    def match(self, command1, command2):
+        """检查两个指令是否匹配"""
+        return self._index.match(command1, command2)
+
+    def reload(self, pairs):
+        """用新的配对替换当前索引，配对无效时抛出ValueError并保留原索引"""
+        index = PairIndex(pairs)
+        self._index = index
+        return len(index)
+
+    def load_file(self, path):
+        """从JSON文件加载配对，文件内容为[{"pair": [..], "description": ..}, ...]"""
+        with self._lock:
+            # 先记录修改时间，内容有误的文件不会被反复重试，直到再次修改
+            self.source_path = path
+            self._source_mtime = os.path.getmtime(path)
+            with open(path, encoding='utf-8') as f:
+                pairs = json.load(f)
+            return self.reload(pairs)
+
+    def reload_if_changed(self):
+        """配对文件修改后重新加载，返回是否重新加载"""
+        path = self.source_path
+        if not path:
+            return False
+        try:
+            if os.path.getmtime(path) == self._source_mtime:
+                return False
+        except OSError:
+            return False
+        self.load_file(path)
+        return True
+
+
+def room_scope(room_code):
+    """房间自定义配对的作用域"""
+    return f'room:{room_code}'
+
+
+def couple_scope(user_id1, user_id2):
+    """两位用户之间自定义配对的作用域（与顺序无关）"""
+    low, high = sorted((int(user_id1), int(user_id2)))
+    return f'couple:{low}-{high}'
+
+
+EMPTY_INDEX = PairIndex(())
+
+
+class PairCache:
+    """自定义配对的读穿缓存
+
+    按作用域缓存PairIndex，匹配检查完全在内存中完成。
+    配对变更时共享的版本号加一；每个进程至多每check_interval秒读取一次版本号，
+    发现变化即清空缓存，之后的读取重新从数据库加载。
+    另外缓存“有自定义配对的作用域”集合，没有自定义配对的房间不会触发数据库查询。
+    """
+
+    def __init__(self, loader, scopes_loader, version_source=None, max_scopes=10000,
+                 check_interval=1.0, clock=time.monotonic):
+        self._loader = loader
+        self._scopes_loader = scopes_loader
+        self._version_source = version_source
+        self.max_scopes = max_scopes
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._scopes = None
+        self._version = None
+        self._checked_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh_version(self):
+        if self._version_source is None:
+            return
+        now = self._clock()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self._version_source()
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def invalidate(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._scopes = None
+
+    def index(self, scope):
+        """获取作用域的配对索引（无自定义配对时返回空索引）"""
+        self._refresh_version()
+        scopes = self._scopes
+        if scopes is None:
+            scopes = self._scopes = frozenset(self._scopes_loader())
+        if scope not in scopes:
+            return EMPTY_INDEX
+        with self._lock:
+            index = self._entries.get(scope)
+            if index is not None:
+                self._entries.move_to_end(scope)
+                self.hits += 1
+                return index
+        index = PairIndex(self._loader(scope))
+        with self._lock:
+            self.misses += 1
+            self._entries[scope] = index
+            while len(self._entries) > self.max_scopes:
+                self._entries.popitem(last=False)
+        return index
+
+    def stats(self):
+        """缓存命中统计"""
+        with self._lock:
+            return {'scopes': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'version': self._version}
+
+
+def run_pair_watcher(registry, interval, sleep, logger=None):
+    """后台循环：定期检查配对文件并在修改后重新加载"""
+    while True:
+        sleep(interval)
+        try:
+            registry.reload_if_changed()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # 文件内容有误时保留当前索引，修正文件后下个周期重新加载
+            if logger is not None:
+                logger.error(f'Reload preset pairs failed: {str(e)}')
@@ -0,0 +1,71 @@
+"""
+密码哈希模块
+在有界线程池中执行密码哈希与校验，避免scrypt/pbkdf2阻塞eventlet事件循环
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """密码哈希器
+
+    哈希计算是纯CPU操作，在eventlet下直接调用会占住整个hub，
+    同一worker上所有WebSocket都要等它算完。这里把计算交给真实线程执行：
+    eventlet模式使用eventlet.tpool（线程数由EVENTLET_THREADPOOL_SIZE控制），
+    其他模式使用workers个线程的ThreadPoolExecutor，线程数同时限制了并发哈希对CPU的占用。
+    workers为0时在当前线程直接计算。
+    """
+
+    def __init__(self, method='scrypt', workers=4, async_mode='threading'):
+        self.method = method
+        self.workers = workers
+        self._async_mode = async_mode
+        self._executor = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        if self._async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(func, *args)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers,
+                                                        thread_name_prefix='password-hash')
+        return self._executor.submit(func, *args).result()
+
+    @property
+    def prefix(self):
+        """当前参数生成的哈希前缀（如'scrypt:32768:8:1'），用于判断旧哈希是否需要升级"""
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def hash(self, password):
+        """生成密码哈希"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """校验密码"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """哈希是否由不同的算法或参数生成"""
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def create_password_hasher(config):
+    """根据配置创建密码哈希器"""
+    return PasswordHasher(method=getattr(config, 'PASSWORD_HASH_METHOD', 'scrypt'),
+                          workers=getattr(config, 'PASSWORD_HASH_WORKERS', 4),
+                          async_mode=getattr(config, 'SOCKETIO_ASYNC_MODE', 'threading'))
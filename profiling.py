@@ -0,0 +1,235 @@
+"""
+性能剖析模块
+按请求统计数据库、密码哈希与模板渲染耗时并以Server-Timing头返回，
+以及由管理员触发、在运行中的worker上采样调用栈并输出火焰图格式（folded）文件
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import before_render_template, g, has_app_context, template_rendered
+from sqlalchemy import event
+
+
+def _original(name):
+    """返回未被eventlet打补丁的标准库模块（采样线程必须是真实线程，且不能让出hub）"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return __import__(name)
+    return patcher.original(name)
+
+
+class ServerTiming:
+    """按请求/事件累计各类耗时
+
+    开启后，每个HTTP响应带有Server-Timing头，如
+    ``db;dur=3.1;desc="2 queries", hash;dur=48.0, render;dur=1.2, total;dur=55.4``，
+    浏览器开发者工具的Timing面板可直接显示。SocketIO事件没有响应头，
+    处理时间超过slow_event秒的事件以同样的拆分写入日志。
+
+    耗时保存在flask.g中，只在有应用上下文时累计。未开启时不注册任何钩子，
+    装饰器直接返回原函数，instrument不替换方法，对请求没有额外开销。
+    """
+
+    CATEGORIES = ('db', 'hash', 'render')
+
+    def __init__(self, enabled=False, slow_event=0.1, logger=None):
+        self.enabled = enabled
+        self.slow_event = slow_event
+        self.logger = logger
+
+    def init_app(self, app):
+        """注册请求钩子与模板渲染信号"""
+        if not self.enabled:
+            return
+        if self.logger is None:
+            self.logger = app.logger
+        app.before_request(self.start)
+        app.after_request(self._add_header)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+    def instrument_engines(self, engines):
+        """统计每条SQL语句的耗时（engines为Flask-SQLAlchemy的db.engines）"""
+        if not self.enabled:
+            return
+        for engine in engines.values():
+            event.listen(engine, 'before_cursor_execute', self._query_started)
+            event.listen(engine, 'after_cursor_execute', self._query_finished)
+
+    def instrument(self, obj, category, methods):
+        """将对象上若干方法的耗时计入category（如密码哈希器的hash与verify）"""
+        if not self.enabled:
+            return
+        for name in methods:
+            setattr(obj, name, self._timed(category, getattr(obj, name)))
+
+    def _timed(self, category, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(category, time.perf_counter() - start)
+        return wrapper
+
+    @staticmethod
+    def start():
+        """开始统计当前请求/事件"""
+        g.server_timing = dict.fromkeys(ServerTiming.CATEGORIES, 0.0)
+        g.server_timing_queries = 0
+        g.server_timing_start = time.perf_counter()
+
+    @staticmethod
+    def add(category, elapsed):
+        """累计一段耗时（不在统计中的上下文里忽略）"""
+        if has_app_context():
+            timings = g.get('server_timing')
+            if timings is not None:
+                timings[category] += elapsed
+
+    @staticmethod
+    def current():
+        """返回(各类耗时, 总耗时, 查询数)，未开始统计时返回None"""
+        timings = g.get('server_timing')
+        if timings is None:
+            return None
+        return timings, time.perf_counter() - g.server_timing_start, g.server_timing_queries
+
+    @staticmethod
+    def format(timings, total, queries):
+        """生成Server-Timing头的值（毫秒）"""
+        parts = []
+        for category in ServerTiming.CATEGORIES:
+            part = f'{category};dur={timings[category] * 1000:.1f}'
+            if category == 'db':
+                part += f';desc="{queries} queries"'
+            parts.append(part)
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def _add_header(self, response):
+        current = self.current()
+        if current is not None:
+            response.headers['Server-Timing'] = self.format(*current)
+        return response
+
+    @staticmethod
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        # 开始时间记在本次执行的上下文上，执行失败的语句不会留下未配对的开始时间
+        if context is not None:
+            context.server_timing_start = time.perf_counter()
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'server_timing_start', None)
+        if start is None:
+            return
+        self.add('db', time.perf_counter() - start)
+        if has_app_context() and 'server_timing' in g:
+            g.server_timing_queries += 1
+
+    @staticmethod
+    def _render_started(sender, template, context, **extra):
+        g.server_timing_render_start = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        start = g.pop('server_timing_render_start', None)
+        if start is not None:
+            self.add('render', time.perf_counter() - start)
+
+    def timed_event(self, name):
+        """装饰SocketIO事件处理函数，处理时间超过slow_event秒时记录耗时拆分"""
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                self.start()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    timings, total, queries = self.current()
+                    if total >= self.slow_event and self.logger is not None:
+                        self.logger.warning(f'Slow event {name}: {self.format(timings, total, queries)}')
+            return wrapper
+        return decorator
+
+
+def fold(frame):
+    """将调用栈转换为folded格式的一行（从最外层到最内层，以分号分隔）"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """调用栈采样器
+
+    在一个真实线程中每隔interval秒读取本进程所有线程的调用栈（sys._current_frames），
+    按调用栈计数，结束后写入folded格式文件（每行“栈 次数”），
+    可直接交给flamegraph.pl或speedscope生成火焰图。
+    eventlet模式下所有绿色线程共用一个系统线程，采到的是当时正在运行的绿色线程；
+    采到hub的等待函数说明worker空闲。采样的是墙钟时间，等待I/O的线程也会出现在结果中。
+    同一时间只运行一次采样。
+    """
+
+    def __init__(self, output_dir, interval=0.005, max_seconds=60):
+        self.output_dir = str(output_dir)
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._running = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._running
+
+    def sample(self, seconds):
+        """在当前线程中采样seconds秒，返回调用栈计数"""
+        sleep = _original('time').sleep
+        own = _original('threading').get_ident()
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    counts[fold(frame)] += 1
+            sleep(self.interval)
+        return counts
+
+    def write(self, counts, path):
+        """写入folded格式文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in counts.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def start(self, seconds):
+        """在后台采样seconds秒（不超过max_seconds），返回结果文件路径；已有采样在运行时返回None"""
+        with self._lock:
+            if self._running:
+                return None
+            self._running = True
+        seconds = min(seconds, self.max_seconds)
+        name = f'profile-{os.getpid()}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.folded'
+        path = os.path.join(self.output_dir, name)
+        thread = _original('threading').Thread(target=self._run, args=(seconds, path),
+                                               name='stack-sampler', daemon=True)
+        thread.start()
+        return path
+
+    def _run(self, seconds, path):
+        try:
+            self.write(self.sample(seconds), path)
+        finally:
+            self._running = False
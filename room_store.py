@@ -0,0 +1,605 @@
+"""
+房间状态存储模块
+提供可插拔的房间状态后端：进程内存储（单进程）与Redis存储（多worker/多节点共享）
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# 房间内的两个角色
+ROLES = ('user1', 'user2')
+
+
+class Room:
+    """房间状态
+
+    使用__slots__代替每个房间一个dict，在数十万房间时显著降低每个worker的内存占用。
+    时间戳使用float（秒）而非datetime对象，同样是为了节省内存。
+    seq是房间状态的序号，每次客户端可见的修改都会加一，客户端据此发现漏收的增量事件。
+    """
+
+    __slots__ = ('user1', 'user2', 'user1_username', 'user2_username',
+                 'user1_command', 'user2_command', 'status', 'seq', 'created_at', 'last_active')
+
+    def __init__(self, created_at=None):
+        self.user1 = None
+        self.user2 = None
+        self.user1_username = None
+        self.user2_username = None
+        self.user1_command = ''
+        self.user2_command = ''
+        self.status = 'waiting'  # waiting, matched
+        self.seq = 0
+        self.created_at = time.time() if created_at is None else created_at
+        self.last_active = 0.0
+
+    def assign_role(self, user_id, nickname):
+        """为用户分配空闲角色，已在房间中的用户保持原角色；房间已满返回None"""
+        if self.user1 is None or self.user1 == user_id:
+            self.user1 = user_id
+            self.user1_username = nickname
+            self.seq += 1
+            return 'user1'
+        if self.user2 is None or self.user2 == user_id:
+            self.user2 = user_id
+            self.user2_username = nickname
+            self.seq += 1
+            return 'user2'
+        return None
+
+    def role_of(self, user_id):
+        """返回用户在房间中的角色，不在房间中返回None"""
+        if self.user1 == user_id:
+            return 'user1'
+        if self.user2 == user_id:
+            return 'user2'
+        return None
+
+    def set_command(self, role, command):
+        """更新指定角色的指令"""
+        if role == 'user1':
+            self.user1_command = command
+        else:
+            self.user2_command = command
+        self.seq += 1
+
+    def mark_matched(self, user1_command, user2_command):
+        """指令仍为给定值时标记匹配成功并清空指令，返回是否生效"""
+        if self.user1_command != user1_command or self.user2_command != user2_command:
+            return False
+        self.status = 'matched'
+        self.user1_command = ''
+        self.user2_command = ''
+        self.seq += 1
+        return True
+
+    def release(self, user_id):
+        """释放用户的位置，返回被释放的角色（未找到时返回None）"""
+        role = self.role_of(user_id)
+        if role == 'user1':
+            self.user1 = self.user1_username = None
+            self.user1_command = ''
+        elif role == 'user2':
+            self.user2 = self.user2_username = None
+            self.user2_command = ''
+        else:
+            return None
+        self.seq += 1
+        return role
+
+    @property
+    def is_empty(self):
+        """两个位置是否都空闲"""
+        return self.user1 is None and self.user2 is None
+
+    def copy(self):
+        """复制房间状态"""
+        room = Room.__new__(Room)
+        for name in Room.__slots__:
+            setattr(room, name, getattr(self, name))
+        return room
+
+    def snapshot(self):
+        """返回可直接发送给客户端的房间状态"""
+        return {
+            'user1_username': self.user1_username,
+            'user2_username': self.user2_username,
+            'user1_command': self.user1_command,
+            'user2_command': self.user2_command,
+            'status': self.status,
+            'seq': self.seq
+        }
+
+    def __repr__(self):
+        return f'<Room {self.user1}/{self.user2} {self.status}>'
+
+
+class RoomStore:
+    """房间状态存储基类
+
+    所有修改房间的方法都必须是原子的，返回的Room均为副本，
+    调用方修改返回值不会影响存储中的状态。
+    """
+
+    def get(self, room_code):
+        """获取房间，不存在时返回None"""
+        raise NotImplementedError
+
+    def get_or_create(self, room_code):
+        """获取或创建房间"""
+        raise NotImplementedError
+
+    def assign_role(self, room_code, user_id, nickname):
+        """为用户分配角色（房间不存在时自动创建）
+
+        已在房间中的用户保持原角色。返回(角色, 房间)，房间已满时角色为None。
+        """
+        raise NotImplementedError
+
+    def set_command(self, room_code, role, command, user_id):
+        """更新指定角色的指令，返回更新后的房间
+
+        仅当该角色的座位仍属于user_id时才生效（用户已离开或座位已换人时返回None），
+        不会创建房间：延迟处理的指令不会写进新用户的座位，也不会重建已删除的房间。
+        """
+        raise NotImplementedError
+
+    def mark_matched(self, room_code, user1_command, user2_command):
+        """标记房间匹配成功并清空指令
+
+        仅当房间内的指令仍为给定值时才生效（比较并交换），避免并发输入时
+        清掉对方刚提交的新指令。生效时返回更新后的房间，否则返回None。
+        """
+        raise NotImplementedError
+
+    def release(self, room_code, user_id):
+        """释放用户在房间中的位置，返回被释放的角色（未找到时返回None）
+
+        两个位置都空出后房间被删除。
+        """
+        raise NotImplementedError
+
+    def sweep(self):
+        """清理空闲超过TTL的房间，返回清理数量"""
+        raise NotImplementedError
+
+    def stats(self):
+        """返回房间计数：当前房间数、累计创建数、过期数与淘汰数"""
+        raise NotImplementedError
+
+    def get_version(self, name):
+        """读取共享版本号（用于跨worker的缓存失效）"""
+        raise NotImplementedError
+
+    def bump_version(self, name):
+        """共享版本号加一，返回新版本号"""
+        raise NotImplementedError
+
+
+class MemoryRoomStore(RoomStore):
+    """进程内房间存储（仅适用于单worker部署）
+
+    房间按最近活跃时间排列在OrderedDict中（最久未活跃的在最前），
+    由于所有房间的空闲TTL相同，过期清理只需从头部弹出已过期的房间，
+    代价与过期房间数成正比而无需全量扫描；超过容量上限时同样从头部淘汰。
+    还有人在座的房间（断开连接时座位即被释放）不会被清理或淘汰，只移到尾部，
+    因此房间数可能暂时超过容量上限，超出部分受在线用户数限制。
+    """
+
+    def __init__(self, idle_ttl=0, max_rooms=0, clock=time.monotonic):
+        self.rooms = OrderedDict()
+        self.idle_ttl = idle_ttl
+        self.max_rooms = max_rooms
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters = {'created': 0, 'expired': 0, 'evicted': 0}
+        self._versions = {}
+
+    def _touch(self, room_code, room):
+        room.last_active = self._clock()
+        self.rooms.move_to_end(room_code)
+
+    def _pop_idle(self, should_pop):
+        """从头部弹出无人在座的房间，有人在座的移到尾部；每个房间最多检查一次"""
+        popped = 0
+        for _ in range(len(self.rooms)):
+            room_code, room = next(iter(self.rooms.items()))
+            if not should_pop(room):
+                break
+            if room.is_empty:
+                self.rooms.popitem(last=False)
+                popped += 1
+            else:
+                self._touch(room_code, room)
+        return popped
+
+    def _get_or_create(self, room_code):
+        room = self.rooms.get(room_code)
+        if room is None:
+            # 先为新房间腾出位置，淘汰最久未活跃的空房间
+            if self.max_rooms:
+                self._counters['evicted'] += self._pop_idle(
+                    lambda _: len(self.rooms) >= self.max_rooms)
+            room = self.rooms[room_code] = Room()
+            self._counters['created'] += 1
+        self._touch(room_code, room)
+        return room
+
+    def get(self, room_code):
+        with self._lock:
+            room = self.rooms.get(room_code)
+            return room.copy() if room is not None else None
+
+    def get_or_create(self, room_code):
+        with self._lock:
+            return self._get_or_create(room_code).copy()
+
+    def assign_role(self, room_code, user_id, nickname):
+        with self._lock:
+            room = self._get_or_create(room_code)
+            return room.assign_role(user_id, nickname), room.copy()
+
+    def set_command(self, room_code, role, command, user_id):
+        with self._lock:
+            room = self.rooms.get(room_code)
+            if room is None or room.role_of(user_id) != role:
+                return None
+            room.set_command(role, command)
+            self._touch(room_code, room)
+            return room.copy()
+
+    def mark_matched(self, room_code, user1_command, user2_command):
+        with self._lock:
+            room = self.rooms.get(room_code)
+            if room is None or not room.mark_matched(user1_command, user2_command):
+                return None
+            self._touch(room_code, room)
+            return room.copy()
+
+    def release(self, room_code, user_id):
+        with self._lock:
+            room = self.rooms.get(room_code)
+            if room is None:
+                return None
+            role = room.release(user_id)
+            if role is not None:
+                # 两人都已离开的房间直接删除
+                if room.is_empty:
+                    del self.rooms[room_code]
+                else:
+                    self._touch(room_code, room)
+            return role
+
+    def sweep(self):
+        with self._lock:
+            if not self.idle_ttl:
+                return 0
+            deadline = self._clock() - self.idle_ttl
+            expired = self._pop_idle(lambda room: room.last_active <= deadline)
+            self._counters['expired'] += expired
+            return expired
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, rooms=len(self.rooms))
+
+    def get_version(self, name):
+        return self._versions.get(name, 0)
+
+    def bump_version(self, name):
+        with self._lock:
+            version = self._versions[name] = self._versions.get(name, 0) + 1
+            return version
+
+
+class ShardedRoomStore(RoomStore):
+    """分片的进程内房间存储（锁分段）
+
+    房间按房间码的哈希分到N个MemoryRoomStore分片，每个分片有独立的锁、
+    LRU顺序和容量上限。同一房间的操作始终落在同一分片的锁内，因此仍是原子的；
+    不同房间的操作大多落在不同分片，连接数增长时锁竞争保持在低水平。
+    """
+
+    def __init__(self, shards=16, idle_ttl=0, max_rooms=0, clock=time.monotonic):
+        per_shard = -(-max_rooms // shards) if max_rooms else 0
+        self.shards = [MemoryRoomStore(idle_ttl=idle_ttl, max_rooms=per_shard, clock=clock)
+                       for _ in range(shards)]
+        self._versions = {}
+        self._version_lock = threading.Lock()
+
+    def _shard(self, room_code):
+        return self.shards[hash(room_code) % len(self.shards)]
+
+    def get(self, room_code):
+        return self._shard(room_code).get(room_code)
+
+    def get_or_create(self, room_code):
+        return self._shard(room_code).get_or_create(room_code)
+
+    def assign_role(self, room_code, user_id, nickname):
+        return self._shard(room_code).assign_role(room_code, user_id, nickname)
+
+    def set_command(self, room_code, role, command, user_id):
+        return self._shard(room_code).set_command(room_code, role, command, user_id)
+
+    def mark_matched(self, room_code, user1_command, user2_command):
+        return self._shard(room_code).mark_matched(room_code, user1_command, user2_command)
+
+    def release(self, room_code, user_id):
+        return self._shard(room_code).release(room_code, user_id)
+
+    def sweep(self):
+        return sum(shard.sweep() for shard in self.shards)
+
+    def stats(self):
+        totals = {'rooms': 0, 'created': 0, 'expired': 0, 'evicted': 0}
+        for shard in self.shards:
+            for key, value in shard.stats().items():
+                totals[key] += value
+        return totals
+
+    def get_version(self, name):
+        return self._versions.get(name, 0)
+
+    def bump_version(self, name):
+        with self._version_lock:
+            version = self._versions[name] = self._versions.get(name, 0) + 1
+            return version
+
+
+# Redis脚本：保证角色分配、匹配清空等“检查后修改”操作的原子性
+# 公共参数：KEYS = [房间Hash, 活跃索引ZSet, 计数Hash]
+#           ARGV[1] = 创建时间, ARGV[2] = 当前时间戳, ARGV[3] = 空闲TTL（秒，0表示不过期）
+_TOUCH_LUA = """
+local function touch()
+    redis.call('ZADD', KEYS[2], ARGV[2], KEYS[1])
+    if tonumber(ARGV[3]) > 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+    end
+end
+"""
+
+_CREATE_ROOM_LUA = _TOUCH_LUA + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'user1', '', 'user2', '',
+               'user1_command', '', 'user2_command', '',
+               'user1_username', '', 'user2_username', '',
+               'status', 'waiting', 'seq', 0, 'created_at', ARGV[1])
+    redis.call('HINCRBY', KEYS[3], 'created', 1)
+end
+touch()
+"""
+
+_GET_OR_CREATE_LUA = _CREATE_ROOM_LUA + """
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_ASSIGN_ROLE_LUA = _CREATE_ROOM_LUA + """
+for _, role in ipairs({'user1', 'user2'}) do
+    local current = redis.call('HGET', KEYS[1], role)
+    if current == '' or current == ARGV[4] then
+        redis.call('HSET', KEYS[1], role, ARGV[4], role .. '_username', ARGV[5])
+        redis.call('HINCRBY', KEYS[1], 'seq', 1)
+        return {role, redis.call('HGETALL', KEYS[1])}
+    end
+end
+return {'', redis.call('HGETALL', KEYS[1])}
+"""
+
+_SET_COMMAND_LUA = _TOUCH_LUA + """
+if redis.call('HGET', KEYS[1], ARGV[4]) ~= ARGV[6] then
+    return false
+end
+redis.call('HSET', KEYS[1], ARGV[4] .. '_command', ARGV[5])
+redis.call('HINCRBY', KEYS[1], 'seq', 1)
+touch()
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_MARK_MATCHED_LUA = _TOUCH_LUA + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local commands = redis.call('HMGET', KEYS[1], 'user1_command', 'user2_command')
+if commands[1] ~= ARGV[4] or commands[2] ~= ARGV[5] then
+    return false
+end
+redis.call('HSET', KEYS[1], 'status', 'matched', 'user1_command', '', 'user2_command', '')
+redis.call('HINCRBY', KEYS[1], 'seq', 1)
+touch()
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_RELEASE_LUA = _TOUCH_LUA + """
+for _, role in ipairs({'user1', 'user2'}) do
+    if redis.call('HGET', KEYS[1], role) == ARGV[4] then
+        redis.call('HSET', KEYS[1], role, '', role .. '_command', '', role .. '_username', '')
+        local users = redis.call('HMGET', KEYS[1], 'user1', 'user2')
+        if users[1] == '' and users[2] == '' then
+            redis.call('DEL', KEYS[1])
+            redis.call('ZREM', KEYS[2], KEYS[1])
+        else
+            redis.call('HINCRBY', KEYS[1], 'seq', 1)
+            touch()
+        end
+        return role
+    end
+end
+return false
+"""
+
+# 清理脚本：ARGV[1] = 过期截止时间戳（0表示不按TTL清理）, ARGV[2] = 房间数上限（0表示不限）
+#           ARGV[3] = 单次最多清理的过期房间数
+_SWEEP_LUA = """
+local expired = 0
+if tonumber(ARGV[1]) > 0 then
+    -- 每次最多清理ARGV[3]个，避免单个脚本长时间阻塞Redis
+    local keys = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+    for _, key in ipairs(keys) do
+        redis.call('DEL', key)
+        redis.call('ZREM', KEYS[1], key)
+    end
+    expired = #keys
+    if expired > 0 then
+        redis.call('HINCRBY', KEYS[2], 'expired', expired)
+    end
+end
+local evicted = 0
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[2])
+if tonumber(ARGV[2]) > 0 and overflow > 0 then
+    local popped = redis.call('ZPOPMIN', KEYS[1], overflow)
+    for i = 1, #popped, 2 do
+        redis.call('DEL', popped[i])
+    end
+    evicted = #popped / 2
+    redis.call('HINCRBY', KEYS[2], 'evicted', evicted)
+end
+return expired + evicted
+"""
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RedisRoomStore(RoomStore):
+    """Redis房间存储，多个worker/节点共享同一份房间状态
+
+    每个房间保存为一个Hash，所有修改通过Lua脚本在Redis端原子执行。
+    空闲TTL直接使用Redis的键过期；活跃时间另记在一个ZSet中，
+    清理时按分数范围取出过期房间，并在超过容量上限时淘汰分数最低的房间。
+    """
+
+    def __init__(self, client, prefix='heartsync:', idle_ttl=0, max_rooms=0, clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self.idle_ttl = idle_ttl
+        self.max_rooms = max_rooms
+        self._clock = clock
+        self.sweep_batch = 1000
+        self._index_key = f'{prefix}rooms'
+        self._stats_key = f'{prefix}room_stats'
+        self._get_or_create = client.register_script(_GET_OR_CREATE_LUA)
+        self._assign_role = client.register_script(_ASSIGN_ROLE_LUA)
+        self._set_command = client.register_script(_SET_COMMAND_LUA)
+        self._mark_matched = client.register_script(_MARK_MATCHED_LUA)
+        self._release = client.register_script(_RELEASE_LUA)
+        self._sweep = client.register_script(_SWEEP_LUA)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """通过Redis URL创建存储"""
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, room_code):
+        return f'{self.prefix}room:{room_code}'
+
+    def _call(self, script, room_code, *args):
+        keys = [self._key(room_code), self._index_key, self._stats_key]
+        now = self._clock()
+        return script(keys=keys, args=[time.time(), now, int(self.idle_ttl)] + list(args))
+
+    @staticmethod
+    def _decode(raw):
+        """将Redis Hash转换为Room"""
+        if isinstance(raw, list):
+            raw = dict(zip(raw[::2], raw[1::2]))
+        state = {_text(key): _text(value) for key, value in raw.items()}
+        room = Room(created_at=float(state.get('created_at') or 0))
+        room.user1 = int(state['user1']) if state.get('user1') else None
+        room.user2 = int(state['user2']) if state.get('user2') else None
+        room.user1_username = state.get('user1_username') or None
+        room.user2_username = state.get('user2_username') or None
+        room.user1_command = state.get('user1_command', '')
+        room.user2_command = state.get('user2_command', '')
+        room.status = state.get('status', 'waiting')
+        room.seq = int(state.get('seq') or 0)
+        return room
+
+    def get(self, room_code):
+        raw = self.client.hgetall(self._key(room_code))
+        return self._decode(raw) if raw else None
+
+    def get_or_create(self, room_code):
+        return self._decode(self._call(self._get_or_create, room_code))
+
+    def assign_role(self, room_code, user_id, nickname):
+        role, raw = self._call(self._assign_role, room_code, str(user_id), nickname or '')
+        return _text(role) or None, self._decode(raw)
+
+    def set_command(self, room_code, role, command, user_id):
+        raw = self._call(self._set_command, room_code, role, command, str(user_id))
+        return self._decode(raw) if raw else None
+
+    def mark_matched(self, room_code, user1_command, user2_command):
+        raw = self._call(self._mark_matched, room_code, user1_command, user2_command)
+        return self._decode(raw) if raw else None
+
+    def release(self, room_code, user_id):
+        return _text(self._call(self._release, room_code, str(user_id)))
+
+    def sweep(self):
+        deadline = self._clock() - self.idle_ttl if self.idle_ttl else 0
+        return int(self._sweep(keys=[self._index_key, self._stats_key],
+                               args=[deadline, int(self.max_rooms), self.sweep_batch]))
+
+    def stats(self):
+        counters = {_text(k): int(v) for k, v in self.client.hgetall(self._stats_key).items()}
+        return {
+            'rooms': self.client.zcard(self._index_key),
+            'created': counters.get('created', 0),
+            'expired': counters.get('expired', 0),
+            'evicted': counters.get('evicted', 0),
+        }
+
+    def get_version(self, name):
+        return int(self.client.get(f'{self.prefix}version:{name}') or 0)
+
+    def bump_version(self, name):
+        return int(self.client.incr(f'{self.prefix}version:{name}'))
+
+    def cache_get(self, key):
+        """读取共享缓存（JSON），不存在时返回None"""
+        raw = self.client.get(f'{self.prefix}cache:{key}')
+        return json.loads(raw) if raw is not None else None
+
+    def cache_set(self, key, value, ttl):
+        """写入共享缓存，ttl秒后过期"""
+        self.client.set(f'{self.prefix}cache:{key}', json.dumps(value), ex=max(int(ttl), 1))
+
+    def cache_delete(self, key):
+        """删除共享缓存"""
+        self.client.delete(f'{self.prefix}cache:{key}')
+
+
+def run_sweeper(store, interval, sleep=time.sleep, logger=None):
+    """后台清理循环：每隔interval秒清理一次空闲/超额房间"""
+    while True:
+        sleep(interval)
+        try:
+            store.sweep()
+        except Exception as e:
+            # 清理失败（如Redis暂时不可用）不应终止循环，下个周期重试
+            if logger is not None:
+                logger.exception(f'Room sweep failed: {str(e)}')
+
+
+def create_room_store(config):
+    """根据配置创建房间存储"""
+    backend = getattr(config, 'ROOM_STORE_BACKEND', 'memory')
+    options = {
+        'idle_ttl': getattr(config, 'ROOM_IDLE_TTL', 0),
+        'max_rooms': getattr(config, 'ROOM_MAX_ROOMS', 0),
+    }
+    if backend == 'memory':
+        shards = getattr(config, 'ROOM_STORE_SHARDS', 1)
+        if shards > 1:
+            return ShardedRoomStore(shards=shards, **options)
+        return MemoryRoomStore(**options)
+    if backend == 'redis':
+        return RedisRoomStore.from_url(config.REDIS_URL,
+                                       prefix=getattr(config, 'REDIS_KEY_PREFIX', 'heartsync:'),
+                                       **options)
+    raise ValueError(f'未知的房间存储后端: {backend}')
@@ -0,0 +1,111 @@
+"""
+SocketIO消息编码模块
+在默认的JSON编码之外，允许客户端在连接时选择MessagePack编码（查询参数serializer=msgpack），
+同一服务器上两种客户端并存，广播时每种编码只编码一次
+"""
+from urllib.parse import parse_qs
+
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+
+try:
+    from socketio.msgpack_packet import MsgPackPacket
+except ImportError:
+    MsgPackPacket = None
+
+# 客户端选择编码的查询参数
+SERIALIZER_PARAM = 'serializer'
+
+# 在连接的WSGI environ中缓存该连接是否使用MessagePack
+_ENVIRON_KEY = 'heartsync.msgpack'
+
+
+class NegotiatedPacket(packet.Packet):
+    """按收到的数据类型解码的数据包
+
+    JSON客户端发送文本消息（二进制附件在服务器端按所属数据包单独处理，不经过这里），
+    MessagePack客户端发送二进制消息，因此服务器无需事先知道客户端的编码即可解码。
+    编码默认为JSON，发给MessagePack客户端的数据包由NegotiatingManager改用MsgPackPacket编码。
+    """
+
+    def decode(self, encoded_packet):
+        if isinstance(encoded_packet, bytes):
+            return MsgPackPacket.decode(self, encoded_packet)
+        return super().decode(encoded_packet)
+
+
+def uses_msgpack(environ):
+    """连接是否选择了MessagePack编码（结果缓存在environ中）"""
+    if environ is None:
+        return False
+    result = environ.get(_ENVIRON_KEY)
+    if result is None:
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        result = environ[_ENVIRON_KEY] = query.get(SERIALIZER_PARAM) == ['msgpack']
+    return result
+
+
+class NegotiatingManager(socketio.Manager):
+    """按连接选择编码的客户端管理器
+
+    服务器的packet_class为NegotiatedPacket时生效：向房间广播时按接收者的编码分组，
+    JSON与MessagePack各最多编码一次；连接确认、回调等单独发送的数据包在发送时按接收者转换。
+    其他情况下与socketio.Manager相同。BatchingRedisManager继承了本类，消息队列与编码协商可同时使用。
+    """
+
+    def initialize(self):
+        super().initialize()
+        if self.server.packet_class is not NegotiatedPacket:
+            return
+        send_packet = self.server._send_packet
+        if getattr(send_packet, 'negotiated', False):
+            return
+
+        def negotiated_send_packet(eio_sid, pkt):
+            if uses_msgpack(self.server.environ.get(eio_sid)):
+                pkt = MsgPackPacket(pkt.packet_type, pkt.data, namespace=pkt.namespace, id=pkt.id)
+            return send_packet(eio_sid, pkt)
+        negotiated_send_packet.negotiated = True
+        self.server._send_packet = negotiated_send_packet
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        if callback or self.server.packet_class is not NegotiatedPacket:
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, **kwargs)
+        if namespace not in self.rooms:
+            return
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        # 编码 -> 编码后的Engine.IO数据包，只在有该编码的接收者时编码
+        encoded = {}
+        for sid, eio_sid in self.get_participants(namespace, room):
+            if sid in skip_sid:
+                continue
+            msgpack = uses_msgpack(self.server.environ.get(eio_sid))
+            eio_pkts = encoded.get(msgpack)
+            if eio_pkts is None:
+                packet_class = MsgPackPacket if msgpack else self.server.packet_class
+                encoded_packet = packet_class(packet.EVENT, namespace=namespace,
+                                              data=[event] + data).encode()
+                if not isinstance(encoded_packet, list):
+                    encoded_packet = [encoded_packet]
+                eio_pkts = encoded[msgpack] = [eio_packet.Packet(eio_packet.MESSAGE, p)
+                                               for p in encoded_packet]
+            for eio_pkt in eio_pkts:
+                self.server._send_eio_packet(eio_sid, eio_pkt)
+
+
+def create_serializer(config):
+    """返回SocketIO服务器的serializer参数：开启SOCKETIO_MSGPACK时为NegotiatedPacket，否则为默认JSON"""
+    if not getattr(config, 'SOCKETIO_MSGPACK', False):
+        return 'default'
+    if MsgPackPacket is None:
+        raise RuntimeError('SOCKETIO_MSGPACK需要msgpack（pip install msgpack）')
+    return NegotiatedPacket
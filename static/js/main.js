@@ -487,6 +487,57 @@ function onResize(callback) {
     window.addEventListener('resize', debounce(callback, 200));
 }
 
+// ========== SocketIO连接 ==========
+
+// MessagePack编码的SocketIO解析器（需先加载@msgpack/msgpack，全局对象MessagePack）
+// 与服务器端的MsgPackPacket格式相同：每个数据包编码为一个{type, data, nsp, id}对象，不使用二进制附件
+const msgpackParser = {
+    protocol: 5,
+    Encoder: class {
+        encode(packet) {
+            return [MessagePack.encode(packet)];
+        }
+    },
+    Decoder: class {
+        constructor() {
+            this.listeners = [];
+        }
+        on(event, listener) {
+            if (event === 'decoded') this.listeners.push(listener);
+            return this;
+        }
+        off(event, listener) {
+            this.listeners = listener ? this.listeners.filter(l => l !== listener) : [];
+            return this;
+        }
+        add(chunk) {
+            if (typeof chunk === 'string') {
+                throw new Error('MessagePack解析器收到文本消息');
+            }
+            const packet = MessagePack.decode(chunk);
+            this.listeners.forEach(listener => listener(packet));
+        }
+        destroy() {
+            this.listeners = [];
+        }
+    }
+};
+
+// 建立SocketIO连接：服务器开启了MessagePack且页面已加载MessagePack库时使用二进制编码，否则使用默认的JSON编码；
+// node为负责房间的节点名（启用一致性哈希时），带在连接URL中供nginx选择上游
+function connectSocket(useMsgpack = false, node = null) {
+    const query = node ? { node: node } : {};
+    if (useMsgpack && typeof MessagePack !== 'undefined') {
+        // 长轮询下二进制消息要经过base64编码，只在WebSocket上使用MessagePack
+        return io({
+            parser: msgpackParser,
+            query: { ...query, serializer: 'msgpack' },
+            transports: ['websocket']
+        });
+    }
+    return io({ query: query });
+}
+
 // ========== 控制台 ==========
 
 // 在开发模式下显示友好的控制台信息
@@ -527,6 +578,8 @@ if (typeof module !== 'undefined' && module.exports) {
         isMobile,
         isTouchDevice,
         getViewportSize,
-        onResize
+        onResize,
+        msgpackParser,
+        connectSocket
     };
 }
@@ -0,0 +1,84 @@
+"""
+测试公共配置
+在导入应用之前设置测试所需的环境变量，并提供共用的应用、数据库与用户fixture
+"""
+import os
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+os.environ.setdefault('SUBMIT_COALESCE_WINDOW', '0')
+
+
+def reset_app_state():
+    """清空应用的进程级缓存：用户缓存、用户名/邮箱过滤器与自定义配对缓存
+    
+    数据库重建后用户ID会被复用，缓存中的旧用户和旧配对不能留给下一个测试。
+    """
+    import app as app_module
+    app_module.user_cache.clear()
+    app_module.user_filter.invalidate()
+    app_module.pair_cache.invalidate()
+
+
+@pytest.fixture
+def app_db():
+    """创建好数据表的应用
+    
+    结束时先把写回缓冲（最后登录时间、配对记录）中本测试产生的数据写入本测试的数据库，
+    再删除数据表并清空进程级缓存，避免留给下一个测试或在进程退出时写入已删除的表。
+    """
+    from app import app, db, last_login_buffer, match_queue
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+    reset_app_state()
+    
+    yield app
+    
+    last_login_buffer.flush()
+    match_queue.flush()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    reset_app_state()
+
+
+@pytest.fixture
+def make_user(app_db):
+    """创建用户（邮箱为<用户名>@example.com，昵称与用户名相同），返回用户ID"""
+    from app import db
+    from models import User
+    
+    def make(username, password='Test123', password_hash=None):
+        with app_db.app_context():
+            user = User(username=username, email=f'{username}@example.com', nickname=username)
+            if password_hash is None:
+                user.set_password(password)
+            else:
+                user.password_hash = password_hash
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def users(make_user):
+    """创建alice和bob两个用户，返回{用户名: 用户ID}"""
+    return {name: make_user(name) for name in ('alice', 'bob')}
+
+
+@pytest.fixture
+def login(app_db):
+    """返回以指定用户登录的HTTP测试客户端
+    
+    每个客户端单独登录，不在外层保持应用上下文，否则各请求会共享g中缓存的current_user。
+    """
+    def log_in(username, password='Test123'):
+        client = app_db.test_client()
+        client.post('/login', data={'username': username, 'password': password})
+        return client
+    return log_in
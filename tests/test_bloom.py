@@ -0,0 +1,282 @@
+"""
+布隆过滤器测试模块
+测试过滤器的误判率、后台构建、跨worker同步与用户名/邮箱检查接口
+"""
+import logging
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from bloom import FILTER_RETRY_INTERVAL, BloomFilter, UserFilter, run_filter_builder
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestBloomFilter:
+    """测试布隆过滤器"""
+    
+    def test_no_false_negatives(self):
+        """测试已添加的元素一定能查到"""
+        bloom = BloomFilter(1000)
+        names = [f'user{i}' for i in range(1000)]
+        for name in names:
+            bloom.add(name)
+        assert all(name in bloom for name in names)
+        assert len(bloom) == 1000
+    
+    def test_false_positive_rate(self):
+        """测试误判率接近设定值"""
+        bloom = BloomFilter(10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(f'user{i}')
+        false_positives = sum(f'other{i}' in bloom for i in range(10000))
+        assert false_positives < 200
+    
+    def test_unicode(self):
+        """测试中文用户名"""
+        bloom = BloomFilter(10)
+        bloom.add('小爱')
+        assert '小爱' in bloom
+
+
+class Users:
+    """内存中的users表，loader按ID范围读取"""
+    
+    def __init__(self, *names):
+        self.rows = []
+        self.reads = []
+        for name in names:
+            self.insert(name)
+    
+    def insert(self, name):
+        self.rows.append((len(self.rows) + 1, name, f'{name}@example.com'))
+    
+    def __call__(self, since_id=None):
+        self.reads.append(since_id)
+        return [row for row in self.rows if since_id is None or row[0] > since_id]
+
+
+class TestUserFilter:
+    """测试用户过滤器"""
+    
+    def test_unbuilt_falls_back(self):
+        """测试构建完成前一律交给数据库判断，检查请求不触发构建"""
+        users = Users('alice')
+        user_filter = UserFilter(users)
+        assert user_filter.might_exist('username', 'nobody')
+        assert users.reads == []
+        assert user_filter.rebuild()
+        assert not user_filter.might_exist('username', 'nobody')
+        assert user_filter.might_exist('username', 'alice')
+    
+    def test_add(self):
+        """测试本进程注册的用户随即加入"""
+        user_filter = UserFilter(Users('alice'))
+        user_filter.rebuild()
+        assert not user_filter.might_exist('email', 'bob@example.com')
+        user_filter.add('bob', 'bob@example.com')
+        assert user_filter.might_exist('email', 'bob@example.com')
+        assert user_filter.stats()['fast_path'] == 1
+    
+    def test_version_change_reads_new_users(self):
+        """测试共享版本号变化后只读取新注册的用户"""
+        users = Users('alice')
+        version = [0]
+        clock = FakeClock()
+        user_filter = UserFilter(users, version_source=lambda: version[0], check_interval=1.0,
+                                 clock=clock)
+        user_filter.rebuild()
+        users.insert('carol')
+        version[0] += 1
+        # 在check_interval内不读取版本号
+        assert not user_filter.might_exist('username', 'carol')
+        clock.now += 1
+        assert user_filter.might_exist('username', 'carol')
+        assert users.reads == [None, 1]
+        clock.now += 1
+        user_filter.might_exist('username', 'carol')
+        assert users.reads == [None, 1]
+    
+    def test_grows_past_capacity(self):
+        """测试用户数超过容量时扩容"""
+        user_filter = UserFilter(Users(*(f'user{i}' for i in range(50))), capacity=10)
+        user_filter.rebuild()
+        assert user_filter.might_exist('username', 'user49')
+        assert user_filter.capacity >= 50
+    
+    def test_checks_not_blocked_by_rebuild(self):
+        """测试重建期间检查请求使用当前过滤器，不等待查询"""
+        entered = threading.Event()
+        release = threading.Event()
+        users = Users('alice')
+        
+        def loader(since_id=None):
+            if users.reads:
+                entered.set()
+                release.wait(5)
+            return users(since_id)
+        
+        user_filter = UserFilter(loader)
+        user_filter.rebuild()
+        rebuild = threading.Thread(target=user_filter.rebuild)
+        rebuild.start()
+        assert entered.wait(5)
+        try:
+            assert user_filter.might_exist('username', 'alice')
+            assert not user_filter.might_exist('username', 'nobody')
+        finally:
+            release.set()
+            rebuild.join(5)
+    
+    def test_add_during_rebuild_not_lost(self):
+        """测试重建期间注册的用户在重建完成后仍在过滤器中"""
+        entered = threading.Event()
+        release = threading.Event()
+        users = Users('alice')
+        
+        def loader(since_id=None):
+            if users.reads:
+                entered.set()
+                release.wait(5)
+            return users(since_id)
+        
+        user_filter = UserFilter(loader)
+        user_filter.rebuild()
+        rebuild = threading.Thread(target=user_filter.rebuild)
+        rebuild.start()
+        entered.wait(5)
+        user_filter.add('bob', 'bob@example.com')
+        release.set()
+        rebuild.join(5)
+        assert user_filter.stats()['rebuilds'] == 2
+        assert user_filter.might_exist('username', 'bob')
+    
+    def test_invalidate_discards_running_rebuild(self):
+        """测试构建期间被invalidate时不使用构建结果"""
+        entered = threading.Event()
+        release = threading.Event()
+        
+        def loader(since_id=None):
+            entered.set()
+            release.wait(5)
+            return [(1, 'alice', 'alice@example.com')]
+        
+        user_filter = UserFilter(loader)
+        rebuild = threading.Thread(target=user_filter.rebuild)
+        rebuild.start()
+        entered.wait(5)
+        user_filter.invalidate()
+        release.set()
+        rebuild.join(5)
+        assert user_filter.stats()['rebuilds'] == 0
+        assert user_filter.might_exist('username', 'nobody')
+    
+    def test_builder_survives_errors(self, caplog):
+        """测试后台构建失败后记录错误并重试"""
+        users = Users('alice')
+        calls = []
+        
+        def loader(since_id=None):
+            calls.append(since_id)
+            if len(calls) == 1:
+                raise RuntimeError('database unavailable')
+            return users(since_id)
+        
+        user_filter = UserFilter(loader)
+        sleeps = []
+        logger = logging.getLogger('test_bloom')
+        with caplog.at_level(logging.ERROR, logger='test_bloom'):
+            run_filter_builder(user_filter, 0, sleeps.append, logger)
+        assert 'database unavailable' in caplog.text
+        assert sleeps == [FILTER_RETRY_INTERVAL]
+        assert user_filter.might_exist('username', 'alice')
+
+
+@pytest.fixture
+def check_client(make_user, app_db):
+    from app import user_filter
+    make_user('alice')
+    user_filter.rebuild()
+    return app_db.test_client()
+
+
+class TestCheckEndpoints:
+    """测试用户名/邮箱检查接口"""
+    
+    def test_single(self, check_client):
+        """测试单个检查"""
+        rv = check_client.post('/api/check-username', json={'username': 'alice'})
+        assert rv.get_json() == {'available': False, 'message': '用户名已被使用'}
+        rv = check_client.post('/api/check-email', json={'email': 'new@example.com'})
+        assert rv.get_json()['available'] is True
+        rv = check_client.post('/api/check-username', json={'username': ''})
+        assert rv.get_json()['message'] == '用户名不能为空'
+    
+    def test_free_name_skips_database(self, check_client):
+        """测试过滤器判断未被使用时不查询users表"""
+        from app import app, db
+        check_client.post('/api/check-username', json={'username': 'warmup'})
+        executed = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+        
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            rv = check_client.post('/api/check-username', json={'username': 'brand_new_name'})
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        assert rv.get_json()['available'] is True
+        assert not any('users' in statement for statement in executed)
+    
+    def test_other_worker_registration(self, check_client, monkeypatch):
+        """测试其他worker注册的用户在共享版本号变化后被过滤器读到"""
+        from sqlalchemy import insert
+        
+        from app import app, db, room_store, user_filter
+        from models import User
+        monkeypatch.setattr(user_filter, 'check_interval', 0)
+        # Core插入不经过本进程的after_commit，相当于其他worker注册的用户
+        with app.app_context():
+            db.session.execute(insert(User.__table__).values(
+                username='erin', email='erin@example.com', nickname='erin', password_hash='x'))
+            db.session.commit()
+        assert not user_filter.might_exist('username', 'erin')
+        room_store.bump_version('users')
+        rv = check_client.post('/api/check-username', json={'username': 'erin'})
+        assert rv.get_json()['available'] is False
+    
+    def test_batch(self, check_client):
+        """测试批量检查"""
+        rv = check_client.post('/api/check-username', json={'usernames': ['alice', 'bob', 'carol']})
+        results = rv.get_json()['results']
+        assert results['alice']['available'] is False
+        assert results['bob']['available'] is True
+        assert results['carol']['available'] is True
+    
+    def test_batch_limit(self, check_client):
+        """测试批量检查数量上限"""
+        rv = check_client.post('/api/check-username',
+                               json={'usernames': [f'u{i}' for i in range(51)]})
+        assert rv.status_code == 400
+    
+    def test_registration_updates_filter(self, check_client):
+        """测试注册后过滤器立即包含新用户"""
+        check_client.post('/api/check-username', json={'username': 'dave'})
+        check_client.post('/register', data={
+            'username': 'dave', 'email': 'dave@example.com',
+            'password': 'Test123', 'confirm_password': 'Test123'
+        })
+        rv = check_client.post('/api/check-username', json={'username': 'dave'})
+        assert rv.get_json()['available'] is False
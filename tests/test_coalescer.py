@@ -0,0 +1,101 @@
+"""
+指令合并测试模块
+"""
+import logging
+
+from coalescer import CommandCoalescer
+
+
+class ManualScheduler:
+    """手动执行延迟任务的调度器"""
+    
+    def __init__(self):
+        self.tasks = []
+    
+    def spawn(self, fn, *args):
+        self.tasks.append((fn, args))
+    
+    def run(self):
+        tasks, self.tasks = self.tasks, []
+        for fn, args in tasks:
+            fn(*args)
+
+
+def make_coalescer(window=0.1, flush=None, logger=None):
+    flushed = []
+    scheduler = ManualScheduler()
+    coalescer = CommandCoalescer(window, flush or (lambda *args: flushed.append(args)),
+                                 scheduler.spawn, lambda seconds: None, logger)
+    return coalescer, scheduler, flushed
+
+
+class TestCommandCoalescer:
+    """测试指令合并"""
+    
+    def test_last_value_wins(self):
+        """测试窗口内只处理最后一次提交"""
+        coalescer, scheduler, flushed = make_coalescer()
+        for command in ('x', 'xi', '喜', '喜欢'):
+            coalescer.submit('ROOM01', 1, 'user1', command)
+        assert flushed == []
+        
+        scheduler.run()
+        assert flushed == [('ROOM01', 'user1', '喜欢', 1)]
+        assert coalescer.stats() == {'inbound': 4, 'collapsed': 3, 'flushed': 1, 'pending': 0}
+    
+    def test_users_are_independent(self):
+        """测试不同用户分别合并"""
+        coalescer, scheduler, flushed = make_coalescer()
+        coalescer.submit('ROOM01', 1, 'user1', '我')
+        coalescer.submit('ROOM01', 2, 'user2', '你')
+        coalescer.submit('ROOM02', 1, 'user1', '爱')
+        scheduler.run()
+        assert sorted(flushed) == [('ROOM01', 'user1', '我', 1), ('ROOM01', 'user2', '你', 2),
+                                   ('ROOM02', 'user1', '爱', 1)]
+    
+    def test_new_window_after_flush(self):
+        """测试处理后的提交开启新窗口"""
+        coalescer, scheduler, flushed = make_coalescer()
+        coalescer.submit('ROOM01', 1, 'user1', '想')
+        scheduler.run()
+        coalescer.submit('ROOM01', 1, 'user1', '想你')
+        scheduler.run()
+        assert [f[2] for f in flushed] == ['想', '想你']
+    
+    def test_keyed_by_user(self):
+        """测试窗口内座位换人时分别处理，旧指令仍带着原提交者"""
+        coalescer, scheduler, flushed = make_coalescer()
+        coalescer.submit('ROOM01', 1, 'user1', '我')
+        coalescer.submit('ROOM01', 3, 'user1', '你')
+        scheduler.run()
+        assert sorted(flushed) == [('ROOM01', 'user1', '你', 3), ('ROOM01', 'user1', '我', 1)]
+    
+    def test_discard_on_leave(self):
+        """测试用户离开后丢弃其待处理的指令"""
+        coalescer, scheduler, flushed = make_coalescer()
+        coalescer.submit('ROOM01', 1, 'user1', '我')
+        assert coalescer.discard('ROOM01', 1) is True
+        assert coalescer.discard('ROOM01', 1) is False
+        scheduler.run()
+        assert flushed == []
+        assert coalescer.stats()['pending'] == 0
+    
+    def test_flush_error_logged(self, caplog):
+        """测试处理失败时记录错误，不影响之后的提交"""
+        def flush(*args):
+            raise RuntimeError('redis down')
+        
+        coalescer, scheduler, _ = make_coalescer(flush=flush, logger=logging.getLogger('test_coalescer'))
+        coalescer.submit('ROOM01', 1, 'user1', '我')
+        with caplog.at_level(logging.ERROR, logger='test_coalescer'):
+            scheduler.run()
+        assert 'redis down' in caplog.records[0].getMessage()
+        coalescer.submit('ROOM01', 1, 'user1', '我')
+        assert len(scheduler.tasks) == 1
+    
+    def test_zero_window_flushes_immediately(self):
+        """测试窗口为0时立即处理"""
+        coalescer, scheduler, flushed = make_coalescer(window=0)
+        coalescer.submit('ROOM01', 1, 'user1', '我')
+        assert flushed == [('ROOM01', 'user1', '我', 1)]
+        assert scheduler.tasks == []
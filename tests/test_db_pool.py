@@ -0,0 +1,116 @@
+"""
+数据库连接池测试模块
+测试按环境生成的连接池参数与连接等待统计
+"""
+import logging
+import sys
+import threading
+import time
+import types
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from config import Config, DevelopmentConfig, ProductionConfig
+from db_pool import InstrumentedQueuePool, engine_options, patch_for_green_threads, pool_stats
+
+
+def make_engine(tmp_path, **kwargs):
+    return create_engine(f'sqlite:///{tmp_path / "pool.db"}', poolclass=InstrumentedQueuePool,
+                         **kwargs)
+
+
+class TestEngineOptions:
+    """测试连接池参数"""
+    
+    def test_sqlite_skipped(self):
+        """测试SQLite不设置连接池参数"""
+        class SqliteConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///users.db'
+        assert engine_options(SqliteConfig) == {}
+    
+    def test_per_environment(self):
+        """测试各环境的连接池大小"""
+        class Development(DevelopmentConfig):
+            SQLALCHEMY_DATABASE_URI = 'postgresql://localhost/heartsync'
+        
+        class Production(ProductionConfig):
+            SQLALCHEMY_DATABASE_URI = 'postgresql://localhost/heartsync'
+        
+        dev, prod = engine_options(Development), engine_options(Production)
+        assert dev['poolclass'] is InstrumentedQueuePool
+        assert prod['pool_pre_ping'] is True
+        assert prod['pool_size'] >= dev['pool_size']
+        assert set(dev) == {'poolclass', 'pool_size', 'max_overflow', 'pool_timeout',
+                            'pool_recycle', 'pool_pre_ping'}
+
+
+class TestInstrumentedQueuePool:
+    """测试连接池统计"""
+    
+    def test_checkout_counted(self, tmp_path):
+        """测试获取连接次数与借出数"""
+        engine = make_engine(tmp_path, pool_size=2, max_overflow=0)
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            stats = pool_stats(engine)
+            assert stats['in_use'] == 1
+            assert stats['saturation'] == 0.5
+        stats = pool_stats(engine)
+        assert stats['checkouts'] == 1
+        assert stats['in_use'] == 0
+        assert stats['peak_in_use'] == 1
+        engine.dispose()
+    
+    def test_wait_recorded(self, tmp_path):
+        """测试连接用完时记录等待时间"""
+        engine = make_engine(tmp_path, pool_size=1, max_overflow=0, pool_timeout=5)
+        held = engine.connect()
+        
+        def release():
+            time.sleep(0.1)
+            held.close()
+        
+        thread = threading.Thread(target=release)
+        thread.start()
+        with engine.connect():
+            pass
+        thread.join()
+        stats = pool_stats(engine)
+        assert stats['wait_max_ms'] >= 80
+        assert stats['wait_buckets']['0.5'] == 1
+        engine.dispose()
+    
+    def test_timeout_counted(self, tmp_path):
+        """测试获取连接超时"""
+        engine = make_engine(tmp_path, pool_size=1, max_overflow=0, pool_timeout=0.05)
+        with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+        assert pool_stats(engine)['timeouts'] == 1
+        engine.dispose()
+    
+    def test_other_pools_ignored(self, tmp_path):
+        """测试其他连接池不返回统计"""
+        engine = create_engine(f'sqlite:///{tmp_path / "plain.db"}')
+        assert pool_stats(engine) is None
+
+
+class TestPatchForGreenThreads:
+    """测试eventlet模式下的数据库驱动补丁"""
+    
+    def test_warns_without_psycogreen(self, monkeypatch, caplog):
+        """测试使用psycopg2但无法打补丁时记录警告"""
+        pytest.importorskip('eventlet')
+        monkeypatch.setitem(sys.modules, 'psycopg2', types.ModuleType('psycopg2'))
+        monkeypatch.setitem(sys.modules, 'psycogreen.eventlet', None)
+        logger = logging.getLogger('test_db_pool')
+        with caplog.at_level(logging.WARNING, logger='test_db_pool'):
+            patch_for_green_threads('eventlet', logger)
+        assert any('psycogreen' in record.getMessage() for record in caplog.records)
+    
+    def test_threading_mode_untouched(self, caplog):
+        """测试非eventlet模式不做任何处理"""
+        with caplog.at_level(logging.WARNING):
+            patch_for_green_threads('threading', logging.getLogger('test_db_pool'))
+        assert caplog.records == []
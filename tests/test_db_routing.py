@@ -0,0 +1,202 @@
+"""
+读写分离测试模块
+使用两个SQLite文件分别作为主库和副本，测试只读查询、写入与回退的路由
+"""
+import logging
+
+import pytest
+from flask import Flask, session as flask_session
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import exc, select, text, update
+
+from db_routing import (PRIMARY_UNTIL_KEY, ReplicaRouter, RoutingSession, init_replicas,
+                        run_replica_checker)
+
+
+def make_app(primary, replica, sticky=0):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary}'
+    app.config['SECRET_KEY'] = 'test'
+    app.config['REPLICA_STICKY_SECONDS'] = sticky
+    router = init_replicas(app, [f'sqlite:///{replica}'], cooldown=60)
+    db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String(50))
+
+    db.init_app(app)
+    with app.app_context():
+        router.attach(db.engines)
+    return app, db, Note, router
+
+
+@pytest.fixture
+def routed(tmp_path):
+    """主库与副本各一行，内容不同，用于判断查询发往哪个库"""
+    app, db, Note, router = make_app(tmp_path / 'primary.db', tmp_path / 'replica.db', sticky=5)
+    with app.app_context():
+        for key in (None, 'replica0'):
+            db.metadata.create_all(db.engines[key])
+            with db.engines[key].begin() as conn:
+                conn.execute(Note.__table__.insert(), {'id': 1, 'text': key or 'primary'})
+    yield app, db, Note, router
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def read_note(db, Note):
+    return db.session.execute(select(Note.text).where(Note.id == 1)).scalar()
+
+
+class TestRouting:
+    """测试查询路由"""
+    
+    def test_read_goes_to_replica(self, routed):
+        """测试只读查询发往副本"""
+        app, db, Note, router = routed
+        with app.app_context():
+            assert read_note(db, Note) == 'replica0'
+            assert db.session.get(Note, 1).text == 'replica0'
+        assert router.stats()['replica_reads'] == 2
+    
+    def test_write_goes_to_primary(self, routed):
+        """测试写入及写入之后的读取使用主库"""
+        app, db, Note, router = routed
+        with app.app_context():
+            db.session.add(Note(id=2, text='new'))
+            db.session.commit()
+            assert read_note(db, Note) == 'primary'
+        with app.app_context():
+            assert db.session.get(Note, 2) is None
+            with db.engines[None].connect() as conn:
+                assert conn.execute(text('SELECT text FROM note WHERE id = 2')).scalar() == 'new'
+    
+    def test_update_statement_goes_to_primary(self, routed):
+        """测试UPDATE语句与FOR UPDATE查询使用主库"""
+        app, db, Note, router = routed
+        with app.app_context():
+            db.session.execute(update(Note).where(Note.id == 1).values(text='changed'))
+            db.session.commit()
+        with app.app_context():
+            locked = select(Note.text).where(Note.id == 1).with_for_update()
+            assert db.session.execute(locked).scalar() == 'changed'
+            assert read_note(db, Note) == 'replica0'
+    
+    def test_sticky_primary_after_write(self, routed):
+        """测试写入后的后续请求在一段时间内读主库"""
+        app, db, Note, router = routed
+        with app.test_request_context():
+            db.session.add(Note(id=2, text='new'))
+            db.session.commit()
+            assert PRIMARY_UNTIL_KEY in flask_session
+            sticky = dict(flask_session)
+        with app.test_request_context():
+            flask_session.update(sticky)
+            assert read_note(db, Note) == 'primary'
+        with app.test_request_context():
+            assert read_note(db, Note) == 'replica0'
+    
+    def test_no_replicas(self, tmp_path):
+        """测试未配置副本时与普通会话相同"""
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "primary.db"}'
+        assert init_replicas(app, []) is None
+        db = SQLAlchemy(session_options={'class_': RoutingSession})
+        db.init_app(app)
+        with app.app_context():
+            assert db.session.execute(text('SELECT 1')).scalar() == 1
+            assert list(db.engines) == [None]
+    
+    def test_app_uses_routing_session(self):
+        """测试应用的数据库会话使用RoutingSession"""
+        from models import db
+        assert issubclass(db.session.session_factory.class_, RoutingSession)
+
+
+class TestFallback:
+    """测试副本不可用时回退到主库"""
+    
+    def test_unreachable_replica(self, tmp_path):
+        """测试副本连接失败的读取在主库上重试，之后的读取回退到主库，探测成功后恢复"""
+        replica = tmp_path / 'missing' / 'replica.db'
+        app, db, Note, router = make_app(tmp_path / 'primary.db', replica)
+        with app.app_context():
+            db.metadata.create_all(db.engines[None])
+            assert db.session.execute(select(Note)).all() == []
+            assert router.stats()['replicas'] == {'replica0': False}
+            assert router.stats()['retries'] == 1
+            assert db.session.execute(select(Note)).all() == []
+            assert router.stats()['primary_reads'] == 1
+
+            replica.parent.mkdir()
+            router.check(db.engines)
+            assert router.is_healthy('replica0')
+            for engine in db.engines.values():
+                engine.dispose()
+    
+    def test_orm_get_retried_on_primary(self, tmp_path):
+        """测试按主键加载（如load_user）遇到副本失败时从主库读到对象"""
+        replica = tmp_path / 'missing' / 'replica.db'
+        app, db, Note, router = make_app(tmp_path / 'primary.db', replica)
+        with app.app_context():
+            db.metadata.create_all(db.engines[None])
+            with db.engines[None].begin() as conn:
+                conn.execute(Note.__table__.insert(), {'id': 1, 'text': 'primary'})
+            assert db.session.get(Note, 1).text == 'primary'
+            assert router.stats()['retries'] == 1
+            for engine in db.engines.values():
+                engine.dispose()
+    
+    def test_statement_error_not_retried(self, routed):
+        """测试副本健康时语句本身的错误照常抛出，不在主库上重试"""
+        app, db, Note, router = routed
+        with app.app_context():
+            with pytest.raises(exc.OperationalError):
+                db.session.execute(select(text('missing_column')).select_from(Note)).all()
+        assert router.stats()['retries'] == 0
+        assert router.is_healthy('replica0')
+    
+    def test_round_robin_skips_unhealthy(self):
+        """测试在健康副本之间轮询"""
+        now = [0]
+        router = ReplicaRouter(['a', 'b'], cooldown=10, clock=lambda: now[0])
+        assert {router.choose(), router.choose()} == {'a', 'b'}
+        router.mark_down('a')
+        assert [router.choose() for _ in range(3)] == ['b', 'b', 'b']
+        router.mark_down('b')
+        assert router.choose() is None
+        now[0] = 11
+        assert router.choose() in ('a', 'b')
+        assert router.stats()['failures'] == 2
+    
+    def test_checker_survives_errors(self, tmp_path, caplog):
+        """测试探测出错被记录且不会中断循环，副本之后仍能恢复"""
+        app, db, Note, router = make_app(tmp_path / 'primary.db', tmp_path / 'replica.db')
+        router.mark_down('replica0')
+        calls = []
+        
+        class Engines:
+            def __getitem__(self, key):
+                calls.append(key)
+                if len(calls) == 1:
+                    raise RuntimeError('engine registry broken')
+                return db.engines[key]
+        
+        class Db:
+            engines = Engines()
+        
+        def sleep(seconds):
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+        
+        logger = logging.getLogger('test_db_routing')
+        with caplog.at_level(logging.ERROR, logger='test_db_routing'):
+            with pytest.raises(KeyboardInterrupt):
+                run_replica_checker(app, Db(), router, 5, sleep, logger)
+        assert 'engine registry broken' in caplog.text
+        assert router.is_healthy('replica0')
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
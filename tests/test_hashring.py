@@ -0,0 +1,152 @@
+"""
+一致性哈希测试模块
+测试房间码在节点间的分布、增减节点时只移动受影响的房间，以及协作页面与加入房间的路由
+"""
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import app as app_module
+from app import app, socketio
+from hashring import NODE_PARAM, HashRing, create_hash_ring
+
+ROOM_CODES = [f'R{i:05d}' for i in range(20000)]
+
+
+class TestHashRing:
+    """测试哈希环"""
+    
+    def test_balanced(self):
+        """测试房间码在节点间大致均匀分布"""
+        ring = HashRing(['app1', 'app2', 'app3', 'app4'])
+        counts = Counter(ring.node_for(code) for code in ROOM_CODES)
+        assert set(counts) == {'app1', 'app2', 'app3', 'app4'}
+        assert max(counts.values()) < 1.25 * len(ROOM_CODES) / 4
+    
+    def test_add_moves_only_to_new_node(self):
+        """测试增加节点时只有移到新节点的房间改变归属"""
+        ring = HashRing(['app1', 'app2', 'app3'])
+        before = {code: ring.node_for(code) for code in ROOM_CODES}
+        ring.add('app4')
+        moved = [code for code in ROOM_CODES if ring.node_for(code) != before[code]]
+        assert all(ring.node_for(code) == 'app4' for code in moved)
+        assert 0.15 < len(moved) / len(ROOM_CODES) < 0.35
+    
+    def test_remove_moves_only_its_rooms(self):
+        """测试移除节点时只有该节点的房间改变归属"""
+        ring = HashRing(['app1', 'app2', 'app3'])
+        before = {code: ring.node_for(code) for code in ROOM_CODES}
+        ring.remove('app2')
+        for code in ROOM_CODES:
+            if before[code] != 'app2':
+                assert ring.node_for(code) == before[code]
+            else:
+                assert ring.node_for(code) in ('app1', 'app3')
+        assert ring.nodes == ['app1', 'app3'] and 'app2' not in ring
+    
+    def test_independent_of_order(self):
+        """测试节点列表顺序不同的节点得到相同的路由"""
+        ring1 = HashRing(['app1', 'app2', 'app3'])
+        ring2 = HashRing(['app3', 'app1', 'app2'])
+        assert all(ring1.node_for(code) == ring2.node_for(code) for code in ROOM_CODES[:1000])
+    
+    def test_empty(self):
+        assert HashRing().node_for('ABC123') is None
+
+
+class TestCreateHashRing:
+    """测试按配置创建哈希环"""
+    
+    def test_not_configured(self):
+        assert create_hash_ring(SimpleNamespace(CLUSTER_NODES='')) is None
+    
+    def test_configured(self):
+        ring = create_hash_ring(SimpleNamespace(CLUSTER_NODES='app1, app2', NODE_NAME='app2',
+                                                HASH_RING_REPLICAS=10))
+        assert ring.nodes == ['app1', 'app2'] and ring.replicas == 10
+    
+    def test_node_not_in_cluster(self):
+        with pytest.raises(ValueError):
+            create_hash_ring(SimpleNamespace(CLUSTER_NODES='app1,app2', NODE_NAME='app3'))
+
+
+def foreign_room(ring, node, prefix='F'):
+    """返回一个不由node负责的房间码"""
+    return next(f'{prefix}{i:05d}' for i in range(1000) if ring.node_for(f'{prefix}{i:05d}') != node)
+
+
+class TestRouting:
+    """测试应用按哈希环路由房间"""
+    
+    @pytest.fixture
+    def ring(self, monkeypatch):
+        ring = HashRing(['app1', 'app2', 'app3'])
+        monkeypatch.setattr(app_module, 'hash_ring', ring)
+        monkeypatch.setattr(app_module.config, 'NODE_NAME', 'app1')
+        return ring
+    
+    @pytest.fixture
+    def http_client(self, make_user, login):
+        make_user('alice')
+        return login('alice')
+    
+    def test_generated_codes_owned_locally(self, ring):
+        """测试本节点生成的房间码都由本节点负责"""
+        assert all(ring.node_for(app_module.generate_room_code()) == 'app1' for _ in range(50))
+    
+    def test_collaborate_redirects_to_owner(self, ring, http_client):
+        """测试打开其他节点负责的房间时重定向到带有节点名的地址"""
+        room_code = foreign_room(ring, 'app1')
+        response = http_client.get(f'/collaborate?room={room_code}')
+        assert response.status_code == 302
+        owner = ring.node_for(room_code)
+        assert response.location.endswith(f'/collaborate?room={room_code}&{NODE_PARAM}={owner}')
+        assert http_client.get_cookie('heartsync_node') is None
+    
+    def test_no_redirect_loop(self, ring, http_client, monkeypatch, caplog):
+        """测试地址已带有负责节点名时不再重定向（nginx未按节点参数转发时由本节点处理）"""
+        monkeypatch.setattr(app_module, 'render_template', lambda *args, **kwargs: 'page')
+        room_code = foreign_room(ring, 'app1')
+        owner = ring.node_for(room_code)
+        response = http_client.get(f'/collaborate?room={room_code}&{NODE_PARAM}={owner}')
+        assert response.status_code == 200
+        assert f'belongs to node {owner}' in caplog.text
+    
+    def test_owned_room_passes_node(self, ring, http_client, monkeypatch):
+        """测试打开本节点负责的房间时把节点名交给页面，之后的SocketIO连接到达本节点"""
+        rendered = {}
+        monkeypatch.setattr(app_module, 'render_template',
+                            lambda *args, **kwargs: rendered.update(kwargs) or 'page')
+        room_code = app_module.generate_room_code()
+        response = http_client.get(f'/collaborate?room={room_code}')
+        assert response.status_code == 200
+        assert rendered['node'] == 'app1'
+    
+    def test_join_foreign_room(self, ring, http_client):
+        """测试加入其他节点负责的房间时收到room_redirect且不分配角色"""
+        client = socketio.test_client(app, flask_test_client=http_client)
+        client.get_received()
+        room_code = foreign_room(ring, 'app1', prefix='J')
+        client.emit('join_room', {'room_code': room_code})
+        received = client.get_received()
+        assert [message['name'] for message in received] == ['room_redirect']
+        owner = ring.node_for(room_code)
+        assert received[0]['args'][0]['node'] == owner
+        assert received[0]['args'][0]['url'].endswith(f'{NODE_PARAM}={owner}')
+        assert app_module.room_store.get(room_code) is None
+        client.disconnect()
+    
+    def test_join_foreign_room_no_loop(self, ring, http_client, caplog):
+        """测试连接URL已带有负责节点名时直接在本节点加入房间并记录警告"""
+        room_code = foreign_room(ring, 'app1', prefix='L')
+        owner = ring.node_for(room_code)
+        client = socketio.test_client(app, flask_test_client=http_client,
+                                      query_string=f'{NODE_PARAM}={owner}')
+        client.get_received()
+        client.emit('join_room', {'room_code': room_code})
+        names = [message['name'] for message in client.get_received()]
+        assert 'room_redirect' not in names and 'room_info' in names
+        assert app_module.room_store.get(room_code) is not None
+        assert f'belongs to node {owner}' in caplog.text
+        client.disconnect()
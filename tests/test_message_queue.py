@@ -0,0 +1,154 @@
+"""
+消息队列测试模块
+以共享同一个fakeredis服务器的两个SocketIO服务器模拟两个节点，测试跨节点广播、批量发布与顺序
+"""
+import logging
+import time
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+import socketio
+from socketio import packet
+
+from message_queue import BatchingRedisManager, create_client_manager
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+class Node:
+    """一个节点：以threading模式运行的SocketIO服务器，记录发给各连接的事件
+    
+    Flask-SocketIO的测试客户端不支持消息队列，这里直接在客户端管理器中登记连接，
+    替换服务器发送数据包的方法以记录每个连接收到的事件。
+    """
+    
+    def __init__(self, redis_server, window=0.0, write_only=False):
+        self.manager = BatchingRedisManager(
+            channel='test-socketio', window=window, write_only=write_only,
+            client_factory=lambda: fakeredis.FakeRedis(server=redis_server))
+        self.server = socketio.Server(async_mode='threading', client_manager=self.manager)
+        self.server._send_eio_packet = self._record
+        self.received = defaultdict(list)
+        self.manager.initialize()
+    
+    def _record(self, eio_sid, eio_pkt):
+        self.received[eio_sid].append(packet.Packet(encoded_packet=eio_pkt.data).data)
+    
+    def connect(self, room=None):
+        """登记一个连接（可同时加入房间），返回(sid, eio_sid)"""
+        eio_sid = uuid.uuid4().hex
+        sid = self.manager.connect(eio_sid, '/')
+        if room is not None:
+            self.manager.enter_room(sid, '/', room)
+        return sid, eio_sid
+    
+    def wait_received(self, eio_sid, count, timeout=2.0):
+        """等待连接收到count个事件（其他节点转发的消息由订阅线程异步送达）"""
+        deadline = time.monotonic() + timeout
+        while len(self.received[eio_sid]) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.received[eio_sid]
+    
+    def wait_flushed(self, timeout=2.0):
+        """等待本节点缓冲的消息全部发布完毕，返回发布统计
+        
+        对方收到消息时，发布任务可能还没来得及累加批次数，不能直接读取统计。
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stats = self.manager.stats()
+            if stats['pending'] == 0 and stats['batches'] + stats['failures'] > 0:
+                return stats
+            time.sleep(0.01)
+        return self.manager.stats()
+
+
+@pytest.fixture
+def nodes():
+    """共享同一个fakeredis服务器的两个节点，第二个节点的批量等待时间为50ms"""
+    redis_server = fakeredis.FakeServer()
+    nodes = Node(redis_server), Node(redis_server, window=0.05)
+    # 等待两个节点的订阅线程就绪
+    time.sleep(0.1)
+    return nodes
+
+
+class TestBatchingRedisManager:
+    """测试批量发布的客户端管理器"""
+    
+    def test_broadcast_reaches_other_node(self, nodes):
+        """测试房间广播到达连接在另一个节点上的客户端"""
+        node_a, node_b = nodes
+        _, alice = node_a.connect('R1')
+        _, bob = node_b.connect('R1')
+        node_a.server.emit('echo', 0, to='R1')
+        assert node_a.received[alice] == [['echo', 0]]
+        assert node_b.wait_received(bob, 1) == [['echo', 0]]
+        assert node_a.manager.stats()['published'] == 1
+    
+    def test_batched_in_order(self, nodes):
+        """测试窗口内的连续广播合并为一批，对方按发送顺序收到"""
+        node_a, node_b = nodes
+        _, alice = node_a.connect('R1')
+        node_b.connect('R1')
+        for i in range(50):
+            node_b.server.emit('echo', i, to='R1')
+        received = node_a.wait_received(alice, 50)
+        assert [data[1] for data in received] == list(range(50))
+        stats = node_b.wait_flushed()
+        assert stats['published'] == 50
+        # 批次数取决于发送时与窗口的相对时机，只要求确实发生了合并
+        assert 1 <= stats['batches'] < 50
+        assert stats['failures'] == 0
+    
+    def test_direct_emit_not_published(self, nodes):
+        """测试只发给本节点上某个连接的消息不经过消息队列"""
+        node_a, node_b = nodes
+        sid, alice = node_a.connect('R1')
+        _, bob = node_b.connect('R1')
+        node_a.server.emit('echo', 'direct', to=sid)
+        assert node_a.received[alice] == [['echo', 'direct']]
+        stats = node_a.manager.stats()
+        assert stats['published'] == 0 and stats['local'] == 1
+        time.sleep(0.1)
+        assert node_b.received[bob] == []
+    
+    def test_publish_failure(self, caplog):
+        """测试Redis不可用时重连重试一次后放弃，计入失败批次"""
+        redis_server = fakeredis.FakeServer()
+        node = Node(redis_server, write_only=True)
+        redis_server.connected = False
+        try:
+            with caplog.at_level(logging.ERROR):
+                node.server.emit('echo', 0, to='R1')
+                deadline = time.monotonic() + 2
+                while node.manager.stats()['failures'] == 0 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+        finally:
+            redis_server.connected = True
+        assert node.manager.stats()['failures'] == 1
+        assert 'giving up' in caplog.text
+
+
+class TestCreateClientManager:
+    """测试按配置创建客户端管理器"""
+    
+    def test_not_configured(self):
+        """测试未配置消息队列时只在本进程内广播"""
+        assert create_client_manager(SimpleNamespace(SOCKETIO_MESSAGE_QUEUE='')) is None
+    
+    def test_configured(self):
+        """测试按配置设置频道与批量等待时间"""
+        config = SimpleNamespace(SOCKETIO_MESSAGE_QUEUE='redis://localhost:6379/0',
+                                 SOCKETIO_CHANNEL='heartsync', SOCKETIO_PUBLISH_WINDOW=0.002)
+        manager = create_client_manager(config)
+        assert isinstance(manager, BatchingRedisManager)
+        assert manager.channel == 'heartsync'
+        assert manager.window == 0.002
+    
+    def test_unsupported_url(self):
+        """测试不支持的消息队列地址"""
+        with pytest.raises(ValueError):
+            create_client_manager(SimpleNamespace(SOCKETIO_MESSAGE_QUEUE='amqp://localhost'))
@@ -0,0 +1,199 @@
+"""
+指标测试模块
+测试SocketIO事件、HTTP请求、匹配次数与数据库查询的指标，以及多worker的指标合并
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from prometheus_client import CollectorRegistry, multiprocess
+
+from app import app, metrics, socketio
+from metrics import LATENCY_BUCKETS, EventTimer, Metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample(name, **labels):
+    metrics.flush()
+    return metrics.registry.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def socket_clients(make_user, login):
+    """创建两个已登录用户的SocketIO测试客户端"""
+    clients = []
+    for name in ('carol', 'dave'):
+        make_user(name)
+        clients.append(socketio.test_client(app, flask_test_client=login(name)))
+    
+    yield clients
+    
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
+
+
+class TestAppMetrics:
+    """测试应用指标"""
+    
+    def test_socketio_events_timed(self, socket_clients):
+        """测试事件处理耗时与匹配次数"""
+        carol, dave = socket_clients
+        joins = sample('heartsync_socketio_event_seconds_count', event='join_room')
+        submits = sample('heartsync_socketio_event_seconds_count', event='submit_command')
+        matches = sample('heartsync_matches_total')
+        failures = sample('heartsync_match_failures_total')
+        
+        carol.emit('join_room', {'room_code': 'METRIC'})
+        dave.emit('join_room', {'room_code': 'METRIC'})
+        carol.emit('submit_command', {'command': '我'})
+        dave.emit('submit_command', {'command': '你'})
+        carol.emit('submit_command', {'command': '我'})
+        dave.emit('submit_command', {'command': '他'})
+        carol.emit('leave_room', {})
+        
+        assert sample('heartsync_socketio_event_seconds_count', event='join_room') == joins + 2
+        assert sample('heartsync_socketio_event_seconds_count',
+                      event='submit_command') == submits + 4
+        assert sample('heartsync_socketio_event_seconds_count', event='leave_room') >= 1
+        assert sample('heartsync_matches_total') == matches + 1
+        assert sample('heartsync_match_failures_total') == failures + 1
+    
+    def test_http_and_db_timed(self, socket_clients):
+        """测试HTTP请求与数据库查询耗时"""
+        client = app.test_client()
+        requests = sample('heartsync_http_request_seconds_count', method='POST',
+                          endpoint='check_username')
+        queries = sample('heartsync_db_query_seconds_count', bind='primary', operation='SELECT')
+        
+        response = client.post('/api/check-username', json={'username': 'carol'})
+        assert response.status_code == 200
+        client.get('/no-such-page')
+        
+        assert sample('heartsync_http_request_seconds_count', method='POST',
+                      endpoint='check_username') == requests + 1
+        assert sample('heartsync_http_responses_total', method='GET', endpoint='unmatched',
+                      status='404') >= 1
+        assert sample('heartsync_db_query_seconds_count', bind='primary',
+                      operation='SELECT') > queries
+    
+    def test_metrics_endpoint(self, socket_clients):
+        """测试/metrics输出当前连接数"""
+        response = app.test_client().get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        body = response.get_data(as_text=True)
+        assert 'heartsync_connections 2.0' in body
+        assert 'heartsync_socketio_event_seconds_bucket' in body
+
+
+class TestEventTimer:
+    """测试事件耗时的本地累计"""
+    
+    def test_same_buckets_as_observe(self):
+        """测试合并后的结果与直接observe相同"""
+        from prometheus_client import Histogram
+        registry = CollectorRegistry()
+        histogram = Histogram('t', 't', ['kind'], buckets=LATENCY_BUCKETS, registry=registry)
+        timer = EventTimer(histogram.labels('local'))
+        for value in (0.0001, 0.0005, 0.003, 0.2, 5.0, 60.0):
+            timer.observe(value)
+            histogram.labels('direct').observe(value)
+        timer.flush()
+        timer.flush()
+        
+        def samples(kind):
+            return [(s.name, s.labels.get('le'), s.value) for metric in registry.collect()
+                    for s in metric.samples
+                    if s.labels.get('kind') == kind and not s.name.endswith('_created')]
+        assert samples('local') == samples('direct')
+    
+    def test_flushes_at_limit(self):
+        """测试累计达到上限时直接合并，不等待Metrics.flush"""
+        from prometheus_client import Histogram
+        registry = CollectorRegistry()
+        histogram = Histogram('t', 't', buckets=LATENCY_BUCKETS, registry=registry)
+        timer = EventTimer(histogram, max_pending=3)
+        for _ in range(7):
+            timer.observe(0.001)
+        assert len(timer.values) == 1
+        assert registry.get_sample_value('t_count') == 6
+
+
+class TestQueryTiming:
+    """测试数据库查询耗时"""
+    
+    def test_failed_query(self):
+        """测试执行失败的查询不留下开始时间，之后的查询正常计时"""
+        from sqlalchemy import create_engine, exc, text
+        engine = create_engine('sqlite://')
+        timed = Metrics()
+        timed.instrument_engines({None: engine})
+        with engine.connect() as conn:
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text('SELECT * FROM missing'))
+            conn.execute(text('SELECT 1'))
+            assert 'metrics_query_start' not in conn.info
+        assert timed.registry.get_sample_value('heartsync_db_query_seconds_count',
+                                               {'bind': 'primary', 'operation': 'SELECT'}) == 1
+
+
+class TestDisabled:
+    """测试关闭指标"""
+    
+    def test_noop(self):
+        """测试关闭时装饰器返回原函数"""
+        disabled = Metrics(enabled=False)
+        
+        def handler():
+            return 1
+        assert disabled.timed_event('x')(handler) is handler
+        disabled.record_match(True)
+        disabled.set_gauges(1, 1)
+
+
+WORKER = textwrap.dedent('''
+    import sys
+    sys.path.insert(0, {root!r})
+    from metrics import LATENCY_BUCKETS, EventTimer, Metrics
+    metrics = Metrics(shared_rooms=True)
+    metrics.record_match(True)
+    metrics.set_gauges(rooms=3, connections=int(sys.argv[1]))
+    metrics.timed_event('submit_command')(lambda: None)()
+    metrics.flush()
+''')
+
+
+class TestMultiprocess:
+    """测试多worker的指标合并"""
+    
+    def test_workers_aggregated(self, tmp_path):
+        """测试计数器与连接数在worker之间求和，共享房间数取最大值"""
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+        script = WORKER.format(root=ROOT)
+        for connections in (5, 7):
+            subprocess.run([sys.executable, '-c', script, str(connections)], env=env, check=True)
+        
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+        assert registry.get_sample_value('heartsync_matches_total') == 2
+        assert registry.get_sample_value('heartsync_socketio_event_seconds_count',
+                                         {'event': 'submit_command'}) == 2
+        assert registry.get_sample_value('heartsync_connections') == 12
+        assert registry.get_sample_value('heartsync_rooms') == 3
+    
+    def test_dead_worker_dropped(self, tmp_path):
+        """测试标记为已退出的worker不再计入连接数"""
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+        script = WORKER.format(root=ROOT) + 'print(__import__("os").getpid())\n'
+        result = subprocess.run([sys.executable, '-c', script, '5'], env=env, check=True,
+                                capture_output=True, text=True)
+        multiprocess.mark_process_dead(int(result.stdout), path=str(tmp_path))
+        
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+        assert registry.get_sample_value('heartsync_connections') is None
+        assert registry.get_sample_value('heartsync_matches_total') == 1
@@ -0,0 +1,216 @@
+"""
+配对指令测试模块
+测试配对索引的匹配与重新加载
+"""
+import json
+import os
+
+import pytest
+
+from pairs import PairCache, PairIndex, PairRegistry, couple_scope, room_scope
+
+PAIRS = [
+    {'pair': ['我', '你'], 'description': '我和你'},
+    {'pair': ['宝贝', '宝贝'], 'description': '宝贝'},
+]
+
+
+class TestPairIndex:
+    """测试配对索引"""
+    
+    def test_match_both_orders(self):
+        """测试两种顺序都能匹配"""
+        index = PairIndex(PAIRS)
+        assert index.match('我', '你') == (True, '我和你')
+        assert index.match('你', '我') == (True, '我和你')
+    
+    def test_same_word_pair(self):
+        """测试相同指令的配对"""
+        index = PairIndex(PAIRS)
+        assert index.match('宝贝', '宝贝') == (True, '宝贝')
+        assert index.match('宝贝', '你') == (False, None)
+        assert index.match('我', '我') == (False, None)
+    
+    def test_first_duplicate_wins(self):
+        """测试重复配对以先出现的为准"""
+        index = PairIndex(PAIRS + [{'pair': ['你', '我'], 'description': '重复'}])
+        assert index.match('我', '你') == (True, '我和你')
+        assert len(index) == 2
+    
+    def test_invalid_pair(self):
+        """测试无效配对"""
+        with pytest.raises(ValueError):
+            PairIndex([{'pair': ['我'], 'description': '缺少一半'}])
+
+
+class TestPairRegistry:
+    """测试配对注册表"""
+    
+    def test_reload(self):
+        """测试重新加载替换索引"""
+        registry = PairRegistry(PAIRS)
+        registry.reload([{'pair': ['心动', '信号'], 'description': '心动信号'}])
+        assert registry.match('信号', '心动') == (True, '心动信号')
+        assert registry.match('我', '你') == (False, None)
+    
+    def test_invalid_reload_keeps_index(self):
+        """测试无效配对不会替换当前索引"""
+        registry = PairRegistry(PAIRS)
+        with pytest.raises(ValueError):
+            registry.reload([{'pair': ['a', 'b', 'c'], 'description': 'x'}])
+        assert registry.match('我', '你') == (True, '我和你')
+    
+    def test_reload_if_changed(self, tmp_path):
+        """测试配对文件修改后重新加载"""
+        path = tmp_path / 'pairs.json'
+        path.write_text(json.dumps(PAIRS), encoding='utf-8')
+        registry = PairRegistry()
+        assert registry.load_file(str(path)) == 2
+        assert registry.reload_if_changed() is False
+        
+        path.write_text(json.dumps([{'pair': ['想', '你'], 'description': '想你'}]),
+                        encoding='utf-8')
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        
+        assert registry.reload_if_changed() is True
+        assert registry.match('想', '你') == (True, '想你')
+        assert registry.pairs == [{'pair': ['想', '你'], 'description': '想你'}]
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestPairCache:
+    """测试自定义配对缓存"""
+    
+    def make_cache(self, data, version, clock):
+        loads = []
+        
+        def loader(scope):
+            loads.append(scope)
+            return data.get(scope, [])
+        
+        cache = PairCache(loader, lambda: list(data), version_source=lambda: version[0],
+                          max_scopes=2, check_interval=1.0, clock=clock)
+        return cache, loads
+    
+    def test_read_through(self):
+        """测试首次读取加载，之后命中缓存"""
+        data = {room_scope('ROOM01'): PAIRS}
+        cache, loads = self.make_cache(data, [0], FakeClock())
+        
+        assert cache.index(room_scope('ROOM01')).match('你', '我') == (True, '我和你')
+        assert cache.index(room_scope('ROOM01')).match('我', '你') == (True, '我和你')
+        assert loads == [room_scope('ROOM01')]
+        assert cache.stats()['hits'] == 1
+    
+    def test_scope_without_pairs_skips_loader(self):
+        """测试没有自定义配对的作用域不查询数据库"""
+        cache, loads = self.make_cache({}, [0], FakeClock())
+        assert len(cache.index(room_scope('ROOM01'))) == 0
+        assert loads == []
+    
+    def test_version_change_invalidates(self):
+        """测试版本号变化后重新加载"""
+        data = {None: PAIRS}
+        version = [0]
+        clock = FakeClock()
+        cache, loads = self.make_cache(data, version, clock)
+        cache.index(None)
+        
+        data[None] = [{'pair': ['想', '你'], 'description': '想你'}]
+        version[0] = 1
+        # 检查间隔内仍使用旧缓存
+        assert cache.index(None).match('我', '你') == (True, '我和你')
+        clock.now += 1.5
+        assert cache.index(None).match('想', '你') == (True, '想你')
+        assert loads == [None, None]
+    
+    def test_bounded(self):
+        """测试缓存的作用域数量有上限"""
+        data = {room_scope(code): PAIRS for code in ('A', 'B', 'C')}
+        cache, _ = self.make_cache(data, [0], FakeClock())
+        for code in ('A', 'B', 'C'):
+            cache.index(room_scope(code))
+        assert cache.stats()['scopes'] == 2
+    
+    def test_couple_scope_order(self):
+        """测试两人作用域与顺序无关"""
+        assert couple_scope(7, 3) == couple_scope(3, 7) == 'couple:3-7'
+
+
+@pytest.fixture
+def pair_client(users, login):
+    """创建已登录的测试客户端"""
+    return login('alice')
+
+
+def take_seat(room_code, user_id, username):
+    """让用户占据房间中的一个座位"""
+    from app import room_store
+    room_store.assign_role(room_code, user_id, username)
+
+
+class TestCustomPairs:
+    """测试数据库自定义配对"""
+    
+    def test_room_pair(self, pair_client, users):
+        """测试添加房间自定义配对后立即生效"""
+        from app import app, check_match
+        take_seat('PAIR01', users['alice'], 'alice')
+        rv = pair_client.post('/api/pairs', json={
+            'room_code': 'PAIR01', 'first': '晚安', 'second': '好梦', 'description': '晚安好梦'
+        })
+        assert rv.status_code == 201
+        
+        with app.app_context():
+            assert check_match('好梦', '晚安', 'PAIR01') == (True, '晚安好梦')
+            assert check_match('好梦', '晚安', 'PAIR02') == (False, None)
+        
+        pairs = pair_client.get('/api/pairs?room_code=PAIR01').get_json()['pairs']
+        assert pairs[0]['pair'] == ['晚安', '好梦']
+    
+    def test_couple_pair(self, pair_client, users):
+        """测试两人之间的自定义配对"""
+        from app import app, check_match
+        rv = pair_client.post('/api/pairs', json={
+            'partner_username': 'bob', 'first': '早安', 'second': '早安'
+        })
+        assert rv.status_code == 201
+        
+        with app.app_context():
+            assert check_match('早安', '早安', 'ANY001', (users['bob'], users['alice'])) == (True, '早安早安')
+    
+    def test_delete_pair(self, pair_client, users):
+        """测试删除配对后缓存失效"""
+        from app import app, check_match
+        take_seat('PAIR03', users['alice'], 'alice')
+        pair_id = pair_client.post('/api/pairs', json={
+            'room_code': 'PAIR03', 'first': '晚安', 'second': '好梦'
+        }).get_json()['pair']['id']
+        with app.app_context():
+            assert check_match('晚安', '好梦', 'PAIR03')[0] is True
+        
+        assert pair_client.delete(f'/api/pairs/{pair_id}').status_code == 200
+        with app.app_context():
+            assert check_match('晚安', '好梦', 'PAIR03')[0] is False
+    
+    def test_room_pair_requires_seat(self, pair_client, users):
+        """测试不在房间中的用户不能为该房间添加配对"""
+        take_seat('PAIR04', users['bob'], 'bob')
+        for room_code in ('PAIR04', 'PAIR05'):
+            rv = pair_client.post('/api/pairs', json={'room_code': room_code, 'first': '晚安', 'second': '好梦'})
+            assert rv.status_code == 403
+    
+    def test_requires_scope(self, pair_client):
+        """测试必须指定房间或对方"""
+        rv = pair_client.post('/api/pairs', json={'first': '晚安', 'second': '好梦'})
+        assert rv.status_code == 400
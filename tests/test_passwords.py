@@ -0,0 +1,89 @@
+"""
+密码哈希测试模块
+测试线程池中的哈希校验、参数变化检测与登录时的哈希升级
+"""
+import threading
+
+import pytest
+
+from passwords import PasswordHasher, create_password_hasher
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+class TestPasswordHasher:
+    """测试密码哈希器"""
+    
+    @pytest.mark.parametrize('workers', [0, 2])
+    def test_hash_and_verify(self, workers):
+        """测试哈希与校验"""
+        hasher = PasswordHasher(FAST_METHOD, workers=workers)
+        password_hash = hasher.hash('Test123')
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert hasher.verify(password_hash, 'Test123')
+        assert not hasher.verify(password_hash, 'Wrong123')
+        hasher.shutdown()
+    
+    def test_runs_off_calling_thread(self):
+        """测试哈希计算在线程池中执行"""
+        hasher = PasswordHasher(FAST_METHOD, workers=1)
+        name = hasher._run(lambda: threading.current_thread().name)
+        assert name.startswith('password-hash')
+        hasher.shutdown()
+    
+    def test_eventlet_tpool(self):
+        """测试eventlet模式使用tpool"""
+        pytest.importorskip('eventlet')
+        hasher = PasswordHasher(FAST_METHOD, workers=1, async_mode='eventlet')
+        assert hasher.verify(hasher.hash('Test123'), 'Test123')
+    
+    def test_needs_rehash(self):
+        """测试算法或参数变化时需要重新哈希"""
+        old = PasswordHasher('pbkdf2:sha256:2000', workers=0).hash('Test123')
+        hasher = PasswordHasher(FAST_METHOD, workers=0)
+        assert hasher.needs_rehash(old)
+        assert not hasher.needs_rehash(hasher.hash('Test123'))
+    
+    def test_create_from_config(self):
+        """测试根据配置创建"""
+        class Config:
+            PASSWORD_HASH_METHOD = FAST_METHOD
+            PASSWORD_HASH_WORKERS = 3
+        hasher = create_password_hasher(Config)
+        assert hasher.method == FAST_METHOD
+        assert hasher.workers == 3
+
+
+class TestLoginRehash:
+    """测试登录时升级密码哈希"""
+    
+    @pytest.fixture
+    def client(self, make_user, app_db):
+        make_user('alice', password_hash=PasswordHasher('pbkdf2:sha256:2000', workers=0).hash('Test123'))
+        return app_db.test_client()
+    
+    def test_login_upgrades_hash(self, client):
+        """测试使用旧参数的哈希在登录成功后被升级"""
+        from app import app, password_hasher
+        from models import User
+        rv = client.post('/login', data={'username': 'alice', 'password': 'Test123'})
+        assert rv.status_code == 302
+        
+        with app.app_context():
+            user = User.query.filter_by(username='alice').first()
+            assert not password_hasher.needs_rehash(user.password_hash)
+            assert password_hasher.verify(user.password_hash, 'Test123')
+    
+    def test_current_hash_kept(self, client):
+        """测试哈希参数未变化时登录不重新哈希"""
+        from app import app, db, password_hasher
+        from models import User
+        with app.app_context():
+            user = User.query.filter_by(username='alice').first()
+            user.password_hash = password_hasher.hash('Test123')
+            db.session.commit()
+            current = user.password_hash
+        
+        client.post('/login', data={'username': 'alice', 'password': 'Test123'})
+        with app.app_context():
+            assert User.query.filter_by(username='alice').first().password_hash == current
@@ -0,0 +1,204 @@
+"""
+性能剖析测试模块
+测试Server-Timing头的耗时拆分、慢事件日志与调用栈采样
+"""
+import logging
+import threading
+import time
+
+import pytest
+from flask import Flask, render_template_string
+from flask_sqlalchemy import SQLAlchemy
+
+import app as app_module
+from passwords import PasswordHasher
+from profiling import ServerTiming, StackSampler, fold
+
+
+def make_app(enabled=True):
+    """带有数据库查询、密码校验和模板渲染的最小应用"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db = SQLAlchemy()
+    db.init_app(app)
+    timing = ServerTiming(enabled=enabled)
+    timing.init_app(app)
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=0)
+    password_hash = hasher.hash('Test123')
+    timing.instrument(hasher, 'hash', ('hash', 'verify'))
+    with app.app_context():
+        timing.instrument_engines(db.engines)
+    
+    @app.route('/')
+    def index():
+        db.session.execute(db.text('SELECT 1'))
+        hasher.verify(password_hash, 'Test123')
+        return render_template_string('{{ value }}', value='ok')
+    
+    return app, timing, hasher
+
+
+def parse(header):
+    """将Server-Timing头解析为{名称: 毫秒}"""
+    result = {}
+    for part in header.split(', '):
+        name, duration = part.split(';')[:2]
+        result[name] = float(duration.split('=')[1])
+    return result
+
+
+class TestServerTiming:
+    """测试Server-Timing头"""
+    
+    def test_header_split(self):
+        """测试响应头包含db、hash、render与总耗时"""
+        app, timing, hasher = make_app()
+        response = app.test_client().get('/')
+        header = response.headers['Server-Timing']
+        assert 'db;dur=' in header and 'desc="1 queries"' in header
+        durations = parse(header)
+        assert set(durations) == {'db', 'hash', 'render', 'total'}
+        assert durations['hash'] > 0
+        assert durations['total'] >= durations['db'] + durations['hash'] + durations['render'] - 0.2
+    
+    def test_failed_query(self):
+        """测试执行失败的查询不计入，也不影响之后查询的计时"""
+        app, timing, hasher = make_app()
+        db = app.extensions['sqlalchemy']
+        
+        @app.route('/failed')
+        def failed():
+            try:
+                db.session.execute(db.text('SELECT * FROM missing'))
+            except db.exc.OperationalError:
+                db.session.rollback()
+            db.session.execute(db.text('SELECT 1'))
+            assert 'server_timing_start' not in db.session.connection().info
+            return 'ok'
+        
+        response = app.test_client().get('/failed')
+        assert response.status_code == 200
+        assert 'desc="1 queries"' in response.headers['Server-Timing']
+    
+    def test_disabled(self):
+        """测试未开启时不添加响应头、不替换方法"""
+        app, timing, hasher = make_app(enabled=False)
+        response = app.test_client().get('/')
+        assert response.data == b'ok'
+        assert 'Server-Timing' not in response.headers
+        assert 'verify' not in vars(hasher)
+        
+        def handler():
+            return None
+        assert timing.timed_event('submit_command')(handler) is handler
+    
+    def test_outside_request_ignored(self):
+        """测试不在统计中的上下文里调用不报错"""
+        app, timing, hasher = make_app()
+        assert hasher.verify(hasher.hash('x'), 'x')
+        with app.app_context():
+            assert hasher.verify(hasher.hash('x'), 'x')
+    
+    def test_slow_event_logged(self, caplog):
+        """测试超过阈值的SocketIO事件记录耗时拆分"""
+        app = Flask(__name__)
+        logger = logging.getLogger('test_profiling')
+        timing = ServerTiming(enabled=True, slow_event=0.01, logger=logger)
+        
+        @timing.timed_event('join_room')
+        def slow():
+            timing.add('db', 0.005)
+            time.sleep(0.02)
+        
+        @timing.timed_event('leave_room')
+        def fast():
+            pass
+        
+        with caplog.at_level(logging.WARNING, logger='test_profiling'):
+            with app.test_request_context():
+                slow()
+                fast()
+        assert len(caplog.records) == 1
+        message = caplog.records[0].getMessage()
+        assert message.startswith('Slow event join_room: db;dur=5.0')
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestStackSampler:
+    """测试调用栈采样"""
+    
+    def test_sample_busy_thread(self):
+        """测试采样结果包含正在运行的函数"""
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stop,))
+        thread.start()
+        try:
+            counts = StackSampler('.', interval=0.001).sample(0.2)
+        finally:
+            stop.set()
+            thread.join()
+        busy = sum(count for stack, count in counts.items() if 'busy_loop (' in stack)
+        assert busy > 10
+        assert not any('sample (profiling.py' in stack for stack in counts)
+    
+    def test_fold_order(self):
+        """测试栈从最外层到最内层排列"""
+        def inner():
+            import sys
+            return fold(sys._getframe())
+        stack = inner().split(';')
+        assert stack[-1].startswith('inner (test_profiling.py')
+        assert stack[-2].startswith('test_fold_order (test_profiling.py')
+    
+    def test_start_writes_file(self, tmp_path):
+        """测试后台采样写入folded文件，同时只运行一次"""
+        sampler = StackSampler(tmp_path / 'profiles', interval=0.001, max_seconds=0.2)
+        path = sampler.start(10)
+        assert sampler.start(1) is None
+        while sampler.running:
+            time.sleep(0.01)
+        lines = open(path, encoding='utf-8').read().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(' ', 1)
+        assert int(count) > 0 and ';' in stack
+
+
+class TestProfileEndpoint:
+    """测试采样接口"""
+    
+    @pytest.fixture
+    def client(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(app_module.config, 'PROFILING_TOKEN', 'secret')
+        monkeypatch.setattr(app_module.stack_sampler, 'output_dir', str(tmp_path))
+        return app_module.app.test_client()
+    
+    def test_disabled_without_token(self, monkeypatch):
+        """测试未配置令牌时接口不可用"""
+        monkeypatch.setattr(app_module.config, 'PROFILING_TOKEN', '')
+        response = app_module.app.test_client().post('/admin/profile')
+        assert response.status_code == 404
+    
+    def test_wrong_token(self, client):
+        """测试令牌错误时拒绝"""
+        response = client.post('/admin/profile', headers={'X-Profile-Token': 'wrong'})
+        assert response.status_code == 403
+    
+    def test_non_ascii_token(self, client):
+        """测试令牌含非ASCII字符时拒绝而不是报错"""
+        response = client.post('/admin/profile', headers={'X-Profile-Token': 'sécret'})
+        assert response.status_code == 403
+    
+    def test_start_profile(self, client, tmp_path):
+        """测试采样写入当前worker的结果文件"""
+        response = client.post('/admin/profile?seconds=0.1',
+                               headers={'X-Profile-Token': 'secret'})
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data['file'].startswith(str(tmp_path))
+        while app_module.stack_sampler.running:
+            time.sleep(0.01)
+        assert open(data['file'], encoding='utf-8').read()
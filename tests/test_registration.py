@@ -0,0 +1,107 @@
+"""
+注册测试模块
+测试依赖唯一索引的乐观插入与重复字段识别
+"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app import app, create_user, db, duplicate_user_field
+from models import User
+
+
+@pytest.fixture
+def app_context(app_db):
+    with app_db.app_context():
+        yield
+
+
+@pytest.fixture
+def statements():
+    """记录执行的SQL语句"""
+    executed = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+class TestCreateUser:
+    """测试创建用户"""
+    
+    def test_single_round_trip(self, app_context, statements):
+        """测试注册只执行一条INSERT，不预先查询"""
+        user, error = create_user('alice', 'alice@example.com', 'Test123')
+        issued = list(statements)
+        assert error is None
+        assert len(issued) == 1
+        assert issued[0].lstrip().upper().startswith('INSERT')
+    
+    def test_duplicate_username(self, app_context):
+        """测试用户名重复"""
+        create_user('alice', 'alice@example.com', 'Test123')
+        user, error = create_user('alice', 'other@example.com', 'Test123')
+        assert user is None
+        assert error == '用户名已被使用'
+        assert User.query.count() == 1
+    
+    def test_duplicate_email(self, app_context):
+        """测试邮箱重复"""
+        create_user('alice', 'alice@example.com', 'Test123')
+        user, error = create_user('bob', 'alice@example.com', 'Test123')
+        assert user is None
+        assert error == '邮箱已被注册'
+    
+    def test_session_usable_after_conflict(self, app_context):
+        """测试冲突回滚后会话仍可使用"""
+        create_user('alice', 'alice@example.com', 'Test123')
+        create_user('alice', 'alice@example.com', 'Test123')
+        user, error = create_user('bob', 'bob@example.com', 'Test123')
+        assert error is None
+        assert User.query.count() == 2
+
+
+class TestDuplicateUserField:
+    """测试从各数据库的错误信息中识别重复字段"""
+    
+    @pytest.mark.parametrize('message, field', [
+        ('UNIQUE constraint failed: users.username', 'username'),
+        ('UNIQUE constraint failed: users.email', 'email'),
+        ('duplicate key value violates unique constraint "ix_users_email"', 'email'),
+        ("Duplicate entry 'alice' for key 'ix_users_username'", 'username'),
+        ('NOT NULL constraint failed: users.password_hash', None),
+        # 冲突的值中含有另一个字段名时仍按约束名识别
+        ('duplicate key value violates unique constraint "ix_users_email"\n'
+         'DETAIL:  Key (email)=(username@x.com) already exists.', 'email'),
+        ('duplicate key value violates unique constraint "users_username_key"\n'
+         'DETAIL:  Key (username)=(email_fan) already exists.', 'username'),
+        ('(1062, "Duplicate entry \'username@x.com\' for key \'users.ix_users_email\'")', 'email'),
+    ])
+    def test_field(self, message, field):
+        assert duplicate_user_field(Exception(message)) == field
+    
+    def test_postgresql_constraint_name(self):
+        """测试优先使用psycopg2给出的约束名"""
+        error = Exception('duplicate key value violates unique constraint ...')
+        error.diag = SimpleNamespace(constraint_name='ix_users_username')
+        assert duplicate_user_field(SimpleNamespace(orig=error)) == 'username'
+
+
+class TestRegisterRoute:
+    """测试注册接口"""
+    
+    def test_register_redirects_to_login(self, app_context):
+        """测试注册成功后跳转登录页"""
+        rv = app.test_client().post('/register', data={
+            'username': 'carol', 'email': 'carol@example.com',
+            'password': 'Test123', 'confirm_password': 'Test123'
+        })
+        assert rv.status_code == 302
+        assert '/login' in rv.headers['Location']
+        assert User.query.filter_by(username='carol').count() == 1
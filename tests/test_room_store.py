@@ -0,0 +1,419 @@
+"""
+房间状态存储测试模块
+同一组用例同时覆盖内存后端与Redis后端（使用fakeredis）
+"""
+import logging
+import threading
+
+import pytest
+
+from room_store import (MemoryRoomStore, RedisRoomStore, Room, ShardedRoomStore,
+                        create_room_store, run_sweeper)
+
+
+@pytest.fixture(params=['memory', 'sharded', 'redis'])
+def store(request):
+    """创建房间存储"""
+    if request.param == 'memory':
+        return MemoryRoomStore()
+    if request.param == 'sharded':
+        return ShardedRoomStore(shards=4)
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    return RedisRoomStore(fakeredis.FakeRedis(), prefix='test:')
+
+
+def seat_pair(store, room_code='ROOM01'):
+    """让用户1和用户2分别占据房间的两个座位"""
+    store.assign_role(room_code, 1, 'alice')
+    store.assign_role(room_code, 2, 'bob')
+
+class TestRoomStore:
+    """测试房间存储的公共行为"""
+    
+    def test_get_or_create(self, store):
+        """测试获取或创建房间"""
+        assert store.get('ROOM01') is None
+        room = store.get_or_create('ROOM01')
+        assert room.user1 is None
+        assert room.status == 'waiting'
+        assert store.get('ROOM01') is not None
+    
+    def test_assign_roles(self, store):
+        """测试角色分配"""
+        role1, _ = store.assign_role('ROOM01', 1, 'alice')
+        role2, room = store.assign_role('ROOM01', 2, 'bob')
+        assert (role1, role2) == ('user1', 'user2')
+        assert room.user1 == 1
+        assert room.user2_username == 'bob'
+    
+    def test_rejoin_keeps_role(self, store):
+        """测试重复加入保持原角色"""
+        store.assign_role('ROOM01', 1, 'alice')
+        store.assign_role('ROOM01', 2, 'bob')
+        role, _ = store.assign_role('ROOM01', 2, 'bob')
+        assert role == 'user2'
+    
+    def test_room_full(self, store):
+        """测试房间已满"""
+        store.assign_role('ROOM01', 1, 'alice')
+        store.assign_role('ROOM01', 2, 'bob')
+        role, room = store.assign_role('ROOM01', 3, 'carol')
+        assert role is None
+        assert room.user1 == 1 and room.user2 == 2
+    
+    def test_set_command(self, store):
+        """测试更新指令"""
+        store.assign_role('ROOM01', 1, 'alice')
+        room = store.set_command('ROOM01', 'user1', '我', 1)
+        assert room.user1_command == '我'
+        assert room.user2_command == ''
+    
+    def test_set_command_requires_seat(self, store):
+        """测试座位不属于提交者时不更新，且不创建房间"""
+        assert store.set_command('GHOST1', 'user1', '我', 1) is None
+        assert store.get('GHOST1') is None
+        store.assign_role('ROOM01', 1, 'alice')
+        store.release('ROOM01', 1)
+        store.assign_role('ROOM01', 3, 'carol')
+        assert store.set_command('ROOM01', 'user1', '我', 1) is None
+        assert store.set_command('ROOM01', 'user2', '我', 3) is None
+        room = store.get('ROOM01')
+        assert room.user1 == 3 and room.user1_command == ''
+    
+    def test_mark_matched(self, store):
+        """测试匹配成功后清空指令"""
+        seat_pair(store)
+        store.set_command('ROOM01', 'user1', '我', 1)
+        store.set_command('ROOM01', 'user2', '你', 2)
+        assert store.mark_matched('ROOM01', '我', '你') is not None
+        room = store.get('ROOM01')
+        assert room.status == 'matched'
+        assert room.user1_command == room.user2_command == ''
+    
+    def test_mark_matched_stale(self, store):
+        """测试指令已变化时不清空"""
+        seat_pair(store)
+        store.set_command('ROOM01', 'user1', '我', 1)
+        store.set_command('ROOM01', 'user2', '他', 2)
+        assert store.mark_matched('ROOM01', '我', '你') is None
+        assert store.get('ROOM01').user2_command == '他'
+    
+    def test_release(self, store):
+        """测试释放用户位置"""
+        store.assign_role('ROOM01', 1, 'alice')
+        store.assign_role('ROOM01', 2, 'bob')
+        store.set_command('ROOM01', 'user1', '我', 1)
+        assert store.release('ROOM01', 1) == 'user1'
+        room = store.get('ROOM01')
+        assert room.user1 is None
+        assert room.user1_command == ''
+        assert store.release('ROOM01', 1) is None
+    
+    def test_concurrent_assign(self, store):
+        """测试并发加入不会重复分配角色"""
+        roles = []
+        barrier = threading.Barrier(8)
+        
+        def join(user_id):
+            barrier.wait()
+            role, _ = store.assign_role('ROOM01', user_id, f'user{user_id}')
+            roles.append(role)
+        
+        threads = [threading.Thread(target=join, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert sorted(r for r in roles if r) == ['user1', 'user2']
+
+
+class TestRoom:
+    """测试房间对象"""
+    
+    def test_slots(self):
+        """测试房间对象没有实例字典"""
+        assert not hasattr(Room(), '__dict__')
+    
+    def test_assign_and_release(self):
+        """测试角色分配与释放"""
+        room = Room()
+        assert room.assign_role(1, 'alice') == 'user1'
+        assert room.assign_role(2, 'bob') == 'user2'
+        assert room.assign_role(3, 'carol') is None
+        assert room.release(1) == 'user1'
+        assert room.user1_username is None
+        assert not room.is_empty
+    
+    def test_snapshot(self):
+        """测试房间快照"""
+        room = Room()
+        room.assign_role(1, 'alice')
+        room.set_command('user1', '我')
+        assert room.snapshot() == {
+            'user1_username': 'alice',
+            'user2_username': None,
+            'user1_command': '我',
+            'user2_command': '',
+            'status': 'waiting',
+            'seq': 2
+        }
+    
+    def test_copy_is_independent(self):
+        """测试副本与原对象互不影响"""
+        room = Room()
+        clone = room.copy()
+        clone.set_command('user2', '你')
+        assert room.user2_command == ''
+
+
+class TestCreateRoomStore:
+    """测试存储工厂"""
+    
+    def test_memory_backend(self):
+        """测试默认内存后端"""
+        class Cfg:
+            ROOM_STORE_BACKEND = 'memory'
+        assert isinstance(create_room_store(Cfg), MemoryRoomStore)
+    
+    def test_sharded_backend(self):
+        """测试配置分片数时使用分片存储"""
+        class Cfg:
+            ROOM_STORE_BACKEND = 'memory'
+            ROOM_STORE_SHARDS = 8
+        store = create_room_store(Cfg)
+        assert isinstance(store, ShardedRoomStore)
+        assert len(store.shards) == 8
+    
+    def test_unknown_backend(self):
+        """测试未知后端"""
+        class Cfg:
+            ROOM_STORE_BACKEND = 'nope'
+        with pytest.raises(ValueError):
+            create_room_store(Cfg)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=['memory', 'sharded', 'redis'])
+def clocked_store(request):
+    """创建带空闲TTL与容量上限的房间存储"""
+    clock = FakeClock()
+    if request.param == 'memory':
+        store = MemoryRoomStore(idle_ttl=60, max_rooms=3, clock=clock)
+    elif request.param == 'sharded':
+        # 单分片时容量上限与不分片一致，便于复用同一组断言
+        store = ShardedRoomStore(shards=1, idle_ttl=60, max_rooms=3, clock=clock)
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        store = RedisRoomStore(fakeredis.FakeRedis(), prefix='test:',
+                               idle_ttl=60, max_rooms=3, clock=clock)
+    return store, clock
+
+
+@pytest.fixture(params=['memory', 'sharded'])
+def local_store(request):
+    """创建带空闲TTL与容量上限的进程内房间存储"""
+    clock = FakeClock()
+    if request.param == 'memory':
+        store = MemoryRoomStore(idle_ttl=60, max_rooms=3, clock=clock)
+    else:
+        store = ShardedRoomStore(shards=1, idle_ttl=60, max_rooms=3, clock=clock)
+    return store, clock
+
+
+class TestRoomLifecycle:
+    """测试房间生命周期管理"""
+    
+    def test_idle_rooms_expire(self, clocked_store):
+        """测试空闲房间过期清理"""
+        store, clock = clocked_store
+        store.get_or_create('OLD001')
+        clock.now += 50
+        store.get_or_create('NEW001')
+        clock.now += 20
+        
+        assert store.sweep() == 1
+        assert store.get('OLD001') is None
+        assert store.get('NEW001') is not None
+    
+    def test_activity_keeps_room_alive(self, clocked_store):
+        """测试活跃房间不会被清理"""
+        store, clock = clocked_store
+        store.assign_role('ROOM01', 1, 'alice')
+        clock.now += 50
+        store.set_command('ROOM01', 'user1', '我', 1)
+        clock.now += 50
+        
+        assert store.sweep() == 0
+        assert store.get('ROOM01').user1_command == '我'
+    
+    def test_lru_cap(self, clocked_store):
+        """测试超过容量上限时淘汰最久未活跃的房间"""
+        store, clock = clocked_store
+        for code in ('ROOM01', 'ROOM02', 'ROOM03'):
+            store.get_or_create(code)
+            clock.now += 1
+        store.get_or_create('ROOM01')
+        store.get_or_create('ROOM04')
+        store.sweep()
+        
+        assert store.get('ROOM02') is None
+        assert store.get('ROOM01') is not None
+        assert store.stats()['rooms'] == 3
+        assert store.stats()['evicted'] == 1
+    
+    def test_occupied_room_not_expired(self, local_store):
+        """测试还有人在座的房间空闲超时后不被清理"""
+        store, clock = local_store
+        store.assign_role('ROOM01', 1, 'alice')
+        store.get_or_create('ROOM02')
+        clock.now += 100
+        
+        assert store.sweep() == 1
+        assert store.get('ROOM01').user1 == 1
+        assert store.get('ROOM02') is None
+        # 跳过的房间移到尾部，下一轮按新的活跃时间计算
+        assert store.sweep() == 0
+    
+    def test_occupied_room_not_evicted(self, local_store):
+        """测试超过容量上限时跳过有人在座的房间，只淘汰空房间"""
+        store, clock = local_store
+        store.assign_role('ROOM01', 1, 'alice')
+        clock.now += 1
+        store.get_or_create('ROOM02')
+        clock.now += 1
+        store.get_or_create('ROOM03')
+        store.get_or_create('ROOM04')
+        
+        assert store.get('ROOM01').user1 == 1
+        assert store.get('ROOM02') is None
+        assert store.stats()['rooms'] == 3
+        assert store.stats()['evicted'] == 1
+    
+    def test_all_rooms_occupied(self, local_store):
+        """测试所有房间都有人在座时允许暂时超过容量上限，新房间不被淘汰"""
+        store, _ = local_store
+        for user_id, code in enumerate(('ROOM01', 'ROOM02', 'ROOM03', 'ROOM04'), 1):
+            store.assign_role(code, user_id, 'user')
+        
+        assert store.stats()['rooms'] == 4
+        assert store.stats()['evicted'] == 0
+        assert store.get('ROOM04').user1 == 4
+    
+    def test_empty_room_removed_on_release(self, clocked_store):
+        """测试两人都离开后房间被删除"""
+        store, _ = clocked_store
+        store.assign_role('ROOM01', 1, 'alice')
+        store.assign_role('ROOM01', 2, 'bob')
+        store.release('ROOM01', 1)
+        assert store.get('ROOM01') is not None
+        store.release('ROOM01', 2)
+        assert store.get('ROOM01') is None
+    
+    def test_stats(self, clocked_store):
+        """测试房间计数"""
+        store, clock = clocked_store
+        store.get_or_create('ROOM01')
+        store.get_or_create('ROOM02')
+        clock.now += 100
+        store.sweep()
+        
+        stats = store.stats()
+        assert stats['created'] == 2
+        assert stats['expired'] == 2
+        assert stats['rooms'] == 0
+
+
+class TestRunSweeper:
+    """测试后台清理循环"""
+    
+    def test_sweeps_every_interval(self, caplog):
+        """测试按间隔调用清理，清理异常被记录且不会中断循环"""
+        calls = []
+        
+        class Store:
+            def sweep(self):
+                calls.append(1)
+                raise RuntimeError('redis down')
+        
+        def sleep(seconds):
+            assert seconds == 5
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+        
+        logger = logging.getLogger('test_room_store')
+        with caplog.at_level(logging.ERROR, logger='test_room_store'):
+            with pytest.raises(KeyboardInterrupt):
+                run_sweeper(Store(), 5, sleep=sleep, logger=logger)
+        assert len(calls) == 3
+        assert len(caplog.records) == 3 and 'redis down' in caplog.records[0].getMessage()
+
+
+class TestRoomSeq:
+    """测试房间状态序号"""
+    
+    def test_seq_increments(self, store):
+        """测试每次可见修改序号加一"""
+        assert store.get_or_create('ROOM01').seq == 0
+        _, room = store.assign_role('ROOM01', 1, 'alice')
+        assert room.seq == 1
+        store.assign_role('ROOM01', 2, 'bob')
+        assert store.set_command('ROOM01', 'user1', '我', 1).seq == 3
+        store.set_command('ROOM01', 'user2', '你', 2)
+        assert store.mark_matched('ROOM01', '我', '你').seq == 5
+        store.release('ROOM01', 2)
+        assert store.get('ROOM01').seq == 6
+    
+    def test_failed_compare_keeps_seq(self, store):
+        """测试未生效的操作不改变序号"""
+        store.assign_role('ROOM01', 1, 'alice')
+        store.set_command('ROOM01', 'user1', '我', 1)
+        store.set_command('ROOM01', 'user2', '你', 2)
+        store.mark_matched('ROOM01', '我', '你')
+        store.release('ROOM01', 99)
+        assert store.get('ROOM01').seq == 2
+
+
+class TestShardedStress:
+    """分片存储的并发压力测试"""
+    
+    @pytest.mark.parametrize('shards', [1, 16])
+    def test_concurrent_joins_never_double_assign(self, shards):
+        """测试大量并发加入时每个房间恰好分配两个角色"""
+        store = ShardedRoomStore(shards=shards)
+        rooms = [f'R{i:05d}' for i in range(50)]
+        results = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(16)
+        
+        def worker(worker_id):
+            barrier.wait()
+            for code in rooms:
+                # 每个线程用两个不同的用户争抢同一房间
+                for user_id in (worker_id * 2, worker_id * 2 + 1):
+                    role, _ = store.assign_role(code, user_id, f'u{user_id}')
+                    with lock:
+                        results.append((code, role, user_id))
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        for code in rooms:
+            winners = [(role, uid) for c, role, uid in results if c == code and role]
+            assert sorted(role for role, _ in winners) == ['user1', 'user2']
+            room = store.get(code)
+            assert {room.user1, room.user2} == {uid for _, uid in winners}
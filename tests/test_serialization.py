@@ -0,0 +1,119 @@
+"""
+消息编码测试模块
+测试JSON与MessagePack客户端在同一服务器上并存：解码、连接确认与按编码分组的广播
+"""
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+import socketio
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from socketio import packet
+
+from message_queue import create_client_manager
+from serialization import NegotiatedPacket, NegotiatingManager, create_serializer
+
+msgpack_packet = pytest.importorskip('socketio.msgpack_packet')
+MsgPackPacket = msgpack_packet.MsgPackPacket
+
+EVENT = {'seq': 3, 'user_role': 'user1', 'command': '心动'}
+
+
+class Server:
+    """开启编码协商的SocketIO服务器，记录发给每个连接的原始消息"""
+    
+    def __init__(self):
+        self.server = socketio.Server(async_mode='threading', async_handlers=False,
+                                      client_manager=NegotiatingManager(), serializer=NegotiatedPacket)
+        self.sent = defaultdict(list)
+        self.server.eio.send = lambda eio_sid, data: self.sent[eio_sid].append(data)
+        self.server._send_eio_packet = lambda eio_sid, pkt: self.sent[eio_sid].append(pkt.data)
+        self.events = []
+        
+        @self.server.on('join')
+        def on_join(sid, room):
+            self.server.enter_room(sid, room)
+        
+        @self.server.on('echo')
+        def on_echo(sid, data):
+            self.events.append(data)
+    
+    def connect(self, eio_sid, msgpack):
+        """以指定编码建立连接并加入房间R1"""
+        self.server._handle_eio_connect(eio_sid, {'QUERY_STRING': 'serializer=msgpack' if msgpack else ''})
+        self.send(eio_sid, msgpack, packet.CONNECT)
+        self.send(eio_sid, msgpack, packet.EVENT, ['join', 'R1'])
+    
+    def send(self, eio_sid, msgpack, packet_type, data=None):
+        """模拟客户端发送一个数据包"""
+        packet_class = MsgPackPacket if msgpack else packet.Packet
+        self.server._handle_eio_message(eio_sid, packet_class(packet_type, data, namespace='/').encode())
+
+
+class TestNegotiation:
+    """测试按连接选择编码"""
+    
+    def test_connect_ack_matches_client(self):
+        """测试连接确认以客户端选择的编码发送"""
+        server = Server()
+        server.connect('json', msgpack=False)
+        server.connect('binary', msgpack=True)
+        json_ack, binary_ack = server.sent['json'][0], server.sent['binary'][0]
+        assert isinstance(json_ack, str) and json_ack.startswith('0{"sid"')
+        decoded = MsgPackPacket(encoded_packet=binary_ack)
+        assert decoded.packet_type == packet.CONNECT and 'sid' in decoded.data
+    
+    def test_broadcast_encoded_once_per_serializer(self):
+        """测试广播时每种编码只编码一次，两种客户端收到相同内容"""
+        server = Server()
+        server.connect('json', msgpack=False)
+        server.connect('binary1', msgpack=True)
+        server.connect('binary2', msgpack=True)
+        for messages in server.sent.values():
+            messages.clear()
+        server.server.emit('command_updated', EVENT, to='R1')
+        json_message = server.sent['json'][0]
+        assert packet.Packet(encoded_packet=json_message).data == ['command_updated', EVENT]
+        binary1, binary2 = server.sent['binary1'][0], server.sent['binary2'][0]
+        assert binary1 is binary2
+        assert MsgPackPacket(encoded_packet=binary1).data == ['command_updated', EVENT]
+        assert len(binary1) < len(json_message.encode('utf-8'))
+    
+    def test_decode_both(self):
+        """测试两种客户端发送的事件都能被处理"""
+        server = Server()
+        server.connect('json', msgpack=False)
+        server.connect('binary', msgpack=True)
+        server.send('json', False, packet.EVENT, ['echo', EVENT])
+        server.send('binary', True, packet.EVENT, ['echo', EVENT])
+        assert server.events == [EVENT, EVENT]
+    
+    def test_flask_test_client_unaffected(self):
+        """测试开启协商后JSON客户端（Flask-SocketIO测试客户端）行为不变"""
+        app = Flask(__name__)
+        socketio_app = SocketIO(app, async_mode='threading', client_manager=NegotiatingManager(),
+                                serializer=NegotiatedPacket)
+        
+        @socketio_app.on('join')
+        def on_join(room):
+            join_room(room)
+            socketio_app.emit('command_updated', EVENT, to=room)
+        
+        client = socketio_app.test_client(app)
+        client.emit('join', 'R1')
+        assert client.get_received() == [{'name': 'command_updated', 'args': [EVENT], 'namespace': '/'}]
+        client.disconnect()
+
+
+class TestCreateSerializer:
+    """测试按配置选择编码"""
+    
+    def test_disabled(self):
+        assert create_serializer(SimpleNamespace()) == 'default'
+        assert create_client_manager(SimpleNamespace(SOCKETIO_MSGPACK=False)) is None
+    
+    def test_enabled(self):
+        config = SimpleNamespace(SOCKETIO_MSGPACK=True)
+        assert create_serializer(config) is NegotiatedPacket
+        assert isinstance(create_client_manager(config), NegotiatingManager)
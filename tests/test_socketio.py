@@ -0,0 +1,244 @@
+"""
+SocketIO事件测试模块
+测试房间加入、指令提交和匹配流程
+"""
+import pytest
+from app import app, match_queue, socketio
+from models import Match, User
+
+
+@pytest.fixture
+def socket_clients(users, login):
+    """创建两个已登录用户的SocketIO测试客户端"""
+    clients = [socketio.test_client(app, flask_test_client=login(name)) for name in ('alice', 'bob')]
+    
+    yield clients
+    
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
+
+
+def events(client, name):
+    """取出指定名称的事件参数"""
+    return [e['args'][0] for e in client.get_received() if e['name'] == name]
+
+
+class TestRoomFlow:
+    """测试房间流程"""
+    
+    def test_join_assigns_roles(self, socket_clients):
+        """测试两个用户加入同一房间获得不同角色"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'FLOW01'})
+        bob.emit('join_room', {'room_code': 'FLOW01'})
+        
+        assert events(alice, 'room_info')[0]['user_role'] == 'user1'
+        info = events(bob, 'room_info')[0]
+        assert info['user_role'] == 'user2'
+        assert info['user1_username'] == 'alice'
+    
+    def test_match_success(self, socket_clients):
+        """测试指令匹配成功"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'FLOW02'})
+        bob.emit('join_room', {'room_code': 'FLOW02'})
+        alice.get_received()
+        
+        alice.emit('submit_command', {'room_code': 'FLOW02', 'command': '我', 'user_role': 'user1'})
+        bob.emit('submit_command', {'room_code': 'FLOW02', 'command': '你', 'user_role': 'user2'})
+        
+        matches = events(alice, 'match_success')
+        assert len(matches) == 1
+        assert matches[0]['description'] == '我和你'
+        assert matches[0]['command_pair'] == ['我', '你']
+    
+    def test_match_recorded(self, socket_clients):
+        """测试配对成功记录先进入写回队列，写入后数据库中可见"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'FLOW04'})
+        bob.emit('join_room', {'room_code': 'FLOW04'})
+        
+        alice.emit('submit_command', {'room_code': 'FLOW04', 'command': '我', 'user_role': 'user1'})
+        bob.emit('submit_command', {'room_code': 'FLOW04', 'command': '你', 'user_role': 'user2'})
+        assert len(events(alice, 'match_success')) == 1
+        with app.app_context():
+            assert Match.query.filter_by(room_code='FLOW04').count() == 0
+        
+        match_queue.flush()
+        with app.app_context():
+            match = Match.query.filter_by(room_code='FLOW04').one()
+            alice_id = User.query.filter_by(username='alice').one().id
+            bob_id = User.query.filter_by(username='bob').one().id
+            assert (match.user1_id, match.user2_id) == (alice_id, bob_id)
+            assert match.to_dict()['command_pair'] == ['我', '你']
+            assert match.description == '我和你'
+    
+    def test_stale_command_not_applied(self, socket_clients):
+        """测试提交者离开后，延迟处理的指令不写进新用户的座位，也不重建房间"""
+        from app import apply_command, room_store
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'FLOW05'})
+        alice_id = room_store.get('FLOW05').user1
+        alice.emit('leave_room', {})
+        assert room_store.get('FLOW05') is None
+        apply_command('FLOW05', 'user1', '我', alice_id)
+        assert room_store.get('FLOW05') is None
+        
+        bob.emit('join_room', {'room_code': 'FLOW05'})
+        bob.get_received()
+        apply_command('FLOW05', 'user1', '我', alice_id)
+        assert events(bob, 'command_updated') == []
+        assert room_store.get('FLOW05').user1_command == ''
+    
+    def test_expired_room_notified(self, socket_clients):
+        """测试在座用户的房间已过期时提交指令，房间内客户端收到通知并可重新加入"""
+        from app import room_store
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'FLOW06'})
+        bob.emit('join_room', {'room_code': 'FLOW06'})
+        room = room_store.get('FLOW06')
+        # 模拟房间过期：存储中的房间已删除，但两人仍在SocketIO房间中
+        room_store.release('FLOW06', room.user1)
+        room_store.release('FLOW06', room.user2)
+        bob.get_received()
+        
+        alice.emit('submit_command', {'command': '我'})
+        assert events(bob, 'room_expired') == [{'room_code': 'FLOW06'}]
+        
+        alice.emit('join_room', {'room_code': 'FLOW06'})
+        assert events(alice, 'room_info')[-1]['user_role'] == 'user1'
+    
+    def test_match_failed(self, socket_clients):
+        """测试指令不匹配"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'FLOW03'})
+        bob.emit('join_room', {'room_code': 'FLOW03'})
+        alice.get_received()
+        
+        alice.emit('submit_command', {'room_code': 'FLOW03', 'command': '我', 'user_role': 'user1'})
+        bob.emit('submit_command', {'room_code': 'FLOW03', 'command': '他', 'user_role': 'user2'})
+        
+        assert len(events(alice, 'match_failed')) == 1
+
+
+class TestRoomDeltas:
+    """测试带序号的增量事件"""
+    
+    def test_command_updated_is_delta(self, socket_clients):
+        """测试指令更新只发送变化的字段和递增序号"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'DELTA1'})
+        bob.emit('join_room', {'room_code': 'DELTA1'})
+        seq = events(bob, 'room_info')[0]['seq']
+        
+        alice.emit('submit_command', {'room_code': 'DELTA1', 'command': '我', 'user_role': 'user1'})
+        alice.emit('submit_command', {'room_code': 'DELTA1', 'command': '爱', 'user_role': 'user1'})
+        
+        updates = events(bob, 'command_updated')
+        assert updates == [
+            {'seq': seq + 1, 'user_role': 'user1', 'command': '我'},
+            {'seq': seq + 2, 'user_role': 'user1', 'command': '爱'},
+        ]
+    
+    def test_match_success_seq(self, socket_clients):
+        """测试匹配成功事件携带清空指令后的序号"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'DELTA2'})
+        bob.emit('join_room', {'room_code': 'DELTA2'})
+        alice.get_received()
+        
+        alice.emit('submit_command', {'room_code': 'DELTA2', 'command': '我', 'user_role': 'user1'})
+        bob.emit('submit_command', {'room_code': 'DELTA2', 'command': '你', 'user_role': 'user2'})
+        
+        received = alice.get_received()
+        last_update = [e for e in received if e['name'] == 'command_updated'][-1]['args'][0]
+        match = [e for e in received if e['name'] == 'match_success'][0]['args'][0]
+        assert match['seq'] == last_update['seq'] + 1
+    
+    def test_resync(self, socket_clients):
+        """测试重新同步返回完整状态"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'DELTA3'})
+        bob.emit('join_room', {'room_code': 'DELTA3'})
+        alice.emit('submit_command', {'room_code': 'DELTA3', 'command': '想', 'user_role': 'user1'})
+        bob.get_received()
+        
+        bob.emit('resync', {'room_code': 'DELTA3'})
+        info = events(bob, 'room_info')[0]
+        assert info['user_role'] == 'user2'
+        assert info['user1_command'] == '想'
+        assert info['seq'] == 3
+    
+    def test_user_left(self, socket_clients):
+        """测试离开房间通知对方"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'DELTA4'})
+        bob.emit('join_room', {'room_code': 'DELTA4'})
+        alice.get_received()
+        
+        bob.emit('leave_room', {'room_code': 'DELTA4'})
+        left = events(alice, 'user_left')
+        assert left == [{'seq': 3, 'user_role': 'user2'}]
+
+
+class TestCommandCoalescing:
+    """测试指令合并"""
+    
+    def test_burst_is_coalesced(self, socket_clients):
+        """测试快速连续输入只广播最后一次指令"""
+        import time
+        from app import command_coalescer
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'BURST1'})
+        bob.emit('join_room', {'room_code': 'BURST1'})
+        bob.get_received()
+        
+        command_coalescer.window = 0.05
+        try:
+            for command in ('x', 'xi', 'xih', '喜欢'):
+                alice.emit('submit_command',
+                           {'room_code': 'BURST1', 'command': command, 'user_role': 'user1'})
+            time.sleep(0.3)
+        finally:
+            command_coalescer.window = 0
+        
+        updates = events(bob, 'command_updated')
+        assert [u['command'] for u in updates] == ['喜欢']
+
+
+class TestConnectionContext:
+    """测试连接上下文"""
+    
+    def test_client_role_ignored(self, socket_clients):
+        """测试服务器使用分配的角色而非客户端发送的角色"""
+        alice, bob = socket_clients
+        alice.emit('join_room', {'room_code': 'CONN01'})
+        bob.emit('join_room', {'room_code': 'CONN01'})
+        alice.get_received()
+        
+        bob.emit('submit_command', {'room_code': 'CONN01', 'command': '你', 'user_role': 'user1'})
+        updates = events(alice, 'command_updated')
+        assert updates[0]['user_role'] == 'user2'
+    
+    def test_submit_before_join_ignored(self, socket_clients):
+        """测试未加入房间时提交的指令被忽略"""
+        alice, bob = socket_clients
+        bob.emit('join_room', {'room_code': 'CONN02'})
+        bob.get_received()
+        
+        alice.emit('submit_command', {'room_code': 'CONN02', 'command': '我', 'user_role': 'user1'})
+        assert events(bob, 'command_updated') == []
+    
+    def test_disconnect_tears_down(self, socket_clients):
+        """测试断开连接后移除上下文"""
+        from app import connections
+        alice, bob = socket_clients
+        before = len(connections)
+        alice.disconnect()
+        assert len(connections) == before - 1
+    
+    def test_anonymous_rejected(self, socket_clients):
+        """测试未登录的连接被拒绝"""
+        client = socketio.test_client(app)
+        assert not client.is_connected()
@@ -0,0 +1,174 @@
+"""
+用户缓存测试模块
+测试TTL/LRU缓存、显式失效、命中统计与共享二级缓存
+"""
+import pytest
+
+from user_cache import CachedUser, UserCache
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+class FakeUser:
+    """模拟User模型"""
+    
+    def __init__(self, id, username, nickname=None, is_active=True):
+        self.id = id
+        self.username = username
+        self.email = f'{username}@example.com'
+        self.nickname = nickname
+        self.is_active = is_active
+
+
+class CountingLoader:
+    """记录数据库加载次数的加载函数"""
+    
+    def __init__(self, users):
+        self.users = {user.id: user for user in users}
+        self.calls = 0
+    
+    def __call__(self, user_id):
+        self.calls += 1
+        return self.users.get(user_id)
+
+
+@pytest.fixture
+def loader():
+    return CountingLoader([FakeUser(1, 'alice', '小爱'), FakeUser(2, 'bob')])
+
+
+class TestCachedUser:
+    """测试缓存的用户身份"""
+    
+    def test_from_model(self):
+        """测试从模型创建，昵称为空时使用用户名"""
+        user = CachedUser.from_model(FakeUser(2, 'bob'))
+        assert user.nickname == 'bob'
+        assert user.get_id() == '2'
+        assert user.is_authenticated and user.is_active and not user.is_anonymous
+    
+    def test_dict_round_trip(self):
+        """测试序列化往返"""
+        user = CachedUser(1, 'alice', 'alice@example.com', '小爱')
+        copy = CachedUser(**user.to_dict())
+        assert copy == user
+        assert copy.nickname == '小爱'
+
+
+class TestUserCache:
+    """测试用户缓存"""
+    
+    def test_hit_skips_loader(self, loader):
+        """测试命中时不再访问数据库"""
+        cache = UserCache(loader)
+        assert cache.get(1).nickname == '小爱'
+        assert cache.get(1).nickname == '小爱'
+        assert loader.calls == 1
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['hit_rate'] == 0.5
+    
+    def test_missing_user(self, loader):
+        """测试用户不存在时返回None且不缓存"""
+        cache = UserCache(loader)
+        assert cache.get(99) is None
+        assert cache.stats()['size'] == 0
+    
+    def test_ttl_expiry(self, loader):
+        """测试超过TTL后重新加载"""
+        clock = FakeClock()
+        cache = UserCache(loader, ttl=60, clock=clock)
+        cache.get(1)
+        clock.now += 59
+        cache.get(1)
+        assert loader.calls == 1
+        clock.now += 2
+        cache.get(1)
+        assert loader.calls == 2
+    
+    def test_size_bound_evicts_lru(self, loader):
+        """测试超过容量上限时淘汰最久未使用的用户"""
+        cache = UserCache(loader, maxsize=1)
+        cache.get(1)
+        cache.get(2)
+        assert cache.stats()['size'] == 1
+        cache.get(1)
+        assert loader.calls == 3
+    
+    def test_invalidate(self, loader):
+        """测试显式失效后重新加载最新数据"""
+        cache = UserCache(loader)
+        cache.get(1)
+        loader.users[1].nickname = '新昵称'
+        assert cache.get(1).nickname == '小爱'
+        cache.invalidate(1)
+        assert cache.get(1).nickname == '新昵称'
+
+
+class TestSharedTier:
+    """测试Redis共享二级缓存"""
+    
+    @pytest.fixture
+    def shared(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        from room_store import RedisRoomStore
+        return RedisRoomStore(fakeredis.FakeRedis(), prefix='test:')
+    
+    def test_second_worker_hits_shared(self, loader, shared):
+        """测试一个worker加载后，另一个worker从共享缓存读取"""
+        worker1 = UserCache(loader, shared=shared)
+        worker2 = UserCache(loader, shared=shared)
+        worker1.get(1)
+        assert worker2.get(1).nickname == '小爱'
+        assert loader.calls == 1
+        assert worker2.stats()['shared_hits'] == 1
+    
+    def test_invalidate_clears_shared(self, loader, shared):
+        """测试失效同时删除共享缓存"""
+        worker1 = UserCache(loader, shared=shared)
+        worker2 = UserCache(loader, shared=shared)
+        worker1.get(1)
+        worker1.invalidate(1)
+        worker2.get(1)
+        assert loader.calls == 2
+
+
+class TestUserLoader:
+    """测试Flask-Login集成"""
+    
+    @pytest.fixture
+    def client(self, make_user, login):
+        make_user('alice')
+        return login('alice')
+    
+    def test_requests_hit_cache(self, client):
+        """测试已登录的请求从缓存加载用户"""
+        from app import user_cache
+        client.get('/')
+        before = user_cache.stats()
+        client.get('/')
+        client.get('/')
+        after = user_cache.stats()
+        assert after['misses'] == before['misses']
+        assert after['hits'] == before['hits'] + 2
+    
+    def test_commit_invalidates(self, client):
+        """测试修改用户并提交后缓存失效"""
+        from app import app, db, load_user
+        from models import User
+        client.get('/')
+        with app.app_context():
+            user = User.query.filter_by(username='alice').first()
+            user_id = user.id
+            user.nickname = '新昵称'
+            db.session.commit()
+        with app.app_context():
+            assert load_user(str(user_id)).nickname == '新昵称'
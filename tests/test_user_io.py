@@ -0,0 +1,118 @@
+"""
+用户批量导入导出测试模块
+测试CSV/JSONL流式导入、重复与无效记录处理，以及导出后重新导入
+"""
+import json
+
+import pytest
+from werkzeug.security import check_password_hash
+
+from app import app, db
+from models import User
+from user_io import UserImporter, chunks, normalize, read_rows
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def runner(app_db):
+    method = app_db.config.get('PASSWORD_HASH_METHOD')
+    app_db.config['PASSWORD_HASH_METHOD'] = FAST_METHOD
+    yield app_db.test_cli_runner()
+    app_db.config['PASSWORD_HASH_METHOD'] = method
+
+
+class TestHelpers:
+    """测试流式读取辅助函数"""
+    
+    def test_chunks(self):
+        assert list(chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    
+    def test_read_rows_is_lazy(self):
+        """测试逐行读取"""
+        lines = iter(['{"username": "a"}\n', '\n', '{"username": "b"}\n'])
+        rows = read_rows(lines, 'jsonl')
+        assert next(rows) == {'username': 'a'}
+        assert next(lines) == '\n'
+    
+    def test_normalize(self):
+        """测试记录规范化"""
+        row = normalize({'username': ' alice ', 'email': 'a@example.com', 'password': 'x',
+                         'is_active': 'false'}, None)
+        assert row['username'] == 'alice'
+        assert row['nickname'] == 'alice'
+        assert row['is_active'] is False
+        assert normalize({'username': 'bob', 'email': 'b@example.com'}, None) is None
+
+
+class TestImport:
+    """测试导入"""
+    
+    def test_import_csv(self, runner, tmp_path):
+        """测试导入CSV并哈希明文密码"""
+        path = tmp_path / 'users.csv'
+        path.write_text('username,email,password,nickname\n'
+                        'alice,alice@example.com,Test123,小爱\n'
+                        'bob,bob@example.com,Test456,\n'
+                        ',missing@example.com,Test789,\n', encoding='utf-8')
+        result = runner.invoke(args=['users', 'import', str(path), '--workers', '0'])
+        assert result.exit_code == 0, result.output
+        assert '导入 2 条' in result.output
+        assert '无效 1 条' in result.output
+        
+        with app.app_context():
+            alice = User.query.filter_by(username='alice').first()
+            assert alice.nickname == '小爱'
+            assert alice.password_hash.startswith(FAST_METHOD)
+            assert check_password_hash(alice.password_hash, 'Test123')
+    
+    def test_duplicates_skipped(self, runner, tmp_path):
+        """测试已存在的用户名/邮箱被跳过"""
+        path = tmp_path / 'users.jsonl'
+        records = [{'username': 'alice', 'email': 'alice@example.com', 'password': 'Test123'},
+                   {'username': 'alice', 'email': 'other@example.com', 'password': 'Test123'},
+                   {'username': 'carol', 'email': 'alice@example.com', 'password': 'Test123'}]
+        path.write_text('\n'.join(json.dumps(r) for r in records), encoding='utf-8')
+        result = runner.invoke(args=['users', 'import', str(path), '--workers', '0'])
+        assert '跳过重复 2 条' in result.output
+        with app.app_context():
+            assert User.query.count() == 1
+    
+    def test_parallel_hashing_in_batches(self, app_db):
+        """测试多进程哈希和分批写入"""
+        with app.app_context():
+            records = ({'username': f'user{i}', 'email': f'user{i}@example.com',
+                        'password': f'Pass{i}'} for i in range(25))
+            importer = UserImporter(db.session, FAST_METHOD, batch_size=10, workers=2)
+            assert importer.run(records) == (25, 25, 0)
+            user = User.query.filter_by(username='user7').first()
+            assert check_password_hash(user.password_hash, 'Pass7')
+
+
+class TestExport:
+    """测试导出"""
+    
+    @pytest.mark.parametrize('suffix', ['csv', 'jsonl'])
+    def test_round_trip(self, runner, tmp_path, suffix):
+        """测试导出后重新导入得到相同的用户和密码哈希"""
+        with app.app_context():
+            for name in ('alice', 'bob'):
+                user = User(username=name, email=f'{name}@example.com', nickname=name)
+                user.password_hash = f'pbkdf2:sha256:1000$salt${name}'
+                db.session.add(user)
+            db.session.commit()
+        
+        path = tmp_path / f'users.{suffix}'
+        result = runner.invoke(args=['users', 'export', str(path)])
+        assert result.exit_code == 0, result.output
+        assert '导出 2 条' in result.output
+        
+        with app.app_context():
+            User.query.delete()
+            db.session.commit()
+        result = runner.invoke(args=['users', 'import', str(path), '--workers', '0'])
+        assert '导入 2 条' in result.output
+        with app.app_context():
+            bob = User.query.filter_by(username='bob').first()
+            assert bob.password_hash == 'pbkdf2:sha256:1000$salt$bob'
+            assert bob.is_active is True
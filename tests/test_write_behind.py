@@ -0,0 +1,345 @@
+"""
+写回缓冲测试模块
+测试按键合并、数量触发写入、失败重试、只追加队列的分批写入、积压上限与坏数据的丢弃，
+以及进程正常退出时不丢失最后登录时间
+"""
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from write_behind import WriteBehindBuffer, WriteBehindQueue, run_flusher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RecordingWriter:
+    """记录每批写入的数据"""
+    
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+    
+    def __call__(self, entries):
+        if self.fail:
+            raise RuntimeError('database unavailable')
+        self.batches.append(entries.copy())
+
+
+class TestWriteBehindBuffer:
+    """测试写回缓冲"""
+    
+    def test_latest_value_wins(self):
+        """测试同一键只写入最后的值"""
+        writer = RecordingWriter()
+        buffer = WriteBehindBuffer(writer)
+        buffer.add(1, 'a')
+        buffer.add(1, 'b')
+        buffer.add(2, 'c')
+        assert buffer.flush() == 2
+        assert writer.batches == [{1: 'b', 2: 'c'}]
+        assert buffer.flush() == 0
+    
+    def test_size_triggers_flush(self):
+        """测试达到数量上限时触发写入"""
+        writer = RecordingWriter()
+        spawned = []
+        buffer = WriteBehindBuffer(writer, max_size=3, spawn=spawned.append)
+        for key in range(5):
+            buffer.add(key, key)
+        # 在写入执行前只安排一次
+        assert len(spawned) == 1
+        spawned[0]()
+        assert writer.batches == [{0: 0, 1: 1, 2: 2, 3: 3, 4: 4}]
+    
+    def test_failed_flush_requeues(self):
+        """测试写入失败时数据放回缓冲，新值优先"""
+        writer = RecordingWriter()
+        buffer = WriteBehindBuffer(writer)
+        buffer.add(1, 'old')
+        buffer.add(2, 'x')
+        writer.fail = True
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+        buffer.add(1, 'new')
+        writer.fail = False
+        buffer.flush()
+        assert writer.batches == [{1: 'new', 2: 'x'}]
+        assert buffer.stats()['failures'] == 1
+    
+    def test_run_flusher_survives_errors(self):
+        """测试后台写入失败后继续运行"""
+        writer = RecordingWriter()
+        buffer = WriteBehindBuffer(writer)
+        buffer.add(1, 'a')
+        writer.fail = True
+        calls = []
+        
+        def sleep(interval):
+            calls.append(interval)
+            if len(calls) == 2:
+                writer.fail = False
+            if len(calls) > 2:
+                raise KeyboardInterrupt
+        
+        with pytest.raises(KeyboardInterrupt):
+            run_flusher(buffer, 5, sleep)
+        assert writer.batches == [{1: 'a'}]
+
+
+class TestWriteBehindQueue:
+    """测试只追加的写回队列"""
+    
+    def test_batches_in_order(self):
+        """测试按加入顺序写入，每批最多max_size条"""
+        writer = RecordingWriter()
+        queue = WriteBehindQueue(writer, max_size=100, spawn=lambda task: None)
+        for i in range(250):
+            queue.add(i)
+        assert queue.flush() == 250
+        assert [len(batch) for batch in writer.batches] == [100, 100, 50]
+        assert sum(writer.batches, []) == list(range(250))
+        assert queue.stats()['batches'] == 3
+    
+    def test_size_triggers_flush(self):
+        """测试达到数量上限时只安排一次后台写入"""
+        writer = RecordingWriter()
+        spawned = []
+        queue = WriteBehindQueue(writer, max_size=3, spawn=spawned.append)
+        for i in range(5):
+            queue.add(i)
+        assert len(spawned) == 1
+        spawned[0]()
+        assert writer.batches == [[0, 1, 2], [3, 4]]
+    
+    def test_backlog_limit_drops_new_records(self):
+        """测试积压达到上限时丢弃新记录而不等待"""
+        writer = RecordingWriter()
+        queue = WriteBehindQueue(writer, max_size=10, max_pending=3, spawn=lambda task: None)
+        assert [queue.add(i) for i in range(5)] == [True, True, True, False, False]
+        assert queue.stats()['dropped'] == 2
+        queue.flush()
+        assert writer.batches == [[0, 1, 2]]
+        assert queue.add(5)
+    
+    def test_failed_flush_requeues_at_front(self):
+        """测试写入失败的记录放回队首，顺序不变"""
+        writer = RecordingWriter()
+        queue = WriteBehindQueue(writer, max_size=2, spawn=lambda task: None)
+        for i in range(3):
+            queue.add(i)
+        writer.fail = True
+        with pytest.raises(RuntimeError):
+            queue.flush()
+        queue.add(3)
+        writer.fail = False
+        assert queue.flush() == 4
+        assert sum(writer.batches, []) == [0, 1, 2, 3]
+        assert queue.stats()['failures'] == 1
+    
+    def test_repeated_failure_discards_batch(self, caplog):
+        """测试队首一批连续失败max_attempts次后丢弃并记录错误，后面的记录照常写入"""
+        writer = RecordingWriter()
+        logger = logging.getLogger('test_write_behind')
+        queue = WriteBehindQueue(writer, max_size=2, spawn=lambda task: None, max_attempts=3,
+                                 logger=logger)
+        for i in range(3):
+            queue.add(i)
+        writer.fail = True
+        with caplog.at_level(logging.ERROR, logger='test_write_behind'):
+            for _ in range(3):
+                with pytest.raises(RuntimeError):
+                    queue.flush()
+        assert 'discarded 2 records' in caplog.text
+        writer.fail = False
+        assert queue.flush() == 1
+        assert writer.batches == [[2]]
+        stats = queue.stats()
+        assert stats['failures'] == 3 and stats['discarded'] == 2 and stats['pending'] == 0
+    
+    def test_rejected_batch_written_one_by_one(self, caplog):
+        """测试被拒绝的一批逐条写入，只丢弃出错的记录"""
+        written = []
+        
+        def write(records):
+            if 'bad' in records:
+                raise ValueError('constraint failed')
+            written.extend(records)
+        
+        logger = logging.getLogger('test_write_behind')
+        queue = WriteBehindQueue(write, max_size=10, spawn=lambda task: None,
+                                 rejected_errors=(ValueError,), logger=logger)
+        for record in (0, 'bad', 2):
+            queue.add(record)
+        with caplog.at_level(logging.ERROR, logger='test_write_behind'):
+            assert queue.flush() == 2
+        assert written == [0, 2]
+        assert 'record rejected, discarded: constraint failed' in caplog.text
+        stats = queue.stats()
+        assert stats['written'] == 2 and stats['discarded'] == 1 and stats['pending'] == 0
+    
+    def test_unavailable_during_one_by_one_requeues(self):
+        """测试逐条写入时数据库不可用，未写入的记录放回队首"""
+        writer = RecordingWriter()
+        
+        def write(records):
+            if 'bad' in records:
+                writer.fail = True
+                raise ValueError('constraint failed')
+            writer(records)
+        
+        queue = WriteBehindQueue(write, max_size=10, spawn=lambda task: None,
+                                 rejected_errors=(ValueError,))
+        for record in ('bad', 1, 2):
+            queue.add(record)
+        with pytest.raises(RuntimeError):
+            queue.flush()
+        writer.fail = False
+        assert queue.flush() == 2
+        assert writer.batches == [[1, 2]]
+        assert queue.stats()['discarded'] == 1
+    
+    def test_flush_ends_while_records_arrive(self):
+        """测试写入期间新加入的记录留给下次写入，flush不会一直追赶"""
+        queue = None
+        batches = []
+        
+        def slow_write(records):
+            batches.append(records)
+            queue.add('late')
+        
+        queue = WriteBehindQueue(slow_write, max_size=1, spawn=lambda task: None)
+        queue.add('first')
+        queue.flush()
+        assert batches[0] == ['first'] and len(queue) >= 1
+
+
+class TestLastLoginWriteBehind:
+    """测试最后登录时间的批量写入"""
+    
+    def test_login_does_not_commit_last_login(self, users, login):
+        """测试登录时只记录到缓冲，写入后数据库中可见"""
+        from app import app, last_login_buffer
+        from models import User
+        for name in users:
+            login(name)
+        with app.app_context():
+            assert User.query.filter(User.last_login.isnot(None)).count() == 0
+        
+        assert last_login_buffer.flush() == 2
+        with app.app_context():
+            assert User.query.filter(User.last_login.isnot(None)).count() == 2
+    
+    def test_deleted_user_skipped(self, users, login):
+        """测试缓冲中的用户已被删除时其他用户的最后登录时间照常写入"""
+        from app import app, db, last_login_buffer
+        from models import User
+        for name in users:
+            login(name)
+        with app.app_context():
+            db.session.delete(db.session.get(User, users['bob']))
+            db.session.commit()
+        
+        failures = last_login_buffer.stats()['failures']
+        assert last_login_buffer.flush() == 2
+        assert last_login_buffer.stats()['failures'] == failures
+        assert len(last_login_buffer) == 0
+        with app.app_context():
+            assert db.session.get(User, users['alice']).last_login is not None
+    
+    def test_graceful_stop_flushes(self, tmp_path):
+        """测试进程正常退出时写入缓冲中的最后登录时间"""
+        database = tmp_path / 'users.db'
+        script = textwrap.dedent('''
+            from app import app, db
+            from models import User
+            app.config['WTF_CSRF_ENABLED'] = False
+            with app.app_context():
+                db.create_all()
+                for i in range(20):
+                    user = User(username=f'user{i}', email=f'user{i}@example.com')
+                    user.set_password('Test123')
+                    db.session.add(user)
+                db.session.commit()
+            for i in range(20):
+                app.test_client().post('/login', data={'username': f'user{i}', 'password': 'Test123'})
+            with app.app_context():
+                assert User.query.filter(User.last_login.isnot(None)).count() == 0
+        ''')
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}',
+                   SOCKETIO_ASYNC_MODE='threading', LAST_LOGIN_FLUSH_INTERVAL='3600',
+                   PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        
+        with sqlite3.connect(database) as conn:
+            (count,) = conn.execute('SELECT COUNT(*) FROM users WHERE last_login IS NOT NULL').fetchone()
+        assert count == 20
+
+
+class TestMatchHistoryWriteBehind:
+    """测试配对记录的批量写入"""
+    
+    def test_graceful_stop_flushes(self, tmp_path):
+        """测试进程正常退出时写入队列中的配对记录"""
+        database = tmp_path / 'matches.db'
+        script = textwrap.dedent('''
+            from datetime import datetime
+            from app import app, db, match_queue
+            with app.app_context():
+                db.create_all()
+            for i in range(1200):
+                match_queue.add({'room_code': f'R{i}', 'user1_id': 1, 'user2_id': 2, 'user1_command': '我',
+                                 'user2_command': '你', 'description': '我和你', 'matched_at': datetime.utcnow()})
+        ''')
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}',
+                   SOCKETIO_ASYNC_MODE='threading', MATCH_FLUSH_INTERVAL='3600')
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        
+        with sqlite3.connect(database) as conn:
+            (count,) = conn.execute('SELECT COUNT(*) FROM matches').fetchone()
+        assert count == 1200
+    
+    def test_full_queue_drops_match(self, users, monkeypatch, caplog):
+        """测试积压已满时配对照常广播，记录被丢弃并计数、记录警告"""
+        from app import apply_command, match_queue, room_store
+        
+        monkeypatch.setattr(match_queue, 'max_pending', len(match_queue))
+        dropped = match_queue.stats()['dropped']
+        room_store.assign_role('DROP01', users['alice'], 'alice')
+        room_store.assign_role('DROP01', users['bob'], 'bob')
+        with caplog.at_level(logging.WARNING):
+            apply_command('DROP01', 'user1', '我', users['alice'])
+            apply_command('DROP01', 'user2', '你', users['bob'])
+        
+        assert room_store.get('DROP01').status == 'matched'
+        assert match_queue.stats()['dropped'] == dropped + 1
+        assert 'Match history queue full, dropped match in room DROP01' in caplog.text
+    
+    def test_invalid_record_discarded(self, app_db, caplog):
+        """测试违反约束的配对记录被丢弃，同一批的其他记录照常写入"""
+        from datetime import datetime
+        
+        from app import db, match_queue
+        from models import Match
+        
+        def record(room_code):
+            return {'room_code': room_code, 'user1_id': None, 'user2_id': None, 'user1_command': '我',
+                    'user2_command': '你', 'description': '我和你', 'matched_at': datetime.utcnow()}
+        
+        discarded = match_queue.stats()['discarded']
+        for room_code in ('R1', None, 'R3'):
+            match_queue.add(record(room_code))
+        with caplog.at_level(logging.ERROR):
+            assert match_queue.flush() == 2
+        assert 'NOT NULL constraint failed' in caplog.text
+        assert match_queue.stats()['discarded'] == discarded + 1
+        with app_db.app_context():
+            assert sorted(match.room_code for match in db.session.query(Match)) == ['R1', 'R3']
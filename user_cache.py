@@ -0,0 +1,135 @@
+"""
+用户缓存模块
+为Flask-Login的user_loader提供进程内TTL/LRU缓存，可选Redis共享二级缓存
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedUser:
+    """缓存中的用户身份
+
+    只保存会话需要的字段，与数据库会话无关，可以安全地跨请求复用和序列化。
+    实现Flask-Login要求的用户接口。
+    """
+
+    __slots__ = ('id', 'username', 'email', 'nickname', 'is_active')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, email, nickname, is_active=True):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.nickname = nickname
+        self.is_active = is_active
+
+    @classmethod
+    def from_model(cls, user):
+        """从User模型创建"""
+        return cls(user.id, user.username, user.email, user.nickname or user.username,
+                   bool(user.is_active))
+
+    def to_dict(self):
+        """转换为可序列化的字典"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, CachedUser) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """按用户ID缓存CachedUser
+
+    一级缓存为进程内OrderedDict（LRU，带TTL和容量上限）；
+    配置了shared（提供cache_get/cache_set/cache_delete的对象，如RedisRoomStore）时，
+    一级未命中先查共享缓存，再查数据库。用户数据变更时通过invalidate显式失效。
+    """
+
+    def __init__(self, loader, ttl=60, maxsize=10000, shared=None, clock=time.monotonic):
+        self._loader = loader
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.shared = shared
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared_key(self, user_id):
+        return f'user:{user_id}'
+
+    def _put(self, user):
+        with self._lock:
+            self._entries[user.id] = (self._clock() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        """获取用户，不存在时返回None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[user_id]
+
+        if self.shared is not None:
+            data = self.shared.cache_get(self._shared_key(user_id))
+            if data is not None:
+                user = CachedUser(**data)
+                self._put(user)
+                with self._lock:
+                    self.shared_hits += 1
+                return user
+
+        with self._lock:
+            self.misses += 1
+        model = self._loader(user_id)
+        if model is None:
+            return None
+        user = CachedUser.from_model(model)
+        self._put(user)
+        if self.shared is not None:
+            self.shared.cache_set(self._shared_key(user_id), user.to_dict(), self.ttl)
+        return user
+
+    def invalidate(self, user_id):
+        """使指定用户的缓存失效"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.shared is not None:
+            self.shared.cache_delete(self._shared_key(user_id))
+
+    def clear(self):
+        """清空一级缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """缓存命中统计"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+            }
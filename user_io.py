@@ -0,0 +1,266 @@
+"""
+用户批量导入导出模块
+以CSV或JSONL流式读写用户，分批写入数据库，提供flask users import/export命令
+"""
+import csv
+import io
+import json
+import os
+import sys
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, text
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+
+# 导出/导入的列（导入时password_hash与password二选一）
+EXPORT_FIELDS = ('id', 'username', 'email', 'nickname', 'password_hash',
+                 'created_at', 'last_login', 'is_active')
+INSERT_COLUMNS = ('username', 'email', 'nickname', 'password_hash', 'created_at', 'last_login',
+                  'is_active')
+
+users_cli = AppGroup('users', help='用户批量导入导出')
+
+
+def open_stream(path, mode='r'):
+    """打开文件，'-'表示标准输入/输出（CSV需要newline=''）"""
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def detect_format(path, fmt=None):
+    """根据--format或文件扩展名确定格式"""
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """逐行读取用户记录（生成器，内存占用与文件大小无关）"""
+    if fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(stream)
+
+
+def chunks(iterable, size):
+    """将迭代器切分为大小为size的列表"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_datetime(value, default=None):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value) if value else default
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', '')
+
+
+def normalize(record, now):
+    """将一条输入记录转换为待插入的行，记录无效时返回None
+
+    返回的行中password字段为待哈希的明文（已提供password_hash时为None）。
+    导出文件中的created_at和last_login会被保留，没有时创建时间为本次导入时间。
+    """
+    username = (record.get('username') or '').strip()
+    email = (record.get('email') or '').strip()
+    password_hash = (record.get('password_hash') or '').strip() or None
+    password = record.get('password') or None
+    if not username or not email or not (password_hash or password):
+        return None
+    is_active = record.get('is_active')
+    try:
+        created_at = _parse_datetime(record.get('created_at'), now)
+        last_login = _parse_datetime(record.get('last_login'))
+    except (TypeError, ValueError):
+        return None
+    return {
+        'username': username,
+        'email': email,
+        'nickname': (record.get('nickname') or '').strip() or username,
+        'password_hash': password_hash,
+        'password': None if password_hash else password,
+        'created_at': created_at,
+        'last_login': last_login,
+        'is_active': True if is_active in (None, '') else _parse_bool(is_active),
+    }
+
+
+def _hash_passwords(args):
+    """在子进程中哈希一批密码"""
+    method, passwords = args
+    return [generate_password_hash(password, method) for password in passwords]
+
+
+class UserImporter:
+    """分批导入用户
+
+    每批先在进程池中并行哈希明文密码（按CPU核数），再一次性写入：
+    PostgreSQL使用COPY写入临时表后INSERT ... ON CONFLICT DO NOTHING，
+    其他数据库使用executemany批量INSERT并忽略重复的用户名/邮箱。
+    任何时刻内存中只有一批记录。
+    """
+
+    def __init__(self, session, method, batch_size=1000, workers=None):
+        self.session = session
+        self.method = method
+        self.batch_size = batch_size
+        self.workers = workers
+        self.read = 0
+        self.inserted = 0
+        self.invalid = 0
+
+    def _hash(self, pool, rows):
+        pending = [row for row in rows if row['password'] is not None]
+        if not pending:
+            return
+        if pool is None:
+            hashes = _hash_passwords((self.method, [row['password'] for row in pending]))
+        else:
+            # 切分为进程数的若干倍，各子进程负载均衡
+            size = max(len(pending) // ((self.workers or os.cpu_count() or 1) * 4), 1)
+            parts = [(self.method, [row['password'] for row in part])
+                     for part in chunks(pending, size)]
+            hashes = [h for part in pool.map(_hash_passwords, parts) for h in part]
+        for row, password_hash in zip(pending, hashes):
+            row['password_hash'] = password_hash
+
+    def _insert(self, rows):
+        values = [{column: row[column] for column in INSERT_COLUMNS} for row in rows]
+        connection = self.session.connection()
+        if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+            inserted = self._copy(connection, values)
+        else:
+            inserted = connection.execute(self._insert_ignore(connection.dialect.name),
+                                          values).rowcount
+        self.session.commit()
+        return inserted
+
+    @staticmethod
+    def _insert_ignore(dialect):
+        """忽略唯一索引冲突的INSERT语句"""
+        if dialect == 'sqlite':
+            return insert(User.__table__).prefix_with('OR IGNORE')
+        if dialect == 'mysql':
+            return insert(User.__table__).prefix_with('IGNORE')
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            return pg_insert(User.__table__).on_conflict_do_nothing()
+        return insert(User.__table__)
+
+    def _copy(self, connection, values):
+        """PostgreSQL：COPY到临时表，再插入users并跳过重复"""
+        columns = ', '.join(INSERT_COLUMNS)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in values:
+            writer.writerow([row[column] for column in INSERT_COLUMNS])
+        buffer.seek(0)
+        connection.execute(text('CREATE TEMP TABLE IF NOT EXISTS users_import '
+                                '(LIKE users INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'))
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY users_import ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+        result = connection.execute(text(
+            f'INSERT INTO users ({columns}) SELECT {columns} FROM users_import '
+            f'ON CONFLICT DO NOTHING'))
+        return result.rowcount
+
+    def run(self, records):
+        """导入记录迭代器，返回(读取数, 写入数, 无效数)"""
+        now = datetime.utcnow()
+        pool = ProcessPoolExecutor(self.workers) if self.workers != 0 else None
+        try:
+            for batch in chunks(records, self.batch_size):
+                self.read += len(batch)
+                rows = []
+                for record in batch:
+                    row = normalize(record, now)
+                    if row is None:
+                        self.invalid += 1
+                    else:
+                        rows.append(row)
+                if rows:
+                    self._hash(pool, rows)
+                    self.inserted += self._insert(rows)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return self.read, self.inserted, self.invalid
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_users(stream, fmt, batch_size=1000):
+    """按主键顺序流式导出用户，返回导出数量"""
+    columns = [getattr(User, field) for field in EXPORT_FIELDS]
+    query = db.session.query(*columns).order_by(User.id).execution_options(yield_per=batch_size)
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for row in query:
+        values = [_format_value(value) for value in row]
+        if writer is not None:
+            writer.writerow(values)
+        else:
+            stream.write(json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+@users_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='文件格式（默认按扩展名判断）')
+@click.option('--batch-size', default=1000, show_default=True, help='每批写入的用户数')
+@click.option('--workers', default=None, type=int, help='哈希密码的进程数（默认CPU核数，0表示不使用子进程）')
+def import_command(path, fmt, batch_size, workers):
+    """从CSV或JSONL导入用户（需包含username、email及password或password_hash）"""
+    fmt = detect_format(path, fmt)
+    method = current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+    importer = UserImporter(db.session, method, batch_size=batch_size, workers=workers)
+    start = datetime.utcnow()
+    with open_stream(path) as stream:
+        read, inserted, invalid = importer.run(read_rows(stream, fmt))
+    elapsed = (datetime.utcnow() - start).total_seconds()
+    click.echo(f'读取 {read} 条，导入 {inserted} 条，跳过重复 {read - inserted - invalid} 条，'
+               f'无效 {invalid} 条，耗时 {elapsed:.1f}s', err=True)
+
+
+@users_cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='文件格式（默认按扩展名判断）')
+@click.option('--batch-size', default=1000, show_default=True, help='每次从数据库读取的用户数')
+def export_command(path, fmt, batch_size):
+    """将用户导出为CSV或JSONL（包含密码哈希，可直接重新导入）"""
+    fmt = detect_format(path, fmt)
+    with open_stream(path, 'w') as stream:
+        count = export_users(stream, fmt, batch_size)
+    click.echo(f'导出 {count} 条', err=True)
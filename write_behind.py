@@ -0,0 +1,252 @@
+"""
+写回缓冲模块
+在内存中累积待写入的数据，按时间间隔或数量上限批量写入数据库：
+按键合并的更新（WriteBehindBuffer）与只追加的记录（WriteBehindQueue）
+"""
+import threading
+
+
+class WriteBehindBuffer:
+    """按键合并的写回缓冲
+
+    同一键在一次写入前被多次更新时只保留最后的值（如同一用户的最后登录时间）。
+    缓冲达到max_size时安排一次后台写入；另有后台任务每隔interval秒写入一次；
+    进程退出前调用flush写入剩余数据。写入失败时数据放回缓冲，
+    期间被更新过的键以新值为准，下次写入时重试。
+    """
+
+    def __init__(self, write, max_size=500, spawn=None):
+        self._write = write
+        self.max_size = max_size
+        self._spawn = spawn
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_scheduled = False
+        self.added = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+
+    def add(self, key, value):
+        """记录一次更新"""
+        with self._lock:
+            self._pending[key] = value
+            self.added += 1
+            full = len(self._pending) >= self.max_size and not self._flush_scheduled
+            if full:
+                self._flush_scheduled = True
+        if full:
+            if self._spawn is not None:
+                self._spawn(self._flush_quietly)
+            else:
+                self._flush_quietly()
+
+    def _flush_quietly(self):
+        # 数量触发的写入失败时数据已放回缓冲，由定时写入重试
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def flush(self):
+        """写入缓冲中的全部数据，返回写入条数"""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, {}
+                self._flush_scheduled = False
+            if not entries:
+                return 0
+            try:
+                self._write(entries)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    for key, value in entries.items():
+                        self._pending.setdefault(key, value)
+                raise
+            with self._lock:
+                self.written += len(entries)
+                self.batches += 1
+            return len(entries)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stats(self):
+        """写回统计：收到的更新数、写入条数、批次数、失败次数和待写入条数"""
+        with self._lock:
+            return {
+                'added': self.added,
+                'written': self.written,
+                'batches': self.batches,
+                'failures': self.failures,
+                'pending': len(self._pending)
+            }
+
+
+class WriteBehindQueue:
+    """只追加的写回队列
+
+    记录按加入顺序写入，不合并（如每次配对成功的记录）。与WriteBehindBuffer相同，
+    队列达到max_size时安排一次后台写入，另有后台任务定时写入，进程退出前调用flush写入剩余数据。
+    每次写入最多max_size条，积压较多时分多批写入，单条INSERT语句的大小有上限。
+
+    add从不等待数据库：数据库变慢时写入在后台排队，同一时刻最多安排一次额外写入；
+    积压达到max_pending时有意丢弃新记录（不阻塞调用方），计入dropped并由add返回False，
+    内存占用有上限。调用方在指令处理路径中，宁可丢失历史记录也不让数据库拖慢房间内的交互，
+    需要知道丢弃时检查返回值（应用记录警告）或stats中的dropped。
+
+    写入失败时该批记录放回队首，下次写入时重试；队首连续max_attempts次写入失败时
+    丢弃该批并记录错误，一批坏数据不会永远堵住后面的记录。
+    失败的异常属于rejected_errors（如违反约束、数据无效）时不再整批重试，
+    而是逐条写入，只丢弃被拒绝的记录。两种情况丢弃的记录计入discarded。
+    """
+
+    def __init__(self, write, max_size=500, max_pending=50000, spawn=None,
+                 max_attempts=5, rejected_errors=(), logger=None):
+        self._write = write
+        self.max_size = max_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._rejected_errors = tuple(rejected_errors)
+        self._logger = logger
+        self._spawn = spawn
+        self._attempts = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_scheduled = False
+        self.added = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.discarded = 0
+
+    def add(self, record):
+        """加入一条记录，积压已满时丢弃并返回False"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append(record)
+            self.added += 1
+            full = len(self._pending) >= self.max_size and not self._flush_scheduled
+            if full:
+                self._flush_scheduled = True
+        if full:
+            if self._spawn is not None:
+                self._spawn(self._flush_quietly)
+            else:
+                self._flush_quietly()
+        return True
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def flush(self):
+        """分批写入调用时已在队列中的记录，返回写入条数
+
+        写入期间新加入的记录留给下次写入，生产速度超过数据库时本次调用仍会结束。
+        """
+        with self._flush_lock:
+            with self._lock:
+                remaining = len(self._pending)
+                self._flush_scheduled = False
+            written = 0
+            while remaining > 0:
+                with self._lock:
+                    batch = self._pending[:min(self.max_size, remaining)]
+                    del self._pending[:len(batch)]
+                if not batch:
+                    break
+                remaining -= len(batch)
+                try:
+                    self._write(batch)
+                except self._rejected_errors as e:
+                    with self._lock:
+                        self.failures += 1
+                    self._log_error(f'Write-behind batch rejected, '
+                                    f'retrying {len(batch)} records one by one: {str(e)}')
+                    written += self._write_each(batch)
+                    continue
+                except Exception as e:
+                    with self._lock:
+                        self.failures += 1
+                        self._attempts += 1
+                        give_up = self._attempts >= self.max_attempts
+                        if give_up:
+                            self._attempts = 0
+                            self.discarded += len(batch)
+                        else:
+                            self._pending[:0] = batch
+                    if give_up:
+                        self._log_error(f'Write-behind batch failed {self.max_attempts} times, '
+                                        f'discarded {len(batch)} records: {str(e)}')
+                    raise
+                with self._lock:
+                    self._attempts = 0
+                    self.written += len(batch)
+                    self.batches += 1
+                written += len(batch)
+            return written
+
+    def _write_each(self, batch):
+        """逐条写入被拒绝的一批记录，丢弃本身被拒绝的记录，返回写入条数
+
+        其他错误（如数据库不可用）时把尚未写入的记录放回队首并抛出，下次写入时重试。
+        """
+        written = 0
+        for index, record in enumerate(batch):
+            try:
+                self._write([record])
+            except self._rejected_errors as e:
+                with self._lock:
+                    self.discarded += 1
+                self._log_error(f'Write-behind record rejected, discarded: {str(e)}')
+                continue
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch[index:]
+                raise
+            with self._lock:
+                self.written += 1
+            written += 1
+        return written
+
+    def _log_error(self, message):
+        if self._logger is not None:
+            self._logger.error(message)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stats(self):
+        """写回统计：收到的记录数、写入条数、批次数、失败次数、积压已满时丢弃的条数、
+        写入失败后丢弃的条数和待写入条数"""
+        with self._lock:
+            return {
+                'added': self.added,
+                'written': self.written,
+                'batches': self.batches,
+                'failures': self.failures,
+                'dropped': self.dropped,
+                'discarded': self.discarded,
+                'pending': len(self._pending)
+            }
+
+
+def run_flusher(buffer, interval, sleep, logger=None):
+    """后台循环：每隔interval秒写入一次缓冲"""
+    while True:
+        sleep(interval)
+        try:
+            buffer.flush()
+        except Exception as e:
+            # 写入失败（如数据库暂时不可用）时数据保留在缓冲中，下个周期重试
+            if logger is not None:
+                logger.error(f'Write-behind flush failed: {str(e)}')